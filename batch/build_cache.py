@@ -0,0 +1,220 @@
+"""
+Rebuilds agent wheels and images only when the agent package changes.
+
+An agent package is identified by a content hash of its agent/ sources,
+pyproject.toml and config.yaml. The wheel is rebuilt with `poetry build` when
+the hash differs from the last build, and runners only pass
+force_rebuild_agent_image=True when the image was last built from a different
+hash. Records live in .build_cache/ at the repository root, one JSON file per
+agent directory, and every read-modify-write holds a file lock, so runners in
+several terminals (or executor workers) can share the cache.
+
+Image builds happen inside the game runner, so they are tracked as claims: the
+first runner to see a new hash claims the build, other runners wait until it
+calls image_built, or take the claim over if its process has died.
+"""
+import fcntl
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import time
+import tomllib
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger("build_cache")
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parents[1] / ".build_cache"
+PACKAGE_FILES = ("pyproject.toml", "config.yaml")
+CLAIM_POLL_SECONDS = 2.0
+
+
+def package_hash(agent_dir):
+    """
+    Content hash of an agent package.
+
+    Args:
+        agent_dir (str | Path): Directory with pyproject.toml and the agent/ package.
+
+    Returns:
+        str: sha256 hex digest over the relative path and bytes of every source file.
+    """
+    agent_dir = Path(agent_dir)
+    files = [agent_dir / name for name in PACKAGE_FILES if (agent_dir / name).is_file()]
+    files += [
+        path for path in (agent_dir / "agent").rglob("*")
+        if path.is_file() and "__pycache__" not in path.parts and path.suffix not in (".pyc", ".pyo")
+    ]
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        digest.update(path.relative_to(agent_dir).as_posix().encode())
+        digest.update(b"\0")
+        digest.update(path.read_bytes())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class BuildCache:
+    """
+    Wheel and image build records for agent packages.
+
+    Args:
+        cache_dir (str | Path): Where records are kept, defaults to .build_cache/ in the repository root.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _record_path(self, agent_dir):
+        agent_dir = Path(agent_dir).resolve()
+        key = hashlib.sha256(str(agent_dir).encode()).hexdigest()[:12]
+        return self.cache_dir / f"{agent_dir.name}-{key}.json"
+
+    @contextmanager
+    def _record(self, agent_dir):
+        # yields the record dict under an exclusive lock and writes it back on exit
+        path = self._record_path(agent_dir)
+        with open(path.with_suffix(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                record = json.loads(path.read_text()) if path.exists() else {}
+                yield record
+                tmp = path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(record, indent=2))
+                os.replace(tmp, path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _count(record, outcome):
+        stats = record.setdefault("stats", {"hits": 0, "misses": 0})
+        stats[outcome] += 1
+
+    def ensure_wheel(self, agent_dir):
+        """
+        Returns the agent's wheel, running `poetry build` first if the package changed.
+
+        Args:
+            agent_dir (str | Path): Directory with pyproject.toml and the agent/ package.
+
+        Returns:
+            str: Absolute path of the wheel.
+        """
+        agent_dir = Path(agent_dir).resolve()
+        current = package_hash(agent_dir)
+        with self._record(agent_dir) as record:
+            wheel = record.get("wheel")
+            if record.get("wheel_hash") == current and wheel and os.path.exists(wheel):
+                self._count(record, "hits")
+                logger.info(f"Build cache hit: wheel for {agent_dir.name} ({current[:12]})")
+                return wheel
+
+            self._count(record, "misses")
+            logger.info(f"Build cache miss: building wheel for {agent_dir.name} ({current[:12]})")
+            try:
+                subprocess.run(["poetry", "build", "--format", "wheel"], cwd=agent_dir, check=True)
+            except FileNotFoundError:
+                raise RuntimeError("poetry is needed to build agent wheels, see the README") from None
+            record["wheel"] = self._find_wheel(agent_dir)
+            record["wheel_hash"] = current
+            return record["wheel"]
+
+    @staticmethod
+    def _find_wheel(agent_dir):
+        with open(agent_dir / "pyproject.toml", "rb") as f:
+            project = tomllib.load(f)["tool"]["poetry"]
+        # wheel file names use the normalized distribution name
+        name = re.sub(r"[-_.]+", "_", project["name"]).lower()
+        wheels = glob.glob(str(agent_dir / "dist" / f"{name}-{project['version']}-*.whl"))
+        if not wheels:
+            raise RuntimeError(f"poetry build produced no wheel for {name} {project['version']} in {agent_dir / 'dist'}")
+        return max(wheels, key=os.path.getmtime)
+
+    def claim_image(self, agent_dir):
+        """
+        Decides whether this runner has to rebuild the agent's image.
+
+        Blocks while another live process is building the image for the same hash.
+
+        Args:
+            agent_dir (str | Path): Directory with pyproject.toml and the agent/ package.
+
+        Returns:
+            bool: True if the caller must pass force_rebuild_agent_image=True and then call image_built.
+        """
+        agent_dir = Path(agent_dir).resolve()
+        current = package_hash(agent_dir)
+        waited = False
+        while True:
+            with self._record(agent_dir) as record:
+                if record.get("image_hash") == current:
+                    self._count(record, "hits")
+                    logger.info(f"Build cache hit: image for {agent_dir.name} ({current[:12]})")
+                    return False
+                builder = record.get("image_builder")
+                if builder is None or builder["hash"] != current or not _pid_alive(builder["pid"]):
+                    self._count(record, "misses")
+                    record["image_builder"] = {"hash": current, "pid": os.getpid()}
+                    logger.info(f"Build cache miss: image for {agent_dir.name} ({current[:12]}) will be rebuilt")
+                    return True
+            if not waited:
+                logger.info(f"Waiting for process {builder['pid']} to build the image for {agent_dir.name}")
+                waited = True
+            time.sleep(CLAIM_POLL_SECONDS)
+
+    def image_built(self, agent_dir, ok=True):
+        """
+        Ends a claim from claim_image.
+
+        Args:
+            agent_dir (str | Path): Directory with pyproject.toml and the agent/ package.
+            ok (bool): False if the build (or the game that ran it) failed, the next runner rebuilds.
+        """
+        agent_dir = Path(agent_dir).resolve()
+        with self._record(agent_dir) as record:
+            builder = record.pop("image_builder", None)
+            if ok and builder is not None:
+                record["image_hash"] = builder["hash"]
+
+    @contextmanager
+    def image(self, *agent_dirs):
+        """
+        claim_image and image_built around one game, for runners that run a single game.
+
+        Args:
+            agent_dirs (str | Path): Every agent package the game uses.
+
+        Yields:
+            bool: The force_rebuild_agent_image(s) value to pass to the runner. The builds
+                are recorded if the block finishes without an exception.
+        """
+        claimed = [agent_dir for agent_dir in agent_dirs if self.claim_image(agent_dir)]
+        ok = False
+        try:
+            yield bool(claimed)
+            ok = True
+        finally:
+            for agent_dir in claimed:
+                self.image_built(agent_dir, ok)
+
+    def stats(self, agent_dir):
+        """Hit and miss counts for an agent directory."""
+        path = self._record_path(agent_dir)
+        if not path.exists():
+            return {"hits": 0, "misses": 0}
+        return json.loads(path.read_text()).get("stats", {"hits": 0, "misses": 0})
@@ -0,0 +1,278 @@
+"""
+Runs many werewolf games at once, each in its own worker process.
+
+Every game gets its own free com server port, picked when the game is
+submitted so it is still free when the game starts, and picked again if the
+runner finds it taken after all. If the agent image has to be
+rebuilt, one game builds it before the others start, so workers don't race
+to build the same image. The number of workers is bounded by CPU count,
+available memory and, if given, the API quota. Results are yielded as each
+game finishes, so callers can save them while the rest are still running.
+
+A game is a plain dict, so it can be sent to a worker process:
+
+    {
+        "game_number": 1,
+        "agents": [{"player_name": ..., "agent_wheel_path": ..., "module_path": ...,
+                    "agent_class_name": ..., "agent_config_file_path": ...}],
+        "api_keys": [...],
+        "transcript_dir": "transcripts",
+        "player_roles": None,            # {player name: SentientWerewolfRoles}, optional
+        "force_rebuild_agent_image": True,
+        "metrics_dir": None,             # optional, the agents' instrumentation records and traces go here
+    }
+
+A single agent without player_roles is run with run_locally (against the
+default agents), anything else with run_with_your_agents.
+
+With a metrics_dir, the game's agents post their instrumentation records to a
+MetricsServer (batch/metrics_server.py) started for the game, whose URL they
+get as metrics_url in a per-game copy of their config.yaml. The records end up
+in metrics_dir, where the game's histograms and merged trace are written when
+it is over.
+"""
+import errno
+import json
+import logging
+import multiprocessing
+import os
+import socket
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from batch.metrics import METRICS_DIR_ENV, write_histograms
+from batch.metrics_server import MetricsServer
+from batch.trace import merge_traces
+
+logger = logging.getLogger("executor")
+
+DEFAULT_MEMORY_PER_GAME_GB = 2.0
+DEFAULT_REQUESTS_PER_GAME_MINUTE = 40
+# times a game is started on another port when its port was taken in the meantime
+PORT_RETRIES = 3
+
+
+def port_is_free(port):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind(("", port))
+        except OSError:
+            return False
+    return True
+
+
+def free_port(start=None, exclude=()):
+    """
+    Finds a port no other process is listening on.
+
+    Args:
+        start (int): Scan upwards from this port, by default the OS picks a free ephemeral port.
+        exclude (Collection): Ports not to return, e.g. those of games that haven't bound theirs yet.
+
+    Returns:
+        int: A free port.
+    """
+    if start is None:
+        while True:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.bind(("", 0))
+                port = s.getsockname()[1]
+            if port not in exclude:
+                return port
+    port = start
+    while port in exclude or not port_is_free(port):
+        port += 1
+    return port
+
+
+def available_memory_bytes():
+    """Memory available to new processes, None if it can't be read on this platform."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_workers(memory_per_game_gb=DEFAULT_MEMORY_PER_GAME_GB, api_requests_per_minute=None,
+                    requests_per_game_minute=DEFAULT_REQUESTS_PER_GAME_MINUTE):
+    """
+    How many games to run at once on this machine.
+
+    Args:
+        memory_per_game_gb (float): Memory one game needs (its agent containers and the runner).
+        api_requests_per_minute (int): Request quota of the API key, None if unknown.
+        requests_per_game_minute (int): Requests one game sends per minute.
+
+    Returns:
+        int: The smallest of the CPU, memory and quota bounds, at least 1.
+    """
+    bounds = [os.cpu_count() or 1]
+    memory = available_memory_bytes()
+    if memory is not None:
+        bounds.append(int(memory // (memory_per_game_gb * 1024 ** 3)))
+    if api_requests_per_minute:
+        bounds.append(api_requests_per_minute // requests_per_game_minute)
+    return max(1, min(bounds))
+
+
+def _metrics_config(agent, metrics_url, metrics_dir):
+    # the agent's config.yaml plus metrics_url, written for this game only. JSON is valid YAML,
+    # so the url is quoted safely without a YAML library
+    source = Path(agent.get("agent_config_file_path") or "")
+    text = source.read_text() if source.is_file() else ""
+    path = Path(metrics_dir) / "config" / f"{agent['player_name']}.yaml"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"{text.rstrip()}\n# added for this game by batch/executor.py\nmetrics_url: {json.dumps(metrics_url)}\n")
+    return {**agent, "agent_config_file_path": str(path.resolve())}
+
+
+def run_game(game):
+    """
+    Runs one game, in a worker process.
+
+    Args:
+        game (dict): The game, see the module docstring, with "port" set. If the port is
+            taken by the time the runner binds it, the game is started again on a free one.
+
+    Returns:
+        dict: {"game_number", "port", "results"} or, if the game failed,
+            {"game_number", "port", "error", "status": "failed"}. With a metrics_dir,
+            "metrics" is the path of the game's histograms and "trace" the path of its
+            merged trace, or None with the reason in "metrics_missing" if no agent sent records.
+    """
+    metrics_dir = game.get("metrics_dir")
+    if not metrics_dir:
+        return _run_on_free_port(game)
+
+    Path(metrics_dir).mkdir(parents=True, exist_ok=True)
+    # agents in this process and its children find the directory through the environment, see batch/metrics.py
+    os.environ[METRICS_DIR_ENV] = str(Path(metrics_dir).resolve())
+    # the runner's containers don't see it, their agents post their records to this server instead
+    server = MetricsServer(metrics_dir).start()
+    try:
+        agents = [_metrics_config(agent, server.url, metrics_dir) for agent in game["agents"]]
+        result = _run_on_free_port({**game, "agents": agents})
+    finally:
+        server.stop()
+        # worker processes are reused, the next game may not want records
+        os.environ.pop(METRICS_DIR_ENV, None)
+
+    game_ids = {
+        "game_number": game["game_number"],
+        "activity_id": (result.get("results") or {}).get("activity_id"),
+    }
+    histograms = write_histograms(metrics_dir, **game_ids)
+    trace = merge_traces(metrics_dir, **game_ids)
+    result["metrics"] = str(histograms) if histograms is not None else None
+    result["trace"] = str(trace) if trace is not None else None
+    if histograms is None and "error" in result:
+        result["metrics_missing"] = "the game failed"
+    elif histograms is None:
+        result["metrics_missing"] = (
+            f"no agent sent instrumentation records to {server.url}, check that the agents' containers "
+            f"reach this machine under that name (set $WEREWOLF_METRICS_HOST otherwise)"
+        )
+        logger.warning(f"Game {game['game_number']}: {result['metrics_missing']}")
+    return result
+
+
+def _run_on_free_port(game):
+    # another process can take the port between picking and binding it
+    for _ in range(PORT_RETRIES):
+        result = _run_game(game)
+        if not result.pop("port_in_use", False):
+            return result
+        logger.warning(f"Game {game['game_number']}: port {game['port']} is taken, starting it on another one")
+        game = {**game, "port": free_port()}
+    return result
+
+
+def _run_game(game):
+    try:
+        from sentient_campaign.activity_runner.runner import PlayerAgentConfig, WerewolfCampaignActivityRunner
+
+        runner = WerewolfCampaignActivityRunner(com_server_port=game["port"])
+        agents = [PlayerAgentConfig(**agent) for agent in game["agents"]]
+        if len(agents) == 1 and not game.get("player_roles"):
+            results = runner.run_locally(
+                agents[0],
+                game["api_keys"],
+                path_to_final_transcript_dump=game.get("transcript_dir", "transcripts"),
+                force_rebuild_agent_image=game.get("force_rebuild_agent_image", False),
+            )
+        else:
+            results = runner.run_with_your_agents(
+                agents,
+                players_sentient_llm_api_keys=game["api_keys"],
+                path_to_final_transcript_dump=game.get("transcript_dir", "transcripts"),
+                player_roles=game.get("player_roles"),
+                force_rebuild_agent_images=game.get("force_rebuild_agent_image", False),
+            )
+        return {"game_number": game["game_number"], "port": game["port"], "results": results}
+    except Exception as e:
+        failed = {"game_number": game["game_number"], "port": game["port"], "error": str(e), "status": "failed"}
+        if isinstance(e, OSError) and e.errno == errno.EADDRINUSE:
+            failed["port_in_use"] = True
+        return failed
+
+
+def run_games(games, workers=None, start_port=None, on_rebuilt=None):
+    """
+    Runs games in parallel and yields each result as soon as its game ends.
+
+    Args:
+        games (list): Games, see the module docstring.
+        workers (int): Games run at once, defaults to default_workers().
+        start_port (int): First port to try, by default the OS picks free ports. Each game's
+            port is picked when it is submitted, skipping those of the running games.
+        on_rebuilt (Callable): Called with the result of the game that rebuilt the image,
+            before the other games start (see BuildCache.image_built).
+
+    Yields:
+        dict: run_game's result for each game, in the order the games finish.
+    """
+    games = [dict(game) for game in games]
+    if not games:
+        return
+    workers = min(workers or default_workers(), len(games))
+
+    # build the image once, then every game reuses it
+    rebuild = any(game.get("force_rebuild_agent_image") for game in games)
+    for game in games:
+        game["force_rebuild_agent_image"] = False
+    queued = list(reversed(games))
+    # port of each running game, the runner may not have bound it yet
+    ports = {}
+
+    def submit(pool, game):
+        game = {**game, "port": free_port(start_port, exclude=set(ports.values()))}
+        future = pool.submit(run_game, game)
+        ports[future] = game["port"]
+        return future
+
+    # spawn, the runner's docker and server threads don't survive a fork
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        if rebuild:
+            first = queued.pop()
+            future = submit(pool, {**first, "force_rebuild_agent_image": True})
+            result = future.result()
+            del ports[future]
+            if on_rebuilt is not None:
+                on_rebuilt(result)
+            yield result
+
+        running = set()
+        while queued or running:
+            while queued and len(running) < workers:
+                running.add(submit(pool, queued.pop()))
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del ports[future]
+                yield future.result()
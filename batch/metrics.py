@@ -0,0 +1,202 @@
+"""
+Latency and token histograms from the agents' instrumentation records.
+
+The agents' agent/instrumentation.py appends one JSON record per handled
+message and per LLM call to their metrics_dir, or else the directory in
+WEREWOLF_METRICS_DIR. The batch executor creates <batch dir>/metrics/game_<n>/
+for every game, sets that variable in its worker while the game runs and,
+once the game is over, writes histograms.json next to the records:
+p50/p95/p99/max of the handler and LLM call times, grouped by agent class,
+role, game phase and message type, with the LLM queue wait, retries, tokens
+and calls per message of each group.
+
+The variable only reaches agents in the worker's process and its children.
+The runner's containers don't inherit it, so run_game also serves the
+directory with a MetricsServer (batch/metrics_server.py) and gives those
+agents its URL as metrics_url in their config. Agents run in-process, e.g. by
+harness/replay.py, read the variable of the process that runs them.
+
+    python -m batch.metrics game_results/batch_1730000000/metrics/game_3
+    python -m batch.metrics game_results/batch_1730000000/metrics --json
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+
+METRICS_DIR_ENV = "WEREWOLF_METRICS_DIR"
+HISTOGRAM_FILE = "histograms.json"
+GROUP_KEYS = ("agent_class", "role", "phase", "message_type")
+PERCENTILES = (50, 95, 99)
+
+
+def read_records(*paths):
+    """
+    Reads instrumentation records.
+
+    Args:
+        *paths (str | Path): Record files, or directories searched recursively for *.jsonl.
+
+    Returns:
+        list: The records, lines that aren't JSON objects are skipped.
+    """
+    records = []
+    for path in paths:
+        path = Path(path)
+        files = sorted(path.rglob("*.jsonl")) if path.is_dir() else [path]
+        for file in files:
+            with open(file) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict) and "kind" in record:
+                        records.append(record)
+    return records
+
+
+def distribution(values, percentiles=PERCENTILES):
+    """
+    Nearest-rank percentiles of some values.
+
+    Returns:
+        dict: count, mean, max and p<n> for every n of percentiles, {"count": 0} without values.
+    """
+    ordered = sorted(value for value in values if value is not None)
+    if not ordered:
+        return {"count": 0}
+    result = {"count": len(ordered), "mean": sum(ordered) / len(ordered)}
+    for percentile in percentiles:
+        rank = max(1, -(-percentile * len(ordered) // 100))
+        result[f"p{percentile}"] = ordered[rank - 1]
+    result["max"] = ordered[-1]
+    return result
+
+
+def _group(record, keys):
+    return tuple(record.get(key) for key in keys)
+
+
+def summarize(records):
+    """
+    Groups records and computes their histograms.
+
+    Args:
+        records (list): From read_records.
+
+    Returns:
+        dict: "handlers" and "llm", each a list of groups with the GROUP_KEYS (plus kind for
+            handlers and priority for LLM calls), "wall" and, for LLM calls, "queue_wait"
+            distributions in seconds, and "llm_calls_per_message" for handlers.
+    """
+    handlers = defaultdict(list)
+    llm = defaultdict(list)
+    llm_per_message = defaultdict(int)
+    for record in records:
+        if record["kind"] == "llm":
+            llm[_group(record, GROUP_KEYS + ("priority",))].append(record)
+            if record.get("message_id") is not None:
+                llm_per_message[(record.get("agent"), record["message_id"])] += 1
+        else:
+            handlers[(record["kind"],) + _group(record, GROUP_KEYS)].append(record)
+
+    handler_groups = []
+    for key, group in sorted(handlers.items(), key=lambda item: tuple(str(part) for part in item[0])):
+        handler_groups.append({
+            **dict(zip(("kind",) + GROUP_KEYS, key)),
+            "wall": distribution([record["wall"] for record in group]),
+            # background work queued by a message finishes after its handler, so count from the LLM records
+            "llm_calls_per_message": distribution([
+                llm_per_message.get((record.get("agent"), record.get("message_id")), 0) for record in group
+            ]),
+            "errors": sum(1 for record in group if record.get("error")),
+        })
+
+    llm_groups = []
+    for key, group in sorted(llm.items(), key=lambda item: tuple(str(part) for part in item[0])):
+        llm_groups.append({
+            **dict(zip(GROUP_KEYS + ("priority",), key)),
+            "wall": distribution([record["wall"] for record in group]),
+            "queue_wait": distribution([record.get("queue_wait") for record in group]),
+            "retries": sum(record.get("retries") or 0 for record in group),
+            "prompt_tokens": sum(record.get("prompt_tokens") or 0 for record in group),
+            "completion_tokens": sum(record.get("completion_tokens") or 0 for record in group),
+            "errors": sum(1 for record in group if record.get("error")),
+        })
+
+    return {"records": len(records), "handlers": handler_groups, "llm": llm_groups}
+
+
+def write_histograms(metrics_dir, **extra):
+    """
+    Writes histograms.json for the records of one game.
+
+    Args:
+        metrics_dir (str | Path): The game's metrics directory.
+        **extra: Fields stored alongside, e.g. game_number and activity_id.
+
+    Returns:
+        Path | None: The histogram file, None if the directory holds no records.
+    """
+    metrics_dir = Path(metrics_dir)
+    records = read_records(metrics_dir) if metrics_dir.is_dir() else []
+    if not records:
+        return None
+    path = metrics_dir / HISTOGRAM_FILE
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump({**extra, **summarize(records)}, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def _ms(stats, name):
+    return f"{stats[name] * 1000:>9.0f}" if name in stats else f"{'-':>9}"
+
+
+def format_summary(summary):
+    """The histograms as text tables, times in milliseconds."""
+    lines = []
+    header = f"{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    lines.append(f"{'handler':<8}{'agent':<20}{'role':<10}{'phase':<7}{'message':<16}{'count':>6}{header}{'llm/msg':>9}")
+    for group in summary["handlers"]:
+        wall = group["wall"]
+        lines.append(
+            f"{group['kind']:<8}{str(group['agent_class']):<20}{str(group['role']):<10}{str(group['phase']):<7}"
+            f"{str(group['message_type']):<16}{wall['count']:>6}"
+            + "".join(_ms(wall, name) for name in ("p50", "p95", "p99", "max"))
+            + f"{group['llm_calls_per_message'].get('mean', 0):>9.1f}"
+        )
+    lines.append("")
+    lines.append(f"{'llm':<8}{'agent':<20}{'role':<10}{'phase':<7}{'message':<16}{'count':>6}{header}"
+                 f"{'wait p95':>9}{'retries':>8}{'tokens in/out':>16}")
+    for group in summary["llm"]:
+        wall = group["wall"]
+        lines.append(
+            f"{str(group['priority']):<8}{str(group['agent_class']):<20}{str(group['role']):<10}{str(group['phase']):<7}"
+            f"{str(group['message_type']):<16}{wall['count']:>6}"
+            + "".join(_ms(wall, name) for name in ("p50", "p95", "p99", "max"))
+            + _ms(group["queue_wait"], "p95")
+            + f"{group['retries']:>8}{group['prompt_tokens']:>9}/{group['completion_tokens']:<6}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency and token histograms of agent instrumentation records")
+    parser.add_argument("paths", nargs="+", help="Metrics directories or record files")
+    parser.add_argument("--json", action="store_true", help="Print the histograms as JSON")
+    args = parser.parse_args(argv)
+
+    summary = summarize(read_records(*args.paths))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"{summary['records']} records")
+        print(format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Collects the instrumentation records of agents that run in containers.
+
+The runner starts every agent in a Docker container, which neither inherits
+the worker's environment nor sees the host's directories, so agents there
+can't write to the game's metrics directory themselves. run_game starts a
+MetricsServer for the game instead and gives every agent its URL as
+metrics_url in a per-game copy of its config.yaml. The agents' instrumentation
+then posts the lines of its record and trace files (see the agents'
+agent/instrumentation.py) and the server appends them to files of the same
+name in the metrics directory, where batch/metrics.py and batch/trace.py read
+them like records written locally.
+
+    POST /<agent>_<instance>.jsonl          body: lines to append
+    POST /<agent>_<instance>.trace.json
+
+Containers reach the host as host.docker.internal, or with the
+WEREWOLF_METRICS_HOST environment variable as whatever name or address
+works for your Docker setup (e.g. 127.0.0.1 with host networking).
+"""
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote
+
+METRICS_HOST_ENV = "WEREWOLF_METRICS_HOST"
+DEFAULT_CONTAINER_HOST = "host.docker.internal"
+# one request carries whatever an agent wrote since its last one, a game's records are a few MB at most
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+# only the instrumentation's own file names, never a path
+_FILE_NAME_RE = re.compile(r"^[\w.-]+\.(jsonl|trace\.json)$")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    metrics_dir = None
+    lock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        name = unquote(self.path.lstrip("/"))
+        length = int(self.headers.get("Content-Length") or 0)
+        if not _FILE_NAME_RE.match(name) or name.startswith(".") or length > MAX_BODY_BYTES:
+            self.send_response(400)
+            self.end_headers()
+            return
+        body = self.rfile.read(length)
+        # one agent's lines arrive in order on one connection at a time, the lock keeps writes whole
+        with self.lock, open(Path(self.metrics_dir) / name, "ab") as f:
+            f.write(body)
+        self.send_response(204)
+        self.end_headers()
+
+
+class MetricsServer:
+    """
+    Appends the records agents post to a game's metrics directory, served from a background thread.
+
+    Args:
+        metrics_dir (str | Path): The game's metrics directory.
+        host (str): Interface to listen on, all of them by default so containers can connect.
+        port (int): Port, 0 for any free port.
+        container_host (str): How the agents' containers reach this machine, by default
+            $WEREWOLF_METRICS_HOST or host.docker.internal.
+    """
+
+    def __init__(self, metrics_dir, host="0.0.0.0", port=0, container_host=None):
+        self.metrics_dir = Path(metrics_dir)
+        self.metrics_dir.mkdir(parents=True, exist_ok=True)
+        self.container_host = container_host or os.environ.get(METRICS_HOST_ENV) or DEFAULT_CONTAINER_HOST
+        handler = type("MetricsHandler", (_Handler,), {"metrics_dir": self.metrics_dir, "lock": threading.Lock()})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def url(self):
+        """The URL the agents post to, as seen from their containers."""
+        return f"http://{self.container_host}:{self.port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
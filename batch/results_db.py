@@ -0,0 +1,461 @@
+"""
+SQLite database of game results, with a small query API and CLI.
+
+Ingests what the runners write:
+
+- batch directories from multirunner.py (results.jsonl, or the older
+  game_<n>_results_<id>.json files), the agent is read from the batch summary
+  or, for older batches, from the agent directory the batch sits in;
+- game_result_<id>.log files from versus_runner.py, JSON or the older
+  str(game_result) format.
+
+Ingestion is incremental: files already ingested are skipped unless they
+changed, and results.jsonl is read from where the last ingest stopped. Games
+are keyed by activity id, so ingesting the same game twice keeps one row.
+
+    python batch/results_db.py ingest game_results src/werewolf_agents/cot_sample/game_results
+    python batch/results_db.py win-rate --agent cot --role wolf --last 500
+    python batch/results_db.py roles --agent cot
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+DEFAULT_DB_PATH = "game_results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    activity_id TEXT UNIQUE,
+    batch TEXT,
+    source TEXT,
+    finished_at REAL,
+    status TEXT,
+    winner TEXT,
+    error TEXT,
+    raw TEXT
+);
+CREATE TABLE IF NOT EXISTS players (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    name TEXT,
+    agent TEXT,
+    role TEXT,
+    won INTEGER,
+    PRIMARY KEY (game_id, name)
+);
+CREATE TABLE IF NOT EXISTS ingested_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    offset INTEGER
+);
+CREATE INDEX IF NOT EXISTS games_winner ON games(winner);
+CREATE INDEX IF NOT EXISTS games_batch ON games(batch);
+CREATE INDEX IF NOT EXISTS games_finished_at ON games(finished_at);
+CREATE INDEX IF NOT EXISTS players_agent_role ON players(agent, role, game_id);
+CREATE INDEX IF NOT EXISTS players_role ON players(role);
+"""
+
+WINNER_KEYS = ("winner", "winning_team", "winners", "game_winner", "winning_side")
+ROLE_MAP_KEYS = ("player_roles", "roles", "players_roles", "role_assignment")
+_ENUM_REPR_RE = re.compile(r"<\w+\.(\w+): '([^']*)'>")
+_BATCH_DIR_RE = re.compile(r"batch_(\d+)$")
+
+
+def normalize_role(role):
+    role = _ENUM_REPR_RE.sub(r"\2", str(getattr(role, "value", role))).strip().lower()
+    # "SentientWerewolfRoles.WOLF" when an enum was written with str()
+    role = role.rsplit(".", 1)[-1]
+    return "wolf" if role in ("werewolf", "wolves", "werewolves") else role
+
+
+def normalize_winner(winner):
+    if winner is None:
+        return None
+    text = str(winner).lower()
+    if "wolf" in text or "wolves" in text:
+        return "wolves"
+    if "villag" in text:
+        return "villagers"
+    return text
+
+
+def agent_label(agent_dir_name):
+    # the same labels versus_runner.py uses, e.g. cot_sample -> cot
+    return agent_dir_name[:-len("_sample")] if agent_dir_name.endswith("_sample") else agent_dir_name
+
+
+def _find_key(obj, keys, depth=4):
+    # first value stored under one of keys, searched breadth first through nested dicts
+    level = [obj]
+    for _ in range(depth):
+        next_level = []
+        for item in level:
+            if isinstance(item, dict):
+                for key in keys:
+                    if item.get(key) is not None:
+                        return item[key]
+                next_level.extend(value for value in item.values() if isinstance(value, (dict, list)))
+            elif isinstance(item, list):
+                next_level.extend(value for value in item if isinstance(value, (dict, list)))
+        level = next_level
+    return None
+
+
+def _parse_legacy_log(text):
+    # versus_runner.py used to write str(game_result) then "Player Classes: {...}" with enum reprs
+    text = _ENUM_REPR_RE.sub(lambda m: repr(m.group(2)), text)
+    result_text, _, classes_text = text.partition("\nPlayer Classes: ")
+    result = ast.literal_eval(result_text.strip())
+    classes = ast.literal_eval(classes_text.strip()) if classes_text.strip() else {}
+    return result, classes
+
+
+def read_versus_log(path):
+    """
+    Reads a game_result_<id>.log written by versus_runner.py.
+
+    Returns:
+        tuple: (game result dict, player classes {player: {"role", "agent"}}).
+    """
+    text = Path(path).read_text()
+    try:
+        data = json.loads(text)
+        return data["game_result"], data.get("player_classes", {})
+    except ValueError:
+        return _parse_legacy_log(text)
+
+
+def extract_game(results, agents=None, player_classes=None):
+    """
+    Pulls the indexed fields out of one game's results.
+
+    Args:
+        results (dict): The runner's game result.
+        agents (dict): Player name to agent label, for the players the batch controlled.
+        player_classes (dict): versus_runner's {player: {"role", "agent"}}.
+
+    Returns:
+        dict: activity_id, winner and players [{"name", "agent", "role", "won"}].
+    """
+    winner = normalize_winner(_find_key(results, WINNER_KEYS))
+    roles = _find_key(results, ROLE_MAP_KEYS) or {}
+    players = {}
+    if isinstance(roles, dict):
+        for name, role in roles.items():
+            if isinstance(role, dict):
+                role = role.get("role")
+            players[name] = {"name": name, "agent": None, "role": normalize_role(role) if role is not None else None}
+    for name, config in (player_classes or {}).items():
+        entry = players.setdefault(name, {"name": name, "agent": None, "role": None})
+        entry["agent"] = config.get("agent")
+        if entry["role"] is None and config.get("role") is not None:
+            entry["role"] = normalize_role(config["role"])
+    for name, agent in (agents or {}).items():
+        players.setdefault(name, {"name": name, "agent": None, "role": None})["agent"] = agent
+    for entry in players.values():
+        entry["won"] = None if winner is None or entry["role"] is None else int((entry["role"] == "wolf") == (winner == "wolves"))
+    return {"activity_id": results.get("activity_id"), "winner": winner, "players": list(players.values())}
+
+
+class ResultsDB:
+    """
+    Game results indexed by agent, role, winner, batch and time.
+
+    Args:
+        path (str): SQLite file, created on first use.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # ---- ingestion ---- #
+
+    def add_game(self, results, batch=None, source=None, finished_at=None, agents=None, player_classes=None,
+                 status="completed", error=None):
+        """
+        Inserts or replaces one game.
+
+        Returns:
+            int: Row id of the game.
+        """
+        game = extract_game(results or {}, agents, player_classes)
+        activity_id = game["activity_id"] or f"{source}#{batch}#{finished_at}"
+        self.conn.execute("DELETE FROM games WHERE activity_id = ?", (activity_id,))
+        cursor = self.conn.execute(
+            "INSERT INTO games (activity_id, batch, source, finished_at, status, winner, error, raw) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (activity_id, batch, source, finished_at, status, game["winner"], error, json.dumps(results, default=str)),
+        )
+        game_id = cursor.lastrowid
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO players (game_id, name, agent, role, won) VALUES (?, ?, ?, ?, ?)",
+            [(game_id, p["name"], p["agent"], p["role"], p["won"]) for p in game["players"]],
+        )
+        return game_id
+
+    def _file_state(self, path):
+        row = self.conn.execute("SELECT size, mtime, offset FROM ingested_files WHERE path = ?", (path,)).fetchone()
+        return (row["size"], row["mtime"], row["offset"]) if row else (None, None, 0)
+
+    def _mark_file(self, path, offset=0):
+        stat = os.stat(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ingested_files (path, size, mtime, offset) VALUES (?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime, offset),
+        )
+
+    def _unchanged(self, path):
+        size, mtime, _ = self._file_state(path)
+        stat = os.stat(path)
+        return size == stat.st_size and mtime == stat.st_mtime
+
+    def ingest(self, *paths):
+        """
+        Ingests batch directories, result files and versus logs, recursing into directories.
+
+        Returns:
+            int: Number of games added or updated.
+        """
+        added = 0
+        for path in paths:
+            path = Path(path)
+            if path.is_dir():
+                for batch_dir in sorted({p.parent for p in path.rglob("batch_*_summary.json")} | ({path} if _BATCH_DIR_RE.search(path.name) else set())):
+                    added += self._ingest_batch(batch_dir)
+                for log in sorted(path.rglob("game_result_*.log")):
+                    added += self._ingest_versus_log(log)
+            elif path.name.startswith("game_result_"):
+                added += self._ingest_versus_log(path)
+            elif path.parent.name.startswith("batch_"):
+                added += self._ingest_batch(path.parent)
+        self.conn.commit()
+        return added
+
+    def _batch_info(self, batch_dir):
+        summaries = sorted(batch_dir.glob("batch_*_summary.json"))
+        summary = json.loads(summaries[-1].read_text()) if summaries else {}
+        batch = str(summary.get("batch_id") or batch_dir.name)
+        agents = summary.get("agents")
+        if agents is not None:
+            agents = {name: agent_label(agent) for name, agent in agents.items()}
+        else:
+            # older batches: the batch sits in <agent dir>/game_results/batch_<id>
+            agents = {None: agent_label(batch_dir.resolve().parent.parent.name)}
+        return batch, agents
+
+    def _ingest_batch(self, batch_dir):
+        batch_dir = Path(batch_dir)
+        batch, agents = self._batch_info(batch_dir)
+        jsonl = batch_dir / "results.jsonl"
+        if jsonl.exists():
+            return self._ingest_jsonl(jsonl, batch, agents)
+
+        added = 0
+        for result_file in sorted(batch_dir.glob("game_*_results_*.json")):
+            key = str(result_file.resolve())
+            if self._unchanged(key):
+                continue
+            results = json.loads(result_file.read_text())
+            self.add_game(results, batch, key, result_file.stat().st_mtime, self._resolve_agents(agents, results))
+            self._mark_file(key)
+            added += 1
+        return added
+
+    def _ingest_jsonl(self, jsonl, batch, agents):
+        key = str(jsonl.resolve())
+        size, _, offset = self._file_state(key)
+        if size is not None and os.path.getsize(key) < offset:
+            offset = 0  # the file was replaced
+        added = 0
+        with open(key, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # still being written
+                offset += len(line)
+                record = json.loads(line)
+                results = record.get("results") or {"activity_id": None}
+                self.add_game(
+                    results, batch, key, record.get("finished_at"), self._resolve_agents(agents, results),
+                    player_classes=record.get("player_classes"),
+                    status=record.get("status", "completed"), error=record.get("error"),
+                )
+                added += 1
+        self._mark_file(key, offset)
+        return added
+
+    @staticmethod
+    def _resolve_agents(agents, results):
+        # the None key stands for "the batch's own player", matched by name if the results list players
+        if None not in agents:
+            return agents
+        label = agents[None]
+        roles = _find_key(results, ROLE_MAP_KEYS)
+        return {name: label for name in roles} if isinstance(roles, dict) and len(roles) == 1 else {}
+
+    def _ingest_versus_log(self, log):
+        key = str(Path(log).resolve())
+        if self._unchanged(key):
+            return 0
+        results, classes = read_versus_log(log)
+        self.add_game(results, "versus", key, os.path.getmtime(key), player_classes=classes)
+        self._mark_file(key)
+        return 1
+
+    # ---- queries ---- #
+
+    def _filtered_games(self, agent=None, role=None, batch=None, since=None, last=None):
+        # the matching players of the latest `last` matching games, as a subquery and its parameters
+        game_where, game_params = ["g.status = 'completed'"], []
+        player_where, player_params = [], []
+        if agent is not None:
+            player_where.append("p.agent = ?")
+            player_params.append(agent)
+        if role is not None:
+            player_where.append("p.role = ?")
+            player_params.append(normalize_role(role))
+        if batch is not None:
+            game_where.append("g.batch = ?")
+            game_params.append(str(batch))
+        if since is not None:
+            game_where.append("g.finished_at >= ?")
+            game_params.append(since)
+        players = " AND ".join(player_where) or "1"
+        # the limit counts games, a game has a row per matching player
+        game_ids = (
+            f"SELECT g.id FROM games g WHERE {' AND '.join(game_where)}"
+            f" AND EXISTS (SELECT 1 FROM players p WHERE p.game_id = g.id AND {players})"
+            " ORDER BY g.finished_at DESC"
+        )
+        params = game_params + player_params
+        if last is not None:
+            game_ids += " LIMIT ?"
+            params.append(last)
+        query = f"SELECT p.game_id, p.won, p.role FROM players p WHERE p.game_id IN ({game_ids}) AND {players}"
+        return query, params + player_params
+
+    def win_rate(self, agent=None, role=None, batch=None, since=None, last=None):
+        """
+        Win rate of the players matching the filters.
+
+        Args:
+            agent (str): Agent label, e.g. "cot".
+            role (str): "wolf", "villager", "seer" or "doctor".
+            batch (str): Batch id.
+            since (float): Only games finished after this unix time.
+            last (int): Only the latest N matching games.
+
+        Returns:
+            dict: games, wins and win_rate (None without decided games).
+        """
+        query, params = self._filtered_games(agent, role, batch, since, last)
+        row = self.conn.execute(
+            f"SELECT COUNT(*) AS games, SUM(won) AS wins, COUNT(won) AS decided FROM ({query})", params
+        ).fetchone()
+        return {
+            "games": row["games"],
+            "wins": row["wins"] or 0,
+            "win_rate": (row["wins"] or 0) / row["decided"] if row["decided"] else None,
+        }
+
+    def by_role(self, agent=None, batch=None, since=None, last=None):
+        """Win rate per role, {role: {"games", "wins", "win_rate"}}."""
+        query, params = self._filtered_games(agent, None, batch, since, last)
+        rows = self.conn.execute(
+            f"SELECT role, COUNT(*) AS games, SUM(won) AS wins, COUNT(won) AS decided FROM ({query}) GROUP BY role", params
+        )
+        return {
+            row["role"]: {
+                "games": row["games"],
+                "wins": row["wins"] or 0,
+                "win_rate": (row["wins"] or 0) / row["decided"] if row["decided"] else None,
+            }
+            for row in rows
+        }
+
+    def games(self, agent=None, role=None, batch=None, since=None, last=None):
+        """Yields matching games, newest first, as dicts without the raw results."""
+        query, params = self._filtered_games(agent, role, batch, since, last)
+        rows = self.conn.execute(
+            f"SELECT g.activity_id, g.batch, g.finished_at, g.winner, f.role, f.won FROM ({query}) f JOIN games g ON g.id = f.game_id"
+            " ORDER BY g.finished_at DESC",
+            params,
+        )
+        for row in rows:
+            yield dict(row)
+
+    def query(self, sql, params=()):
+        """Runs a SQL query against the games and players tables, e.g. for ad hoc aggregates."""
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest and query werewolf game results")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help=f"SQLite file (default: {DEFAULT_DB_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Ingest batch directories, result files and versus logs")
+    ingest.add_argument("paths", nargs="+")
+
+    for name, help_text in (("win-rate", "Win rate of the matching players"), ("roles", "Win rate per role"), ("games", "List matching games")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--agent")
+        if name != "roles":
+            command.add_argument("--role")
+        command.add_argument("--batch")
+        command.add_argument("--days", type=float, help="Only games from the last N days")
+        command.add_argument("--last", type=int, help="Only the latest N matching games")
+
+    sql = commands.add_parser("sql", help="Run a SQL query")
+    sql.add_argument("query")
+
+    args = parser.parse_args(argv)
+    with ResultsDB(args.db) as db:
+        if args.command == "ingest":
+            started = time.perf_counter()
+            added = db.ingest(*args.paths)
+            print(f"Ingested {added} games in {time.perf_counter() - started:.2f}s")
+            return
+        if args.command == "sql":
+            for row in db.query(args.query):
+                print(json.dumps(row, default=str))
+            return
+
+        filters = {
+            "agent": args.agent,
+            "batch": args.batch,
+            "since": time.time() - args.days * 86400 if args.days else None,
+            "last": args.last,
+        }
+        if args.command == "roles":
+            result = db.by_role(**filters)
+        elif args.command == "win-rate":
+            result = db.win_rate(role=args.role, **filters)
+        else:
+            for game in db.games(role=args.role, **filters):
+                print(json.dumps(game))
+            return
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Crash-safe, append-only results for a batch of games.
+
+Each finished game is appended to results.jsonl in the batch directory as one
+JSON line, and the batch summary (batch_<id>_summary.json) only holds counters
+that are updated as games arrive, so memory use doesn't grow with the batch.
+Writes are fsynced in batches (every `fsync_every` games or `fsync_interval`
+seconds, whichever comes first) and the summary is rewritten atomically at
+each fsync, so a crash loses at most the games since the last one.
+
+ResultsStore.open() replays an existing results.jsonl, dropping a line cut
+off by a crash, so a batch can be resumed by running only missing_games().
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+RESULTS_FILE = "results.jsonl"
+DEFAULT_FSYNC_EVERY = 10
+DEFAULT_FSYNC_INTERVAL = 5.0
+
+
+def summary_path(batch_dir, batch_id):
+    return Path(batch_dir) / f"batch_{batch_id}_summary.json"
+
+
+class ResultsStore:
+    """
+    Appends game results to a batch directory and keeps the summary up to date.
+
+    Args:
+        batch_dir (str | Path): Directory of the batch, created if missing.
+        batch_id (int): Id used in the summary file name.
+        total_games (int): Number of games in the batch.
+        fsync_every (int): Games written between fsyncs.
+        fsync_interval (float): Seconds between fsyncs when games arrive slowly.
+        metadata: Extra summary fields, e.g. workers.
+    """
+
+    def __init__(self, batch_dir, batch_id, total_games, fsync_every=DEFAULT_FSYNC_EVERY,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL, **metadata):
+        self.batch_dir = Path(batch_dir)
+        self.batch_dir.mkdir(parents=True, exist_ok=True)
+        self.batch_id = batch_id
+        self.total_games = total_games
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.metadata = metadata
+        # latest status per game number, True if the game succeeded, and the counters derived from it
+        self._status = {}
+        self.successful_games = 0
+        self.failed_games = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._replay()
+        self._file = open(self.results_path, "a")
+        # the summary exists from the start, so even a batch that crashes early can be resumed
+        self.flush()
+
+    @classmethod
+    def open(cls, batch_dir, **kwargs):
+        """
+        Reopens an existing batch to resume it.
+
+        Args:
+            batch_dir (str | Path): Directory of the batch.
+            kwargs: Overrides for the stored settings, e.g. total_games.
+
+        Returns:
+            ResultsStore: The store, with the counters of every game already written.
+        """
+        summaries = sorted(Path(batch_dir).glob("batch_*_summary.json"))
+        if not summaries:
+            raise FileNotFoundError(f"No batch summary in {batch_dir}")
+        summary = json.loads(summaries[-1].read_text())
+        metadata = {
+            key: value for key, value in summary.items()
+            if key not in ("batch_id", "total_games", "successful_games", "failed_games", "results_file", "completed")
+        }
+        metadata.update(kwargs)
+        metadata.setdefault("batch_id", summary["batch_id"])
+        metadata.setdefault("total_games", summary["total_games"])
+        return cls(batch_dir, **metadata)
+
+    @property
+    def results_path(self):
+        return self.batch_dir / RESULTS_FILE
+
+    def _replay(self):
+        if not self.results_path.exists():
+            return
+        good_bytes = 0
+        with open(self.results_path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line was cut off by a crash
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                good_bytes += len(line)
+                self._set_status(record["game_number"], record["status"] == "completed")
+        if good_bytes < self.results_path.stat().st_size:
+            os.truncate(self.results_path, good_bytes)
+
+    def _set_status(self, game_number, ok):
+        # a rerun replaces the game's earlier result in the counters
+        previous = self._status.get(game_number)
+        if previous is not None:
+            if previous:
+                self.successful_games -= 1
+            else:
+                self.failed_games -= 1
+        self._status[game_number] = ok
+        if ok:
+            self.successful_games += 1
+        else:
+            self.failed_games += 1
+
+    def missing_games(self):
+        """Game numbers (1 based) without a successful result, failed games are run again."""
+        return [n for n in range(1, self.total_games + 1) if not self._status.get(n)]
+
+    def append(self, game, **extra):
+        """
+        Writes one game's result.
+
+        Args:
+            game (dict): An executor result, {"game_number", "port", "results"} or
+                {"game_number", "port", "error", "status": "failed"}.
+            extra: More fields for the record, e.g. the tournament's player_classes.
+        """
+        ok = "error" not in game
+        record = {
+            "game_number": game["game_number"],
+            "port": game.get("port"),
+            "status": "completed" if ok else "failed",
+            "finished_at": time.time(),
+            **extra,
+        }
+        if ok:
+            record["activity_id"] = game["results"].get("activity_id")
+            record["results"] = game["results"]
+        else:
+            record["error"] = game["error"]
+        self._file.write(json.dumps(record) + "\n")
+        self._set_status(game["game_number"], ok)
+
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.flush()
+
+    @property
+    def summary(self):
+        return {
+            "batch_id": self.batch_id,
+            "total_games": self.total_games,
+            "successful_games": self.successful_games,
+            "failed_games": self.failed_games,
+            "completed": self.successful_games >= self.total_games,
+            "results_file": RESULTS_FILE,
+            **self.metadata,
+        }
+
+    def flush(self):
+        """Fsyncs the results written so far and rewrites the summary."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        path = summary_path(self.batch_dir, self.batch_id)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.summary, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        """Streams the stored records, one dict at a time."""
+        self._file.flush()
+        with open(self.results_path) as f:
+            for line in f:
+                yield json.loads(line)
@@ -0,0 +1,149 @@
+"""
+Bayesian stopping rule for tournaments that compare agents role by role.
+
+A tournament run in waves checks after each wave whether the outcome is
+already clear, instead of always playing the full number of games. For every
+role and every pair of agents, the win rates get Beta(1 + wins, 1 + losses)
+posteriors, and the comparison is decided when, with probability at least
+`confidence`:
+
+    - one agent has the higher win rate, or
+    - the win rates are within `margin` of each other (practically equal).
+
+The tournament stops once every comparison is decided. Comparisons need
+`min_games` games for both agents first, so a lucky first wave can't end
+the evaluation. The posterior probabilities are computed on a grid, so the
+result is deterministic and needs nothing outside the standard library.
+"""
+import itertools
+import math
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_MARGIN = 0.05
+DEFAULT_MIN_GAMES = 10
+GRID_POINTS = 2000
+
+
+def _posterior(wins, games, grid):
+    # Beta(1 + wins, 1 + losses) density on the grid, normalized to probability masses
+    losses = games - wins
+    log_density = [wins * math.log(x) + losses * math.log(1 - x) for x in grid]
+    top = max(log_density)
+    density = [math.exp(value - top) for value in log_density]
+    total = sum(density)
+    return [value / total for value in density]
+
+
+def compare_win_rates(wins_a, games_a, wins_b, games_b, margin=DEFAULT_MARGIN, grid_points=GRID_POINTS):
+    """
+    Posterior probabilities for the win rates of two agents in one role.
+
+    Args:
+        wins_a (int): Wins of agent a.
+        games_a (int): Games of agent a.
+        wins_b (int): Wins of agent b.
+        games_b (int): Games of agent b.
+        margin (float): Win rate difference below which the agents count as equal.
+        grid_points (int): Resolution of the grid the posteriors are evaluated on.
+
+    Returns:
+        tuple: (P(a wins more often), P(b wins more often), P(|difference| < margin)).
+    """
+    grid = [(i + 0.5) / grid_points for i in range(grid_points)]
+    a = _posterior(wins_a, games_a, grid)
+    b = _posterior(wins_b, games_b, grid)
+    # cdf_b[i] = P(b's win rate is below grid point i), counting the point itself as half
+    cdf_b = []
+    below = 0.0
+    for mass in b:
+        cdf_b.append(below + mass / 2)
+        below += mass
+
+    def cdf(i):
+        if i < 0:
+            return 0.0
+        if i >= grid_points:
+            return 1.0
+        return cdf_b[i]
+
+    offset = round(margin * grid_points)
+    a_better = sum(mass * cdf_b[i] for i, mass in enumerate(a))
+    equal = sum(mass * (cdf(i + offset) - cdf(i - offset)) for i, mass in enumerate(a)) if offset else 0.0
+    return a_better, 1 - a_better, equal
+
+
+class SequentialTest:
+    """
+    Decides after each wave of a tournament whether more games are needed.
+
+    Args:
+        confidence (float): Posterior probability a comparison needs to be decided.
+        margin (float): Win rate difference below which two agents count as equal, 0 to
+            only stop when one agent is better.
+        min_games (int): Games each agent needs in a role before its comparisons are decided.
+    """
+
+    def __init__(self, confidence=DEFAULT_CONFIDENCE, margin=DEFAULT_MARGIN, min_games=DEFAULT_MIN_GAMES):
+        if not 0.5 < confidence < 1:
+            raise ValueError(f"confidence must be between 0.5 and 1, got {confidence}")
+        self.confidence = confidence
+        self.margin = margin
+        self.min_games = min_games
+
+    def evaluate(self, standings):
+        """
+        Compares every pair of agents in every role.
+
+        Args:
+            standings (Standings): Games and wins per (agent, role) so far.
+
+        Returns:
+            list: One dict per comparison with role, agents, games, win_rates, p_better,
+                p_equal and decision (the better agent, "equal", or None while undecided).
+        """
+        agents_by_role = {}
+        for agent, role in sorted(standings.games):
+            agents_by_role.setdefault(role, []).append(agent)
+
+        comparisons = []
+        for role, agents in agents_by_role.items():
+            for a, b in itertools.combinations(agents, 2):
+                games = (standings.games[a, role], standings.games[b, role])
+                wins = (standings.wins[a, role], standings.wins[b, role])
+                a_better, b_better, equal = compare_win_rates(wins[0], games[0], wins[1], games[1], self.margin)
+                decision = None
+                if min(games) >= self.min_games:
+                    if a_better >= self.confidence:
+                        decision = a
+                    elif b_better >= self.confidence:
+                        decision = b
+                    elif equal >= self.confidence:
+                        decision = "equal"
+                comparisons.append({
+                    "role": role,
+                    "agents": [a, b],
+                    "games": list(games),
+                    "win_rates": [wins[0] / games[0], wins[1] / games[1]],
+                    "p_better": [a_better, b_better],
+                    "p_equal": equal,
+                    "decision": decision,
+                })
+        return comparisons
+
+    @staticmethod
+    def done(comparisons):
+        """True once there is something to compare and every comparison is decided."""
+        return bool(comparisons) and all(c["decision"] is not None for c in comparisons)
+
+    @staticmethod
+    def format(comparisons):
+        lines = [f"{'role':<10}{'agents':<22}{'win rates':>16}{'P(better)':>16}{'P(equal)':>10}  decision"]
+        for c in comparisons:
+            a, b = c["agents"]
+            lines.append(
+                f"{c['role']:<10}{a + ' vs ' + b:<22}"
+                f"{c['win_rates'][0]:>8.1%}{c['win_rates'][1]:>8.1%}"
+                f"{c['p_better'][0]:>8.3f}{c['p_better'][1]:>8.3f}"
+                f"{c['p_equal']:>10.3f}  {c['decision'] or 'undecided'}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,94 @@
+"""
+Balanced agent/role schedules for tournaments and per (agent, role) standings.
+
+A game has fixed seats (player name and role, e.g. versus_runner's
+ROLE_DISTRIBUTION). latin_square_schedule assigns an agent to every seat so
+that over each block of len(agents) games every agent sits in every seat
+exactly once: the rows of a cyclic Latin square. Each agent therefore plays
+each role equally often. Seat and agent order are shuffled per block, so
+which agents share a team varies between blocks.
+"""
+import random
+from collections import defaultdict
+
+from batch.results_db import extract_game
+
+
+def latin_square_schedule(seats, agents, games, seed=None):
+    """
+    Assigns agents to seats for a number of games.
+
+    Args:
+        seats (list): (player name, role) pairs, one per seat.
+        agents (list): Agent names, e.g. the keys of AGENT_CONFIGS.
+        games (int): Number of games. Use a multiple of len(agents) for an exactly balanced schedule.
+        seed (int): Seed for the per-block shuffles.
+
+    Returns:
+        list: One {player name: agent} dict per game.
+    """
+    rng = random.Random(seed)
+    agents = list(agents)
+    schedule = []
+    while len(schedule) < games:
+        order = agents[:]
+        rng.shuffle(order)
+        seat_order = list(range(len(seats)))
+        rng.shuffle(seat_order)
+        for shift in range(len(agents)):
+            if len(schedule) == games:
+                break
+            schedule.append({
+                seats[seat][0]: order[(position + shift) % len(order)]
+                for position, seat in enumerate(seat_order)
+            })
+    return schedule
+
+
+class Standings:
+    """
+    Games and wins per (agent, role), filled in as tournament games finish.
+    """
+
+    def __init__(self):
+        self.games = defaultdict(int)
+        self.wins = defaultdict(int)
+        self.undecided = 0
+
+    def add(self, results, player_classes):
+        """
+        Counts one finished game.
+
+        Args:
+            results (dict): The runner's game result.
+            player_classes (dict): {player name: {"agent", "role"}} for the game.
+        """
+        game = extract_game(results, player_classes=player_classes)
+        if game["winner"] is None:
+            self.undecided += 1
+            return
+        for player in game["players"]:
+            if player["agent"] is None or player["won"] is None:
+                continue
+            key = (player["agent"], player["role"])
+            self.games[key] += 1
+            self.wins[key] += player["won"]
+
+    def rows(self):
+        """(agent, role, games, wins, win rate) rows, sorted by agent then role."""
+        return [
+            (agent, role, self.games[agent, role], self.wins[agent, role], self.wins[agent, role] / self.games[agent, role])
+            for agent, role in sorted(self.games)
+        ]
+
+    def to_dict(self):
+        standings = defaultdict(dict)
+        for agent, role, games, wins, win_rate in self.rows():
+            standings[agent][role] = {"games": games, "wins": wins, "win_rate": win_rate}
+        return dict(standings)
+
+    def format(self):
+        lines = [f"{'agent':<12}{'role':<10}{'games':>7}{'wins':>7}{'win rate':>10}"]
+        for agent, role, games, wins, win_rate in self.rows():
+            lines.append(f"{agent:<12}{role:<10}{games:>7}{wins:>7}{win_rate:>10.1%}")
+        return "\n".join(lines)
@@ -0,0 +1,111 @@
+"""
+One trace timeline per game from the agents' span traces.
+
+Every agent writes its spans to <metrics dir>/<agent>_<instance>.trace.json (see
+the agents' agent/instrumentation.py): the message handlers, the LLM calls
+with their queue wait, requests and backoff, parsing, game state updates and
+prompt construction. The batch executor merges the files of a game into
+trace.json next to them once the game is over. Open it in a trace viewer
+(https://ui.perfetto.dev or chrome://tracing) to see every agent of the game
+on one time axis, one process per agent and one track per asyncio task.
+
+Agents in the runner's containers post their trace lines to the game's
+MetricsServer (batch/metrics_server.py), which writes them to the same file
+names in the metrics directory, so their traces are merged like local ones.
+run_game records "trace": null when no agent sent any.
+
+The agents' timestamps are wall clock microseconds, so agents in different
+processes and containers line up. Container processes often share a pid, so
+every file gets its own pid in the merged trace.
+
+    python -m batch.trace game_results/batch_1730000000/metrics/game_3
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+TRACE_SUFFIX = ".trace.json"
+MERGED_TRACE_FILE = "trace.json"
+
+
+def read_events(path):
+    """
+    Reads the events of one trace file.
+
+    Args:
+        path (str | Path): A trace in the array format, the closing bracket may be missing
+            (an agent that was killed), or in the object format with traceEvents.
+
+    Returns:
+        list: The events, a partly written last event is skipped.
+    """
+    with open(path) as f:
+        text = f.read()
+    if text.lstrip().startswith("{"):
+        return json.loads(text).get("traceEvents", [])
+    events = []
+    # the agents write one event per line
+    for line in text.splitlines():
+        line = line.strip().rstrip(",")
+        if line in ("", "[", "]"):
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(event, dict):
+            events.append(event)
+    return events
+
+
+def merge_traces(metrics_dir, out=None, **metadata):
+    """
+    Merges the agents' traces of one game.
+
+    Args:
+        metrics_dir (str | Path): The game's metrics directory.
+        out (str | Path): Merged trace file, trace.json in metrics_dir by default.
+        **metadata: Stored as the trace's otherData, e.g. game_number and activity_id.
+
+    Returns:
+        Path | None: The merged trace, None if the directory holds no agent traces.
+    """
+    metrics_dir = Path(metrics_dir)
+    files = sorted(metrics_dir.glob(f"*{TRACE_SUFFIX}")) if metrics_dir.is_dir() else []
+    if not files:
+        return None
+
+    events = []
+    for pid, file in enumerate(files, start=1):
+        for event in read_events(file):
+            event["pid"] = pid
+            events.append(event)
+        # agents in the order of their file names, not of their first event
+        events.append({"ph": "M", "name": "process_sort_index", "pid": pid, "tid": 0, "args": {"sort_index": pid}})
+    # metadata first, then by time, so viewers that stream the file see names before spans
+    events.sort(key=lambda event: (event.get("ph") != "M", event.get("ts", 0)))
+
+    path = Path(out) if out is not None else metrics_dir / MERGED_TRACE_FILE
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": metadata}, f, default=str)
+    os.replace(tmp, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge the agents' span traces of a game into one timeline")
+    parser.add_argument("metrics_dirs", nargs="+", help="Game metrics directories, e.g. <batch dir>/metrics/game_3")
+    parser.add_argument("-o", "--out", help="Merged trace file, only with one directory (default: <dir>/trace.json)")
+    args = parser.parse_args(argv)
+    if args.out and len(args.metrics_dirs) > 1:
+        parser.error("--out needs a single metrics directory")
+
+    for metrics_dir in args.metrics_dirs:
+        path = merge_traces(metrics_dir, args.out)
+        print(f"{metrics_dir}: {path if path is not None else 'no agent traces'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,536 @@
+"""
+Micro-benchmarks of the agents' per-message CPU work, compared with a stored baseline.
+
+Every message an agent receives goes through a handful of pure-Python paths
+before (or instead of) an LLM call: parse_json_from_string on the parse
+prompts' output, the GameState mutators and convert_game_state_to_text in the
+trust agent, extract_names and the PlayerNames resolver,
+CoTAgent.get_interwoven_history and the autogen agent's get_full_message. This suite times each of them on synthetic games
+(benchmarks/synthetic.py) of 8, 12 and 16 players and 50, 200 and 800
+messages, so a change to one of them shows up as a number instead of a
+feeling:
+
+    python -m benchmarks.hot_paths                      # run and compare with benchmarks/baseline.json
+    python -m benchmarks.hot_paths -k game_state --quick
+    python -m benchmarks.hot_paths --save-baseline      # after a deliberate change
+
+Timings are taken like timeit's: the loop count is calibrated to a minimum
+round time and the garbage collector is off while timing. Each case runs in
+short rounds that alternate with a fixed piece of reference work, and the
+case is compared by the median over the rounds of its time relative to the
+reference's in the same round. A busier machine, or a slower one, slows both
+alike, so the ratio stays put where the raw times don't. --save-baseline runs
+the suite several times and stores each case's run-to-run spread of that
+ratio. A case only counts as slower when it is off by more than the
+tolerance and more than twice its spread, and still is when measured
+again (--retries). Allocations are measured on one
+separate call with tracemalloc (peak and retained bytes) and
+sys.getallocatedblocks (blocks still allocated afterwards). Without the
+agents' runtime packages (sentient_campaign, autogen, openai, httpx) the
+agents are imported against the stand-ins in benchmarks/runtime_stubs.py, so
+every case runs anywhere. A case that is missing from the baseline fails the
+comparison like a regression: save the baseline when adding one.
+"""
+import argparse
+import copy
+import gc
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import Path
+
+from benchmarks import runtime_stubs
+from benchmarks.synthetic import llm_json_outputs, parser_outputs, synthetic_game
+from harness.loader import AGENT_CONFIGS, create_agent, load_agent_module
+from harness.templates import render, template
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_TOLERANCE = 0.25
+# a case is also allowed this many times its run-to-run spread, for cases noisier than the tolerance
+SPREAD_FACTOR = 2
+DEFAULT_ROUNDS = 21
+DEFAULT_ROUND_TIME = 0.005
+# suite runs a saved baseline is the median of
+BASELINE_RUNS = 3
+# times a case that compares as slower is measured again before it counts
+RETRIES = 2
+# peak memory differences below this are noise (interned strings, free lists)
+MEMORY_SLACK_BYTES = 1024
+MAX_LOOPS = 1_000_000
+BENCH_LLM_CONFIG = {"llm_model_name": "bench", "api_key": "bench", "llm_base_url": "http://127.0.0.1:9/v1"}
+
+PLAYER_COUNTS = (8, 12, 16)
+HISTORY_LENGTHS = (50, 200, 800)
+
+# before any agent module is loaded
+STUBBED = runtime_stubs.install()
+
+Case = namedtuple("Case", ["name", "setup"])
+Measurement = namedtuple("Measurement", [
+    "loops", "min_us", "median_us", "relative", "peak_bytes", "retained_bytes", "blocks",
+])
+
+
+@lru_cache(maxsize=None)
+def _module(agent, module_path):
+    return load_agent_module(AGENT_CONFIGS[agent]["agent_dir"], module_path)
+
+
+@lru_cache(maxsize=None)
+def _game(players, messages):
+    return synthetic_game(players, messages, seed=players * 1000 + messages)
+
+
+def _bare_agent(agent):
+    # for methods that don't touch what __initialize__ sets up
+    spec = AGENT_CONFIGS[agent]
+    agent_class = getattr(_module(agent, spec["module_path"]), spec["agent_class"])
+    return agent_class.__new__(agent_class)
+
+
+def _replay_state(game_state_class, game, narrative=True):
+    state = game_state_class(game.players, narrative=narrative)
+    for _, method, kwargs in game.actions:
+        getattr(state, method)(**kwargs)
+    return state
+
+
+# ---- cases: each setup returns the callable that is timed ---- #
+
+def _parse_json(variant):
+    def setup():
+        text = llm_json_outputs(parser_outputs(_game(12, 200)))[variant]
+        agent = _bare_agent("trust")
+        return lambda: agent.parse_json_from_string(text)
+    return setup
+
+
+def _extract_names(players):
+    def setup():
+        extract_names = _module("trust", "agent/super_simple.py").extract_names
+        text = render(template("doctor_save"), player="Frodo", alive_players=", ".join(_game(players, 50).players))
+        return lambda: extract_names(text)
+    return setup
+
+
+def _resolve_names(players):
+    def setup():
+        player_names_class = _module("trust", "agent/player_names.py").PlayerNames
+        names = _game(players, 50).players
+        index = player_names_class(names)
+        # as players and the LLM write them: as listed, another case, with punctuation, with a typo
+        spellings = itertools.cycle(itertools.chain.from_iterable(
+            (name, name.upper(), f"@{name}!", name[0] + name[2] + name[1] + name[3:]) for name in names
+        ))
+        return lambda: index.resolve(next(spellings))
+    return setup
+
+
+def _game_state_init(players):
+    def setup():
+        game_state_class = _module("trust", "agent/game_state.py").GameState
+        names = _game(players, 50).players
+        return lambda: game_state_class(names)
+    return setup
+
+
+def _game_state_replay(players, messages, narrative=True):
+    def setup():
+        game_state_class = _module("trust", "agent/game_state.py").GameState
+        game = _game(players, messages)
+        return lambda: _replay_state(game_state_class, game, narrative)
+    return setup
+
+
+def _convert_game_state(players, messages, cached):
+    def setup():
+        game_state_class = _module("trust", "agent/game_state.py").GameState
+        agent = _bare_agent("trust")
+        agent.game_state = _replay_state(game_state_class, _game(players, messages))
+        if cached:
+            return agent.convert_game_state_to_text
+        narrative = agent.game_state.narrative
+
+        def convert():
+            # a narrative that was never rendered, as on the first response after the whole history
+            agent.game_state.narrative = copy.copy(narrative)
+            return agent.convert_game_state_to_text()
+        return convert
+    return setup
+
+
+def _interwoven_history(messages):
+    def setup():
+        from harness.llm_backends import StubLLM, install_backend
+
+        game = _game(8, messages)
+        agent = create_agent("cot", game.me, BENCH_LLM_CONFIG)
+        install_backend(agent, lambda client: StubLLM())
+        for message in game.messages:
+            if message.direct:
+                agent.game_history.append(f"[From - {message.sender}| To - {game.me} (me)| Direct Message]: {message.text}")
+            else:
+                agent.game_history.append(f"[From - {message.sender}| To - Everyone| Group Message in {message.channel}]: {message.text}")
+        return agent.get_interwoven_history
+    return setup
+
+
+def _full_message(players):
+    def setup():
+        from harness.replay import to_activity_message
+
+        game = _game(players, 200)
+        agent = _bare_agent("autogen")
+        activity_messages = itertools.cycle([
+            to_activity_message(message, index, game.me) for index, message in enumerate(game.messages)
+        ])
+        return lambda: agent.get_full_message(next(activity_messages))
+    return setup
+
+
+def cases(quick=False):
+    """
+    Every benchmark case, named <hot path>/<input>.
+
+    Args:
+        quick (bool): Only the smallest game size and history length.
+
+    Returns:
+        list: Case tuples.
+    """
+    player_counts = PLAYER_COUNTS[:1] if quick else PLAYER_COUNTS
+    history_lengths = HISTORY_LENGTHS[:1] if quick else HISTORY_LENGTHS
+    sizes = list(itertools.product(player_counts, history_lengths))
+
+    found = [Case(f"parse_json_from_string/{variant}", _parse_json(variant))
+             for variant in ("clean", "fenced", "python", "embedded", "prose")]
+    found += [Case(f"extract_names/{players}p", _extract_names(players)) for players in player_counts]
+    found += [Case(f"player_names.resolve/{players}p", _resolve_names(players)) for players in player_counts]
+    found += [Case(f"game_state.init/{players}p", _game_state_init(players)) for players in player_counts]
+    found += [Case(f"game_state.replay/{players}p-{messages}m", _game_state_replay(players, messages))
+              for players, messages in sizes]
+    found += [Case(f"game_state.replay_no_narrative/{players}p-{messages}m", _game_state_replay(players, messages, False))
+              for players, messages in sizes]
+    found += [Case(f"convert_game_state_to_text/{players}p-{messages}m", _convert_game_state(players, messages, False))
+              for players, messages in sizes]
+    found += [Case(f"convert_game_state_to_text.cached/{players}p-{messages}m", _convert_game_state(players, messages, True))
+              for players, messages in sizes]
+    found += [Case(f"get_interwoven_history/{messages}m", _interwoven_history(messages)) for messages in history_lengths]
+    found += [Case(f"get_full_message/{players}p", _full_message(players)) for players in player_counts]
+    return found
+
+
+# ---- measurement ---- #
+
+def _time(fn, loops):
+    started = time.perf_counter()
+    for _ in itertools.repeat(None, loops):
+        fn()
+    return time.perf_counter() - started
+
+
+def _noop():
+    return None
+
+
+def _allocations(fn):
+    # blocks are counted without tracemalloc, which allocates blocks of its own
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    result = fn()
+    blocks = sys.getallocatedblocks() - blocks
+    del result
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before, min(current, peak) - before, blocks
+
+
+def _reference_work():
+    # fixed pure-Python work, timed in rounds alternating with every case's so baselines from another
+    # machine (or a busier moment on this one) can be scaled to the current speed
+    counts = {}
+    for i in range(2000):
+        key = f"player{i % 16}"
+        counts[key] = counts.get(key, 0) + i
+    return sorted(counts.values())
+
+
+@lru_cache(maxsize=None)
+def _overhead():
+    # what _allocations reports for a call that allocates nothing, subtracted from every case
+    return _allocations(_noop)
+
+
+def _calibrate(fn, min_time):
+    loops = 1
+    while loops < MAX_LOOPS and _time(fn, loops) < min_time:
+        loops *= 2
+    return loops
+
+
+def measure(fn, repeat=DEFAULT_ROUNDS, min_time=DEFAULT_ROUND_TIME):
+    """
+    Times a callable per call, relative to the reference work, and measures its allocations.
+
+    Args:
+        fn (Callable): Called without arguments.
+        repeat (int): Number of timed rounds.
+        min_time (float): Minimum seconds per round, the loop count is doubled until it is reached.
+
+    Returns:
+        Measurement: Loops per round, min and median microseconds per call, the median over the
+            rounds of the call's time divided by the reference work's in the same round, peak and
+            retained bytes and allocated blocks of one call.
+    """
+    # first call outside the timing, for lazy imports and caches
+    fn()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        loops = _calibrate(fn, min_time)
+        reference_loops = _calibrate(_reference_work, min_time)
+        times, ratios = [], []
+        for _ in range(repeat):
+            # the case and the reference alternate, so a change of machine speed hits both
+            call = _time(fn, loops) / loops
+            reference = _time(_reference_work, reference_loops) / reference_loops
+            times.append(call * 1e6)
+            ratios.append(call / reference)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    peak, retained, blocks = (max(0, value - noise) for value, noise in zip(_allocations(fn), _overhead()))
+    return Measurement(loops, min(times), statistics.median(times), statistics.median(ratios), peak, retained, blocks)
+
+
+def run(selected, repeat=DEFAULT_ROUNDS, min_time=DEFAULT_ROUND_TIME, progress=None):
+    """
+    Runs benchmark cases.
+
+    Args:
+        selected (list): Case tuples.
+        repeat (int): Timed rounds per case.
+        min_time (float): Minimum seconds per round.
+        progress (Callable): Called with (name, result dict) after each case.
+
+    Returns:
+        dict: Case name to its measurement as a dict, or {"skipped": reason}.
+    """
+    results = {}
+    for case in selected:
+        try:
+            fn = case.setup()
+        except ImportError as e:
+            result = {"skipped": f"{type(e).__name__}: {e}"}
+        else:
+            result = measure(fn, repeat, min_time)._asdict()
+        results[case.name] = result
+        if progress is not None:
+            progress(case.name, result)
+    return results
+
+
+def combine_runs(runs):
+    """
+    Combines several runs of the same cases into one result per case, for a baseline.
+
+    Args:
+        runs (list): run() results.
+
+    Returns:
+        dict: The first run's results with relative set to the median over the runs, and spread
+            to the runs' largest relative divided by their smallest, minus one.
+    """
+    combined = {}
+    for name, result in runs[0].items():
+        if "skipped" in result:
+            combined[name] = result
+            continue
+        relatives = [run[name]["relative"] for run in runs if "relative" in run.get(name, {})]
+        combined[name] = {
+            **result,
+            "relative": statistics.median(relatives),
+            "spread": max(relatives) / min(relatives) - 1 if min(relatives) > 0 else 0.0,
+        }
+    return combined
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares results with a baseline.
+
+    Times are compared by each case's time relative to the reference work timed in the
+    same rounds, so a machine that is slower as a whole doesn't count as a regression. A
+    case regressed if it is slower than the baseline by more than tolerance and more than
+    SPREAD_FACTOR times the spread the baseline measured for it, or its peak allocation is
+    more than tolerance (and MEMORY_SLACK_BYTES) larger. A measured case without a
+    baseline is "missing", which fails too.
+
+    Args:
+        results (dict): From run().
+        baseline (dict): The "results" of a baseline file.
+        tolerance (float): Allowed relative slowdown, 0.25 is 25%.
+
+    Returns:
+        list: (name, status, time ratio or None) for every measured case, status being "ok",
+            "faster", "slower", "memory" or "missing".
+    """
+    rows = []
+    for name, result in results.items():
+        if "skipped" in result:
+            continue
+        base = baseline.get(name)
+        if not base or "relative" not in base:
+            rows.append((name, "missing", None))
+            continue
+        allowed = max(tolerance, SPREAD_FACTOR * base.get("spread", 0.0))
+        ratio = result["relative"] / base["relative"] if base["relative"] else None
+        if ratio is not None and ratio > 1 + allowed:
+            status = "slower"
+        elif result["peak_bytes"] > base["peak_bytes"] * (1 + tolerance) + MEMORY_SLACK_BYTES:
+            status = "memory"
+        elif ratio is not None and ratio < 1 / (1 + allowed):
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, status, ratio))
+    return rows
+
+
+def remeasure_slower(selected, results, baseline, tolerance=DEFAULT_TOLERANCE, retries=RETRIES,
+                     repeat=DEFAULT_ROUNDS, min_time=DEFAULT_ROUND_TIME):
+    """
+    Measures the cases that compare as slower again, keeping each one's fastest measurement.
+
+    A stall of the machine during a case's rounds can move its median, measuring it again
+    tells that apart from a real slowdown, which is slow every time.
+
+    Args:
+        selected (list): Case tuples the results are from.
+        results (dict): From run(), updated in place.
+        baseline (dict): The "results" of a baseline file.
+        tolerance (float): As for compare().
+        retries (int): Most times a case is measured again.
+        repeat (int): Timed rounds per case.
+        min_time (float): Minimum seconds per round.
+
+    Returns:
+        dict: results.
+    """
+    for _ in range(retries):
+        slower = {name for name, status, _ in compare(results, baseline, tolerance) if status == "slower"}
+        if not slower:
+            break
+        again = run([case for case in selected if case.name in slower], repeat, min_time)
+        for name, result in again.items():
+            if "relative" in result and result["relative"] < results[name]["relative"]:
+                results[name] = result
+    return results
+
+
+def load_baseline(path):
+    """The baseline file as a dict, empty if it doesn't exist."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    """Writes results into a baseline file, keeping the cases that didn't run this time."""
+    baseline = load_baseline(path)
+    merged = dict(baseline.get("results", {}))
+    merged.update({name: result for name, result in results.items() if "skipped" not in result})
+    baseline = {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "saved": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "stubbed": STUBBED,
+        "results": dict(sorted(merged.items())),
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+
+def _format_result(name, result):
+    if "skipped" in result:
+        return f"{name:<58} skipped ({result['skipped']})"
+    return (
+        f"{name:<58}{result['min_us']:>11.2f}us{result['median_us']:>11.2f}us"
+        f"{result['peak_bytes'] / 1024:>10.1f}KiB{result['blocks']:>8}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the agents' per-message hot paths")
+    parser.add_argument("-k", dest="pattern", help="Only cases whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="Only the smallest game size and history length")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_ROUNDS, help="Timed rounds per case")
+    parser.add_argument("--min-time", type=float, default=DEFAULT_ROUND_TIME, help="Minimum seconds per round")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE), help="Baseline file to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--baseline-runs", type=int, default=BASELINE_RUNS,
+                        help="Suite runs a saved baseline is combined from, to measure each case's spread")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown before a case counts as a regression (0.25 = 25%%)")
+    parser.add_argument("--retries", type=int, default=RETRIES,
+                        help="Times a case that compares as slower is measured again before it counts")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--list", action="store_true", help="List the cases and exit")
+    args = parser.parse_args(argv)
+
+    selected = [case for case in cases(args.quick) if not args.pattern or args.pattern in case.name]
+    if args.list:
+        print("\n".join(case.name for case in selected))
+        return 0
+
+    if not args.json:
+        print(f"{'case':<58}{'min':>13}{'median':>13}{'peak':>13}{'blocks':>8}")
+    progress = None if args.json else lambda name, result: print(_format_result(name, result), flush=True)
+    results = run(selected, args.repeat, args.min_time, progress)
+
+    if args.save_baseline:
+        runs = [results]
+        for number in range(2, args.baseline_runs + 1):
+            if not args.json:
+                print(f"run {number} of {args.baseline_runs} for the baseline's spread", flush=True)
+            runs.append(run(selected, args.repeat, args.min_time))
+        results = combine_runs(runs)
+        save_baseline(args.baseline, results)
+    baseline = load_baseline(args.baseline).get("results", {})
+    if not args.save_baseline:
+        remeasure_slower(selected, results, baseline, args.tolerance, args.retries, args.repeat, args.min_time)
+    rows = compare(results, baseline, args.tolerance)
+    regressions = [row for row in rows if row[1] in ("slower", "memory", "missing")]
+
+    if args.json:
+        print(json.dumps({"results": results, "comparison": [
+            {"name": name, "status": status, "ratio": ratio} for name, status, ratio in rows
+        ]}, indent=2))
+    elif not args.save_baseline:
+        print(f"\ncompared with {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for name, status, ratio in rows:
+            if status != "ok":
+                print(f"  {status:<8}{name}" + (f"  x{ratio:.2f}" if ratio is not None else ""))
+        print(f"{len(rows)} cases, {len(regressions)} regressions")
+        if any(status == "missing" for _, status, _ in rows):
+            print("cases without a baseline fail, run with --save-baseline after adding them")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Stand-ins for the agents' runtime packages, so every benchmark case imports without them.
+
+The hot paths are pure Python, but their modules import sentient_campaign,
+autogen, openai and httpx at the top. A machine without those packages would
+skip half of the suite. install() registers a minimal module under each of
+those names that can't be imported. A package that is installed is always
+used as it is.
+
+The stand-ins cover the names the agents import and what the timed code and
+create_agent touch: the message dataclasses, IReactiveAgent's config property,
+a ConversableAgent that does nothing, and the LLM client's constructor
+arguments. The LLM itself is replaced by StubLLM (harness.llm_backends)
+either way.
+"""
+import enum
+import importlib.util
+import sys
+import types
+from dataclasses import dataclass, field
+
+
+class MessageChannelType(enum.Enum):
+    DIRECT = "direct"
+    GROUP = "group"
+
+
+class MimeType(enum.Enum):
+    TEXT_PLAIN = "text/plain"
+
+
+@dataclass
+class TextContent:
+    text: str
+
+
+@dataclass
+class ActivityMessageHeader:
+    message_id: str
+    sender: str
+    channel: str
+    channel_type: MessageChannelType
+    target_receivers: list = field(default_factory=list)
+
+
+@dataclass
+class ActivityMessage:
+    content_type: MimeType
+    header: ActivityMessageHeader
+    content: TextContent
+
+
+class ActivityResponse:
+    def __init__(self, response, response_type=None):
+        self.response = response if isinstance(response, TextContent) else TextContent(str(response))
+        self.response_type = response_type
+
+
+class IReactiveAgent:
+    @property
+    def sentient_llm_config(self):
+        return self._sentient_llm_config
+
+    def __initialize__(self, name, description, config=None):
+        pass
+
+
+class Agent:
+    pass
+
+
+class ConversableAgent(Agent):
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class _RuntimeLogging:
+    @staticmethod
+    def start(**kwargs):
+        return 0
+
+
+class AsyncOpenAI:
+    def __init__(self, **kwargs):
+        pass
+
+    async def close(self):
+        pass
+
+
+class AsyncClient:
+    def __init__(self, **kwargs):
+        pass
+
+
+class Limits:
+    def __init__(self, **kwargs):
+        pass
+
+
+# module name -> its attributes, parents before their children
+STUBS = {
+    "sentient_campaign": {},
+    "sentient_campaign.agents": {},
+    "sentient_campaign.agents.v1": {},
+    "sentient_campaign.agents.v1.api": {"IReactiveAgent": IReactiveAgent},
+    "sentient_campaign.agents.v1.message": {
+        "ActivityMessage": ActivityMessage,
+        "ActivityMessageHeader": ActivityMessageHeader,
+        "ActivityResponse": ActivityResponse,
+        "MessageChannelType": MessageChannelType,
+        "MimeType": MimeType,
+        "TextContent": TextContent,
+    },
+    "autogen": {"Agent": Agent, "ConversableAgent": ConversableAgent, "runtime_logging": _RuntimeLogging},
+    "openai": {"AsyncOpenAI": AsyncOpenAI},
+    "httpx": {"AsyncClient": AsyncClient, "Limits": Limits},
+}
+
+
+def _importable(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        # a parent package that doesn't exist
+        return False
+
+
+def install():
+    """
+    Registers a stand-in for each runtime package that can't be imported.
+
+    Returns:
+        list: The top-level packages that were stubbed, empty if all of them are installed.
+    """
+    stubbed = []
+    for name, attributes in STUBS.items():
+        top = name.split(".")[0]
+        if name in sys.modules or (top not in stubbed and _importable(name)):
+            continue
+        module = types.ModuleType(name, f"benchmark stand-in for {name}")
+        module.__dict__.update(attributes)
+        # a package, so "from sentient_campaign.agents.v1.api import ..." finds its children
+        module.__path__ = []
+        if "." in name:
+            parent, _, child = name.rpartition(".")
+            setattr(sys.modules[parent], child, module)
+        sys.modules[name] = module
+        if top not in stubbed:
+            stubbed.append(top)
+    return stubbed
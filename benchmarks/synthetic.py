@@ -0,0 +1,205 @@
+"""
+Synthetic games for the micro-benchmarks.
+
+The moderator's messages are rendered from the real templates in
+z-moderator-prompts/templates (see harness/templates.py) and interleaved with
+player chatter: accusations, role claims, seer reports and votes. Alongside the messages, synthetic_game
+records the GameState calls the trust agent's parsers would make for them, so
+the state benchmarks replay the same game the message benchmarks read.
+
+Everything is seeded, so a given (players, messages, seed) is the same game on
+every run and the timings stay comparable with the stored baseline.
+"""
+import json
+import random
+from collections import namedtuple
+
+from harness.templates import render, template
+
+MODERATOR = "moderator"
+GAME_ROOM = "play-arena"
+WOLFS_CHANNEL = "wolf's-den"
+
+NAMES = (
+    "Frodo", "Chagent", "Samwise", "Aragorn", "Gimli", "Legolas", "Boromir", "Galadriel",
+    "Elrond", "Eowyn", "Faramir", "Arwen", "Pippin", "Merry", "Theoden", "Bilbo",
+)
+
+# same fields as harness.replay.ReplayMessage, so harness.replay.to_activity_message accepts them
+SyntheticMessage = namedtuple("SyntheticMessage", ["sender", "channel", "direct", "text", "respond"])
+SyntheticGame = namedtuple("SyntheticGame", ["players", "me", "roles", "messages", "actions"])
+
+
+def player_names(count):
+    """count distinct player names, numbered once NAMES runs out."""
+    return [NAMES[i % len(NAMES)] + (str(i // len(NAMES)) if i >= len(NAMES) else "") for i in range(count)]
+
+
+class _GameWriter:
+    # the messages of a game and the GameState calls made for them, kept in step
+
+    def __init__(self):
+        self.messages = []
+        self.actions = []
+
+    def say(self, sender, text, channel=GAME_ROOM, direct=False, respond=False):
+        self.messages.append(SyntheticMessage(sender, channel, direct, text, respond))
+
+    def moderator(self, name, channel=GAME_ROOM, direct=False, respond=False, **values):
+        self.say(MODERATOR, render(template(name), **values), channel, direct, respond)
+
+    def act(self, method, **kwargs):
+        # tied to the message that triggers it, so both can be cut at the same point
+        self.actions.append((len(self.messages) - 1, method, kwargs))
+
+
+_ACCUSATIONS = (
+    "I think {target} is a wolf, they have been deflecting every question.",
+    "{target} has been way too quiet, that's how wolves play it.",
+    "Honestly {target} seems like a villager to me, their reasoning has been consistent.",
+    "I'm fairly sure {target} is the wolf, they voted with the wolves last round.",
+    "I don't trust {target}, they keep changing their story about last night.",
+)
+
+
+def synthetic_game(players=8, messages=200, seed=0):
+    """
+    Generates a game as the moderator and the players would play it.
+
+    Rounds follow the moderator's order: night start, the wolves' vote in their
+    channel, the seer's guess and result, the doctor's save, the day start, one
+    discussion turn and one vote per living player and the day end. Nobody is
+    eliminated once four players are left, so long histories keep going with
+    the same table.
+
+    Args:
+        players (int): Number of players.
+        messages (int): Number of messages to generate.
+        seed (int): Seed for the roles, targets and chatter.
+
+    Returns:
+        SyntheticGame: The players, the agent's own player (me), everyone's role, the
+            messages and the GameState calls the agent makes for them, as
+            (message index, method name, kwargs) tuples.
+    """
+    rng = random.Random(seed)
+    names = player_names(players)
+    shuffled = rng.sample(names, players)
+    wolves = shuffled[:max(2, players // 5)]
+    seer, doctor = shuffled[len(wolves)], shuffled[len(wolves) + 1]
+    roles = {name: "villager" for name in names}
+    roles.update({name: "wolf" for name in wolves})
+    roles.update({seer: "seer", doctor: "doctor"})
+    # the agent is the seer, so the benchmarks cover record_check as well
+    me = seer
+
+    game = _GameWriter()
+    game.moderator("introduction", moderator_name=MODERATOR, game_room=GAME_ROOM, players=", ".join(names))
+    game.moderator("set_role", direct=True, player=me, role=roles[me])
+    game.act("init_role", player_role=roles[me])
+
+    alive = list(names)
+    round_number = 0
+    while len(game.messages) < messages:
+        round_number += 1
+        alive_text = ", ".join(alive)
+        good = [name for name in alive if roles[name] != "wolf"]
+
+        game.moderator("night_start")
+        game.moderator("wolf_night_introduction", channel=WOLFS_CHANNEL, is_first_night=round_number == 1,
+                       players=", ".join(good))
+        victim = rng.choice(good)
+        for wolf in (name for name in alive if roles[name] == "wolf"):
+            game.moderator("wolf_vote", channel=WOLFS_CHANNEL, respond=True, delegate_player=wolf)
+            game.say(wolf, f"Let's take out {victim}, they are getting too close.", channel=WOLFS_CHANNEL)
+
+        if seer in alive:
+            checked = rng.choice([name for name in alive if name != seer])
+            game.moderator("seer_guess", direct=True, respond=True, player=seer, alive_players=alive_text)
+            game.say(seer, checked, direct=True)
+            game.moderator("seer_guess_result", direct=True, player=seer, selected_player=checked,
+                           is_wolf=roles[checked] == "wolf")
+            game.act("record_check", checked_player_name=checked, is_good=roles[checked] != "wolf")
+        if doctor in alive:
+            game.moderator("doctor_save", direct=True, respond=True, player=doctor, alive_players=alive_text)
+            game.say(doctor, rng.choice(alive), direct=True)
+
+        killed = victim if len(alive) > 4 and rng.random() > 0.25 else ""
+        game.moderator("day_start", eliminated_villager=killed)
+        game.act("record_night_phase_death", player_name=killed or None)
+        if killed:
+            alive.remove(killed)
+
+        for speaker in rng.sample(alive, len(alive)):
+            target = rng.choice([name for name in alive if name != speaker])
+            game.moderator("day_discussion_initiation", respond=True, delegate_player=speaker)
+            if speaker == seer and round_number > 1 and rng.random() < 0.5:
+                game.say(speaker, f"I'm the seer. I checked {target} last night and they are a {roles[target]}.")
+                game.act("claim_seer", player_name=speaker)
+                game.act("claim_checked", player_name=speaker, player_checked_name=target,
+                         player_role=roles[target], round_checked=round_number - 1)
+                continue
+            game.say(speaker, rng.choice(_ACCUSATIONS).format(target=target))
+            game.act("player_suggests", player_name=speaker, player_suggested_role_name=target,
+                     suggested_role=rng.choice(("wolf", "villager")), certainty=rng.choice(("guess", "confident")))
+            if rng.random() < 0.1:
+                game.act("player_suspicious_action", player_name=speaker, message=f"{speaker} deflected the question")
+
+        votes = {}
+        for voter in alive:
+            target = rng.choice([name for name in alive if name != voter])
+            votes[target] = votes.get(target, 0) + 1
+            game.moderator("day_wolf_elimination_vote_casting", respond=True, delegate_player=voter)
+            game.say(voter, f"I vote for {target}.")
+            game.act("record_vote", from_player_name=voter, voted_player_name=target)
+
+        lynched = max(votes, key=votes.get)
+        wolves_alive = sum(roles[name] == "wolf" for name in alive)
+        if len(alive) > 4 and (roles[lynched] != "wolf" or wolves_alive > 1):
+            game.moderator("day_end_message", eliminated_player=lynched, eliminated_player_role=roles[lynched])
+            game.act("record_lynch", player_name=lynched, player_role=roles[lynched])
+            alive.remove(lynched)
+
+    return SyntheticGame(
+        names, me, roles, game.messages[:messages],
+        [(index, method, kwargs) for index, method, kwargs in game.actions if index < messages],
+    )
+
+
+def llm_json_outputs(actions):
+    """
+    The parse prompts' JSON output for some actions, in the shapes LLMs actually return it.
+
+    Args:
+        actions (list): Action dicts, e.g. [{"action": "record_vote", "voted_player_name": "Frodo"}].
+
+    Returns:
+        dict: Variant name to text: clean JSON, wrapped in json''' ''', a Python literal with single
+            quotes, embedded in prose, and prose with no JSON at all.
+    """
+    clean = json.dumps(actions)
+    return {
+        "clean": clean,
+        "fenced": f"json'''\n{json.dumps(actions, indent=2)}\n'''",
+        "python": repr(actions),
+        "embedded": f"Sure! Based on the message, here are the actions:\n{clean}\nLet me know if you need anything else.",
+        "prose": "I could not find any game actions in this message, the player was only chatting.",
+    }
+
+
+def parser_outputs(game, count=3):
+    """The first count discussion actions of a game as the user parse prompt's output dicts."""
+    outputs = []
+    for _, method, kwargs in game.actions:
+        if method == "player_suggests":
+            outputs.append({
+                "action": "player_suggests",
+                "player_suggested_name": kwargs["player_suggested_role_name"],
+                "suggested_role": kwargs["suggested_role"],
+                "certainty": kwargs["certainty"],
+            })
+        elif method == "record_vote":
+            outputs.append({"action": "record_vote", "voted_player_name": kwargs["voted_player_name"]})
+        if len(outputs) == count:
+            break
+    return outputs
@@ -0,0 +1,187 @@
+"""
+LLM backends that stand in for an agent's AsyncLLMClient in the harness.
+
+They have AsyncLLMClient's interface (complete and aclose), so install_backend
+can swap them into an initialized agent:
+
+- StubLLM answers instantly from a list of canned replies, so a replay
+  measures nothing but the agent's own overhead;
+- LatencyLLM adds a random delay to another backend, to see how an agent
+  behaves when the LLM is slow;
+- RecordingLLM passes calls through to another backend (usually the agent's
+  real client) and writes every request and reply to a JSONL file;
+- RecordedLLM answers from such a file, so a recorded game can be replayed
+  with the same LLM output and no network.
+
+Every backend counts its calls and the time spent in them.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+DEFAULT_STUB_REPLIES = ("I don't have enough information yet, I'll keep listening.",)
+
+
+def request_key(messages, model=None):
+    """Stable key of a completion request, used to match recorded replies."""
+    payload = json.dumps({"model": model, "messages": messages}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LLMBackend:
+    """Base class: counts calls and the seconds spent in them."""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+    async def complete(self, messages, model=None, **kwargs):
+        # kwargs (priority, temperature, ...) are passed on to wrapped clients
+        started = time.perf_counter()
+        try:
+            return await self._complete(messages, model, **kwargs)
+        finally:
+            self.calls += 1
+            self.seconds += time.perf_counter() - started
+
+    async def _complete(self, messages, model, **kwargs):
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+    def stats(self):
+        return {"calls": self.calls, "seconds": self.seconds}
+
+
+class StubLLM(LLMBackend):
+    """
+    Answers with canned replies, in turn.
+
+    Args:
+        replies (list | Callable): Replies to cycle through, or a function of the messages returning one.
+    """
+
+    def __init__(self, replies=DEFAULT_STUB_REPLIES):
+        super().__init__()
+        self.replies = replies if callable(replies) else list(replies)
+
+    async def _complete(self, messages, model, **kwargs):
+        if callable(self.replies):
+            return self.replies(messages)
+        return self.replies[self.calls % len(self.replies)]
+
+
+class LatencyLLM(LLMBackend):
+    """
+    Delays another backend's replies.
+
+    Args:
+        inner (LLMBackend): The backend that produces the replies.
+        mean (float): Mean delay in seconds.
+        jitter (float): The delay is uniform in mean +- jitter.
+        seed (int): Seed for the delays.
+    """
+
+    def __init__(self, inner, mean=0.5, jitter=0.0, seed=None):
+        super().__init__()
+        self.inner = inner
+        self.mean = mean
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    async def _complete(self, messages, model, **kwargs):
+        await asyncio.sleep(max(0.0, self._random.uniform(self.mean - self.jitter, self.mean + self.jitter)))
+        return await self.inner.complete(messages, model, **kwargs)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class RecordingLLM(LLMBackend):
+    """
+    Passes calls through and appends {"key", "model", "messages", "reply"} lines to a file.
+
+    Args:
+        inner: Anything with AsyncLLMClient's complete, e.g. the agent's own client.
+        path (str | Path): JSONL file to append to.
+    """
+
+    def __init__(self, inner, path):
+        super().__init__()
+        self.inner = inner
+        self._file = open(path, "a")
+
+    async def _complete(self, messages, model, **kwargs):
+        reply = await self.inner.complete(messages, model, **kwargs)
+        record = {"key": request_key(messages, model), "model": model, "messages": messages, "reply": reply}
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+        return reply
+
+    async def aclose(self):
+        self._file.close()
+        await self.inner.aclose()
+
+
+class RecordedLLM(LLMBackend):
+    """
+    Answers from a RecordingLLM file.
+
+    Identical requests are answered with their recorded replies in recording order.
+    Requests that weren't recorded go to the fallback.
+
+    Args:
+        path (str | Path): The JSONL file.
+        fallback (LLMBackend): Answers requests missing from the recording, defaults to a StubLLM.
+    """
+
+    def __init__(self, path, fallback=None):
+        super().__init__()
+        self.replies = defaultdict(deque)
+        with open(Path(path)) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.replies[record["key"]].append(record["reply"])
+        self.fallback = fallback or StubLLM()
+        self.misses = 0
+
+    async def _complete(self, messages, model, **kwargs):
+        replies = self.replies.get(request_key(messages, model))
+        if replies:
+            # the last reply is kept for requests repeated more often than in the recording
+            return replies.popleft() if len(replies) > 1 else replies[0]
+        self.misses += 1
+        return await self.fallback.complete(messages, model, **kwargs)
+
+    def stats(self):
+        return {**super().stats(), "misses": self.misses}
+
+
+def install_backend(agent, make_backend):
+    """
+    Replaces every AsyncLLMClient of an initialized agent.
+
+    Args:
+        agent (IReactiveAgent): The agent.
+        make_backend (Callable): Called with the replaced client, returns the backend to use instead.
+
+    Returns:
+        list: The installed backends.
+    """
+    installed = []
+    for attribute, value in list(vars(agent).items()):
+        if type(value).__name__ == "AsyncLLMClient":
+            backend = make_backend(value)
+            setattr(agent, attribute, backend)
+            installed.append(backend)
+    if not installed:
+        raise ValueError(
+            f"{type(agent).__name__} doesn't use AsyncLLMClient, replay it against an OpenAI-compatible endpoint instead"
+        )
+    return installed
@@ -0,0 +1,110 @@
+"""
+Loads agent classes from the agent directories into one process.
+
+Every agent directory ships its own top-level `agent` package, so two agents
+can't simply be imported side by side. load_agent_module imports an agent's
+module with its directory first on sys.path and then takes its `agent.*`
+modules out of sys.modules again. The loaded classes keep references to their own modules,
+so agents from different directories can run in the same process.
+"""
+import functools
+import importlib
+import sys
+from pathlib import Path
+
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+AGENTS_DIR = REPO_ROOT / "src" / "werewolf_agents"
+
+# the same agents as versus_runner.py's AGENT_CONFIGS, plus trust
+AGENT_CONFIGS = {
+    "cot": {"agent_dir": AGENTS_DIR / "cot_sample", "module_path": "agent/cot_agent.py", "agent_class": "CoTAgent"},
+    "autogen": {"agent_dir": AGENTS_DIR / "autogen_sample", "module_path": "agent/single_agent.py", "agent_class": "WerewolfAgent"},
+    "simple": {"agent_dir": AGENTS_DIR / "simple_sample", "module_path": "agent/super_simple.py", "agent_class": "SimpleReactiveAgent"},
+    "trust": {"agent_dir": AGENTS_DIR / "trust", "module_path": "agent/super_simple.py", "agent_class": "SimpleReactiveAgent"},
+}
+
+
+def _agent_modules():
+    return [name for name in sys.modules if name == "agent" or name.startswith("agent.")]
+
+
+def load_agent_module(agent_dir, module_path):
+    """
+    Imports a module of an agent's agent/ package, e.g. "agent/game_state.py".
+
+    Args:
+        agent_dir (str | Path): Directory holding the agent/ package.
+        module_path (str): Module file relative to agent_dir.
+
+    Returns:
+        module: The imported module.
+    """
+    agent_dir = str(Path(agent_dir).resolve())
+    module_name = ".".join(Path(module_path).with_suffix("").parts)
+    # whatever `agent` package is imported now is put back afterwards
+    saved = {name: sys.modules.pop(name) for name in _agent_modules()}
+    sys.path.insert(0, agent_dir)
+    try:
+        return importlib.import_module(module_name)
+    finally:
+        sys.path.remove(agent_dir)
+        for name in _agent_modules():
+            del sys.modules[name]
+        sys.modules.update(saved)
+
+
+@functools.lru_cache(maxsize=None)
+def load_agent_class(agent_dir, module_path, class_name):
+    """
+    Imports an agent class from its agent directory, once per process.
+
+    Args:
+        agent_dir (str | Path): Directory holding the agent/ package.
+        module_path (str): Module file relative to agent_dir, as in the runners, e.g. "agent/cot_agent.py".
+        class_name (str): The IReactiveAgent class in that module.
+
+    Returns:
+        type: The agent class.
+    """
+    return getattr(load_agent_module(agent_dir, module_path), class_name)
+
+
+def load_config(agent_dir):
+    """The agent's config.yaml as a dict, empty if there is none."""
+    path = Path(agent_dir) / "config.yaml"
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+def create_agent(agent, name, llm_config, description="A werewolf player", config=None):
+    """
+    Creates and initializes an agent the way the game runner does.
+
+    Args:
+        agent (str | dict): A key of AGENT_CONFIGS, or a dict with agent_dir, module_path and agent_class.
+        name (str): Player name.
+        llm_config (dict): One entry of sentient_llm_config["config_list"].
+        description (str): Passed to __initialize__.
+        config (dict): Overrides the agent's config.yaml.
+
+    Returns:
+        IReactiveAgent: The initialized agent.
+    """
+    spec = AGENT_CONFIGS[agent] if isinstance(agent, str) else agent
+    agent_class = load_agent_class(spec["agent_dir"], spec["module_path"], spec["agent_class"])
+    instance = agent_class()
+    # set by the runner before __initialize__ in a real game
+    instance._sentient_llm_config = {"config_list": [llm_config]}
+    instance.__initialize__(name, description, config if config is not None else load_config(spec["agent_dir"]))
+    return instance
+
+
+def close_agent(agent):
+    """Closes an agent's instrumentation files, which agents otherwise keep open until they are collected."""
+    instrumentation = getattr(agent, "instrumentation", None)
+    if instrumentation is not None:
+        instrumentation.close()
@@ -0,0 +1,434 @@
+"""
+Local OpenAI-compatible chat completions server for load tests.
+
+Point an agent's llm_base_url at it (http://127.0.0.1:<port>/v1) to run games,
+replays or benchmarks without spending quota on the hosted endpoint. It serves
+POST /v1/chat/completions and GET /v1/models, and reports its own metrics at
+GET /metrics.
+
+Every part of the endpoint's behaviour is configurable and, with a seed,
+deterministic:
+
+- latency: time to first token, drawn from "fixed:S", "uniform:LOW,HIGH",
+  "exp:MEAN" or "lognormal:MEDIAN,SIGMA" (seconds);
+- tokens_per_second: generation speed, the reply's tokens add to the latency;
+- rpm: a requests-per-minute limit answered with 429 and the same
+  x-ratelimit-* and retry-after headers the hosted endpoint sends;
+- error_rate: the fraction of requests that get a 429 anyway;
+- replies: scripted rules (regular expressions on the last message) and
+  otherwise rule-based defaults, e.g. a vote names one of the alive players
+  the moderator listed, and the trust agent's JSON parse prompts get JSON.
+
+    python -m harness.mock_llm_server --port 8100 --latency lognormal:0.8,0.5 --tokens-per-second 40 --rpm 120
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DEFAULT_PORT = 8100
+DEFAULT_MODEL = "mock-llama"
+METRICS_HISTORY = 10000
+
+# alive players as the moderator templates list them, e.g. "still alive in game today ->  ['a', 'b']" or "alive player for to night -> [ a, b ]"
+_ALIVE_RE = re.compile(r"alive[^\n>]*->\s*\[?\s*([^\]\n]+)", re.IGNORECASE)
+_SELF_NAME_RE = re.compile(r"\bYou are (\w+)")
+_CHOICE_RE = re.compile(r"\b(vote|save|protect|guess|eliminate)\b", re.IGNORECASE)
+
+
+def parse_latency(spec):
+    """
+    Builds a latency sampler from a spec string.
+
+    Args:
+        spec (str): "fixed:S", "uniform:LOW,HIGH", "exp:MEAN" or "lognormal:MEDIAN,SIGMA", in seconds.
+
+    Returns:
+        Callable: Takes a random.Random and returns seconds.
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency spec {spec!r}, use fixed:S, uniform:LOW,HIGH, exp:MEAN or lognormal:MEDIAN,SIGMA")
+
+
+def estimate_tokens(text):
+    # close enough to Llama's tokenizer for English prose
+    return max(1, len(text) // 4)
+
+
+def _content(message):
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def alive_players(messages):
+    """The most recent list of alive players in the conversation, without the requesting player."""
+    own_name = None
+    for message in messages:
+        if message.get("role") == "system":
+            match = _SELF_NAME_RE.search(_content(message))
+            if match:
+                own_name = match.group(1)
+                break
+    for message in reversed(messages):
+        match = _ALIVE_RE.search(_content(message))
+        if match:
+            names = [name.strip(" '\"") for name in match.group(1).split(",")]
+            names = [name for name in names if name and name != own_name]
+            if names:
+                return names
+    return []
+
+
+def default_reply(messages):
+    """
+    Rule-based reply to a chat request.
+
+    JSON parse prompts get an empty JSON answer, prompts asking for a vote, save or
+    guess get the name of an alive player, everything else a neutral discussion line.
+    The choice of player is a hash of the conversation, so it doesn't depend on the
+    order requests arrive in.
+    """
+    last = _content(messages[-1]) if messages else ""
+    if "JSON Outputs as a list" in last:
+        return "[]"
+    if "JSON Output" in last:
+        return '{"action": "none"}'
+    names = alive_players(messages)
+    digest = int(hashlib.sha256(json.dumps(messages, sort_keys=True, default=str).encode()).hexdigest(), 16)
+    if names and _CHOICE_RE.search(last):
+        return names[digest % len(names)]
+    if names:
+        return f"I haven't seen enough to be sure, but {names[digest % len(names)]} has been quiet and I'm watching them."
+    return "I don't have enough information yet, I'll keep listening."
+
+
+class ScriptedReplies:
+    """
+    Replies from rules, checked in order against the last message.
+
+    Args:
+        rules (list): {"match": regex, "reply": str} dicts. A reply may use {alive} for an alive
+            player and the regex's named groups.
+        fallback (Callable): Reply for messages no rule matches, defaults to default_reply.
+    """
+
+    def __init__(self, rules, fallback=default_reply):
+        self.rules = [(re.compile(rule["match"], re.IGNORECASE | re.DOTALL), rule["reply"]) for rule in rules]
+        self.fallback = fallback
+
+    @classmethod
+    def from_file(cls, path):
+        """Loads rules from a JSON list or a JSONL file."""
+        text = Path(path).read_text()
+        rules = json.loads(text) if text.lstrip().startswith("[") else [json.loads(line) for line in text.splitlines() if line.strip()]
+        return cls(rules)
+
+    def __call__(self, messages):
+        last = _content(messages[-1]) if messages else ""
+        for pattern, reply in self.rules:
+            match = pattern.search(last)
+            if match:
+                names = alive_players(messages)
+                return reply.format(alive=names[0] if names else "nobody", **match.groupdict())
+        return self.fallback(messages)
+
+
+class MockBehaviour:
+    """
+    What the mock endpoint does, shared by its request threads.
+
+    Args:
+        latency (str): Time to first token spec, see parse_latency.
+        tokens_per_second (float): Generation speed, 0 for instant replies.
+        rpm (int): Requests per minute before 429s, None for no limit.
+        error_rate (float): Fraction of requests answered with a 429 regardless of the limit.
+        replies (Callable): Messages to reply text, defaults to default_reply.
+        seed (int): Seed for latencies and injected errors.
+        metrics_file (str | Path): JSONL file that gets one line per request.
+    """
+
+    def __init__(self, latency="fixed:0", tokens_per_second=0.0, rpm=None, error_rate=0.0, replies=default_reply,
+                 seed=None, metrics_file=None):
+        self.sample_latency = parse_latency(latency)
+        self.latency_spec = latency
+        self.tokens_per_second = tokens_per_second
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.replies = replies
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # requests-per-minute window, a token bucket refilled continuously
+        self._tokens = float(rpm) if rpm else None
+        self._refilled = time.monotonic()
+        self._metrics_file = open(metrics_file, "a") if metrics_file else None
+        self.started = time.time()
+        self.requests = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.history = deque(maxlen=METRICS_HISTORY)
+        self._next_id = 0
+
+    def admit(self):
+        """
+        Decides whether a request is served.
+
+        Returns:
+            tuple: (request id, latency in seconds or None for a 429, rate limit headers).
+        """
+        with self._lock:
+            self._next_id += 1
+            request_id = self._next_id
+            headers = {}
+            limited = False
+            if self.rpm:
+                now = time.monotonic()
+                self._tokens = min(float(self.rpm), self._tokens + (now - self._refilled) * self.rpm / 60)
+                self._refilled = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                else:
+                    limited = True
+                reset = (1 - self._tokens) * 60 / self.rpm if self._tokens < 1 else 0.0
+                headers = {
+                    "x-ratelimit-limit-requests": str(self.rpm),
+                    "x-ratelimit-remaining-requests": str(int(self._tokens)),
+                    "x-ratelimit-reset-requests": f"{reset:.3f}s",
+                }
+                if limited:
+                    headers["retry-after"] = f"{reset:.3f}"
+            if not limited and self.error_rate and self._rng.random() < self.error_rate:
+                limited = True
+                headers["retry-after"] = "1"
+            latency = None if limited else max(0.0, self.sample_latency(self._rng))
+            if not limited:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return request_id, latency, headers
+
+    def record(self, entry, served):
+        with self._lock:
+            if served:
+                self.in_flight -= 1
+            self.requests[entry["status"]] += 1
+            self.prompt_tokens += entry.get("prompt_tokens", 0)
+            self.completion_tokens += entry.get("completion_tokens", 0)
+            self.history.append(entry)
+            if self._metrics_file is not None:
+                self._metrics_file.write(json.dumps(entry) + "\n")
+                self._metrics_file.flush()
+
+    def metrics(self):
+        """Totals and latency percentiles of the recent requests."""
+        with self._lock:
+            durations = sorted(entry["seconds"] for entry in self.history if entry["status"] == 200)
+            total = sum(self.requests.values())
+            elapsed = time.time() - self.started
+
+            def percentile(p):
+                return durations[min(len(durations) - 1, int(len(durations) * p))] if durations else None
+
+            return {
+                "requests": total,
+                "by_status": {str(status): count for status, count in self.requests.items()},
+                "rate_limited": self.requests.get(429, 0),
+                "requests_per_second": total / elapsed if elapsed else None,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "latency_p50": percentile(0.5),
+                "latency_p95": percentile(0.95),
+                "latency_max": durations[-1] if durations else None,
+                "config": {
+                    "latency": self.latency_spec,
+                    "tokens_per_second": self.tokens_per_second,
+                    "rpm": self.rpm,
+                    "error_rate": self.error_rate,
+                },
+            }
+
+    def close(self):
+        if self._metrics_file is not None:
+            self._metrics_file.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    behaviour = None
+
+    def log_message(self, format, *args):
+        # per-request metrics replace the access log
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/metrics":
+            self._send_json(200, self.behaviour.metrics())
+        elif path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": DEFAULT_MODEL, "object": "model", "owned_by": "mock"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        received = time.perf_counter()
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            messages = request["messages"]
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": {"message": f"Bad request: {e}", "type": "invalid_request_error"}})
+            return
+
+        behaviour = self.behaviour
+        request_id, latency, headers = behaviour.admit()
+        prompt_tokens = sum(estimate_tokens(_content(message)) for message in messages)
+        entry = {"id": request_id, "time": time.time(), "model": request.get("model"), "prompt_tokens": prompt_tokens}
+        if latency is None:
+            entry.update(status=429, seconds=time.perf_counter() - received)
+            behaviour.record(entry, served=False)
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error", "code": "rate_limit_exceeded"}}, headers)
+            return
+
+        try:
+            reply = behaviour.replies(messages)
+            completion_tokens = estimate_tokens(reply)
+            generation = completion_tokens / behaviour.tokens_per_second if behaviour.tokens_per_second else 0.0
+            time.sleep(latency + generation)
+            body = {
+                "id": f"chatcmpl-mock-{request_id}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model") or DEFAULT_MODEL,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+            entry.update(status=200, completion_tokens=completion_tokens, seconds=time.perf_counter() - received)
+        except Exception as e:
+            entry.update(status=500, seconds=time.perf_counter() - received)
+            behaviour.record(entry, served=True)
+            self._send_json(500, {"error": {"message": str(e), "type": "server_error"}})
+            return
+        behaviour.record(entry, served=True)
+        self._send_json(200, body, headers)
+
+
+class MockLLMServer:
+    """
+    The mock endpoint, served from a background thread.
+
+    Args:
+        behaviour (MockBehaviour): Latency, limits and replies.
+        host (str): Interface to listen on.
+        port (int): Port, 0 for any free port.
+    """
+
+    def __init__(self, behaviour=None, host="127.0.0.1", port=DEFAULT_PORT):
+        self.behaviour = behaviour or MockBehaviour()
+        handler = type("MockHandler", (_Handler,), {"behaviour": self.behaviour})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def base_url(self):
+        return f"http://{self._server.server_address[0]}:{self.port}/v1"
+
+    def llm_config(self, model=DEFAULT_MODEL):
+        """A sentient_llm_config["config_list"] entry that points an agent at this server."""
+        return {"llm_model_name": model, "api_key": "mock", "llm_base_url": self.base_url}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.behaviour.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a mock OpenAI-compatible chat completions endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", default="fixed:0",
+                        help="Time to first token: fixed:S, uniform:LOW,HIGH, exp:MEAN or lognormal:MEDIAN,SIGMA (default: fixed:0)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Generation speed, 0 for instant (default: 0)")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429 anyway")
+    parser.add_argument("--script", help="JSON or JSONL rules {\"match\": regex, \"reply\": text} tried before the default replies")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--metrics-file", help="Append one JSON line per request to this file")
+    args = parser.parse_args(argv)
+
+    behaviour = MockBehaviour(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        rpm=args.rpm,
+        error_rate=args.error_rate,
+        replies=ScriptedReplies.from_file(args.script) if args.script else default_reply,
+        seed=args.seed,
+        metrics_file=args.metrics_file,
+    )
+    server = MockLLMServer(behaviour, args.host, args.port)
+    print(f"Mock LLM endpoint at {server.base_url}, metrics at http://{args.host}:{server.port}/metrics")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
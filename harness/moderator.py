@@ -0,0 +1,529 @@
+"""
+An in-process moderator that plays whole games with imported agents.
+
+The game runner needs Docker images, a communication server and a port per
+game. Moderator plays the same game without any of them: it renders the
+moderator's messages from z-moderator-prompts/templates, enforces the game
+flow and calls async_notify / async_respond on the IReactiveAgent instances
+directly:
+
+    introduction, role assignment
+    night: wolf votes in the wolves' channel, seer guess and result, doctor save
+    day: night elimination, one discussion turn per player, one vote per player,
+         elimination and role reveal
+    until every wolf is dead or the wolves are at least as many as the others
+
+A prompt that expects an answer goes to async_respond of the player it
+addresses and to async_notify of everyone else in the channel, and the answer
+is passed on to the others as that player's message. Votes, guesses and saves
+are read from the answer by name; an answer naming no valid player, or more
+than one, gets the template's retry prompt, and after max_retries failed
+retries (or a response slower than response_timeout) the moderator picks at
+random, as the real one does. The real moderator asks an LLM which name an
+answer means (selection_identifier_prompt_text.txt), this one only matches
+names, so it is stricter.
+
+The agents' LLM clients are replaced by an in-process stand-in (see
+harness/llm_backends.py), by default a stub answering like the mock LLM
+server, so dozens of games run concurrently in one asyncio loop:
+
+    python -m harness.moderator --agents cot,trust,simple --games 24 --concurrency 24
+    python -m harness.moderator --agents trust --llm latency --latency 0.8 --jitter 0.4 --games 8 --transcripts emulated
+    python -m harness.moderator --agents autogen --llm endpoint --base-url http://127.0.0.1:8100/v1
+
+With --transcripts every player's messages are written in the transcript
+format harness/replay.py reads.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from harness.llm_backends import LatencyLLM, StubLLM, install_backend
+from harness.loader import AGENT_CONFIGS, close_agent, create_agent
+from harness.mock_llm_server import default_reply
+from harness.replay import DEFAULT_LLM_CONFIG, ReplayMessage, _latency_stats, to_activity_message
+from harness.templates import render, template
+from transcript.catalog import MODERATOR_NAME
+
+logger = logging.getLogger("moderator")
+
+GAME_ROOM = "play-arena"
+WOLFS_CHANNEL = "wolf's-den"
+DIRECT_CHANNEL = "direct"
+PLAYER_NAMES = (
+    "Frodo", "Samwise", "Aragorn", "Gimli", "Legolas", "Boromir", "Galadriel", "Elrond",
+    "Eowyn", "Faramir", "Arwen", "Pippin", "Merry", "Theoden", "Bilbo", "Gandalf",
+)
+WOLF, VILLAGER, SEER, DOCTOR = "wolf", "villager", "seer", "doctor"
+VILLAGE, WOLVES = "village", "wolves"
+
+DEFAULT_PLAYERS = 8
+DEFAULT_WOLVES = 2
+DEFAULT_RESPONSE_TIMEOUT = 60.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_CONCURRENCY = 16
+
+
+def resolve_choice(text, candidates):
+    """
+    The one candidate an answer names.
+
+    Args:
+        text (str): The player's answer.
+        candidates (list): Valid player names.
+
+    Returns:
+        str | None: The candidate, None if the answer names none or several of them.
+    """
+    named = [
+        name for name in candidates
+        if re.search(rf"(?<!\w){re.escape(name)}(?!\w)", text or "", re.IGNORECASE)
+    ]
+    return named[0] if len(named) == 1 else None
+
+
+def deal_roles(names, wolves=DEFAULT_WOLVES, rng=None):
+    """{name: role} with the given number of wolves, one seer, one doctor and villagers."""
+    if len(names) < wolves + 3:
+        raise ValueError(f"{len(names)} players leave no villager next to {wolves} wolves, a seer and a doctor")
+    rng = rng or random.Random()
+    deck = [WOLF] * wolves + [SEER, DOCTOR] + [VILLAGER] * (len(names) - wolves - 2)
+    rng.shuffle(deck)
+    return dict(zip(names, deck))
+
+
+class Moderator:
+    """
+    Plays one game with initialized agents.
+
+    Args:
+        agents (dict): {player name: IReactiveAgent}.
+        roles (dict): {player name: role}, see deal_roles.
+        game_id (str): Used for transcript file names.
+        seed (int): Seed for speaking order, tie breaks and random picks.
+        response_timeout (float): Seconds an async_respond may take before the moderator moves on.
+        max_retries (int): Retry prompts after an answer that names no valid player.
+        transcript_dir (str | Path): Directory for the players' transcripts, None for none.
+    """
+
+    def __init__(self, agents, roles, game_id="local", seed=None, response_timeout=DEFAULT_RESPONSE_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES, transcript_dir=None):
+        self.agents = agents
+        self.roles = roles
+        self.game_id = game_id
+        self.response_timeout = response_timeout
+        self.max_retries = max_retries
+        self.alive = list(agents)
+        self.round = 0
+        self.eliminations = []
+        self.latencies = {"notify": [], "respond": []}
+        self.counts = Counter()
+        self._random = random.Random(seed)
+        self._message_index = 0
+        self._transcripts = {}
+        if transcript_dir is not None:
+            game_dir = Path(transcript_dir) / f"GAME_ID_{game_id}"
+            game_dir.mkdir(parents=True, exist_ok=True)
+            # named as TranscriptCatalog.ingest files them (GAME_ID_<game id>/<player>_<kind>), so
+            # transcript/catalog.py indexes them in place and harness/replay.py reads them
+            self._transcripts = {name: open(game_dir / f"{name}_transcript.jsonl", "w") for name in agents}
+
+    def _others(self, player):
+        return [name for name in self.alive if name != player]
+
+    def winner(self):
+        """VILLAGE, WOLVES or None while the game goes on."""
+        wolves = sum(self.roles[name] == WOLF for name in self.alive)
+        if wolves == 0:
+            return VILLAGE
+        if wolves >= len(self.alive) - wolves:
+            return WOLVES
+        return None
+
+    def _end_reason(self):
+        winner = self.winner()
+        if winner == VILLAGE:
+            return "all the wolves have been eliminated, the villagers win."
+        if winner == WOLVES:
+            return "the wolves are as many as the villagers, the wolves win."
+        return ""
+
+    def _log(self, player, message):
+        f = self._transcripts.get(player)
+        if f is not None:
+            f.write(json.dumps({
+                "sender": message.sender, "channel": message.channel,
+                "channel_type": DIRECT_CHANNEL if message.direct else "group",
+                "text": message.text, "respond": message.respond,
+            }) + "\n")
+
+    async def _deliver(self, player, message):
+        # one message to one player, the answer's text for prompts; a failing agent doesn't stop the game
+        self._message_index += 1
+        activity_message = to_activity_message(message, self._message_index, player)
+        self._log(player, message)
+        agent = self.agents[player]
+        kind = "respond" if message.respond else "notify"
+        started = time.perf_counter()
+        try:
+            if not message.respond:
+                await agent.async_notify(activity_message)
+                return None
+            response = await asyncio.wait_for(agent.async_respond(activity_message), self.response_timeout)
+            text = response.response.text
+            self._log(player, ReplayMessage(player, message.channel, message.direct, text, False))
+            return text
+        except asyncio.TimeoutError:
+            self.counts["timeouts"] += 1
+            logger.warning(f"{player} didn't answer within {self.response_timeout}s")
+            return None
+        except Exception:
+            self.counts["errors"] += 1
+            logger.exception(f"{player}'s async_{kind} failed")
+            return None
+        finally:
+            self.latencies[kind].append(time.perf_counter() - started)
+            self.counts[kind] += 1
+
+    async def send(self, text, recipients, channel=GAME_ROOM, direct=False, sender=MODERATOR_NAME, ask=None):
+        """
+        Sends a message to some players.
+
+        Args:
+            text (str): The message.
+            recipients (list): Players who receive it.
+            channel (str): Channel name.
+            direct (bool): A direct message rather than a group one.
+            sender (str): The moderator, or the player whose message is passed on.
+            ask (str): The recipient who has to answer it, the others are only notified.
+
+        Returns:
+            str | None: ask's answer, None without ask or if they gave none.
+        """
+        deliveries = [
+            self._deliver(player, ReplayMessage(sender, channel, direct, text, player == ask))
+            for player in recipients if player != sender
+        ]
+        results = await asyncio.gather(*deliveries)
+        return next((result for result in results if result is not None), None)
+
+    async def choose(self, player, prompt, retry_prompt, candidates, audience, channel, direct=False):
+        """
+        Asks a player to name one of the candidates, with retries.
+
+        Args:
+            player (str): The player asked.
+            prompt (str): The rendered prompt.
+            retry_prompt (str): Sent after an answer naming no candidate.
+            candidates (list): Valid answers.
+            audience (list): Everyone in the channel, they see the prompt and the answer.
+            channel (str): Channel name.
+            direct (bool): Ask in a direct message.
+
+        Returns:
+            str: The chosen candidate, a random one if the player never named one.
+        """
+        for attempt in range(self.max_retries + 1):
+            answer = await self.send(prompt if attempt == 0 else retry_prompt, audience, channel, direct, ask=player)
+            if answer is None:
+                # no answer in time, the real moderator doesn't wait for a retry either
+                break
+            if not direct:
+                await self.send(answer, audience, channel, sender=player)
+            choice = resolve_choice(answer, candidates)
+            if choice is not None:
+                return choice
+            if attempt < self.max_retries:
+                self.counts["retries"] += 1
+        self.counts["random_choices"] += 1
+        return self._random.choice(candidates)
+
+    def _tally(self, votes):
+        counts = Counter(votes)
+        top = max(counts.values())
+        return self._random.choice(sorted(name for name, count in counts.items() if count == top))
+
+    def _eliminate(self, player, phase):
+        self.alive.remove(player)
+        self.eliminations.append({"round": self.round, "phase": phase, "player": player, "role": self.roles[player]})
+
+    async def night(self):
+        self.round += 1
+        await self.send(render(template("night_start")), self.alive)
+
+        wolves = [name for name in self.alive if self.roles[name] == WOLF]
+        targets = [name for name in self.alive if self.roles[name] != WOLF]
+        await self.send(render(template("wolf_night_introduction"), is_first_night=self.round == 1,
+                               players=", ".join(targets)), wolves, WOLFS_CHANNEL)
+        votes = []
+        for wolf in wolves:
+            votes.append(await self.choose(
+                wolf,
+                render(template("wolf_vote"), delegate_player=wolf),
+                render(template("wolf_vote_local_retry"), delegatte_player=wolf, alive_players=", ".join(targets)),
+                targets, wolves, WOLFS_CHANNEL,
+            ))
+        victim = self._tally(votes)
+
+        seer = next((name for name in self.alive if self.roles[name] == SEER), None)
+        if seer is not None:
+            candidates = self._others(seer)
+            checked = await self.choose(
+                seer,
+                render(template("seer_guess"), player=seer, alive_players=", ".join(candidates)),
+                render(template("seer_guess_local_retry"), alive_players=", ".join(candidates)),
+                candidates, [seer], DIRECT_CHANNEL, direct=True,
+            )
+            await self.send(render(template("seer_guess_result"), player=seer, selected_player=checked,
+                                   is_wolf=self.roles[checked] == WOLF), [seer], DIRECT_CHANNEL, direct=True)
+
+        doctor = next((name for name in self.alive if self.roles[name] == DOCTOR), None)
+        saved = None
+        if doctor is not None:
+            saved = await self.choose(
+                doctor,
+                render(template("doctor_save"), player=doctor, alive_players=", ".join(self.alive)),
+                render(template("doctor_save_local_retry"), player=doctor, alive_players=", ".join(self.alive)),
+                list(self.alive), [doctor], DIRECT_CHANNEL, direct=True,
+            )
+
+        killed = victim if victim != saved else ""
+        if killed:
+            self._eliminate(killed, "night")
+        await self.send(render(template("day_start"), eliminated_villager=killed,
+                               is_game_ended=self.winner() is not None, game_end_reason=self._end_reason()),
+                        self.alive + ([killed] if killed else []))
+
+    async def day(self):
+        for speaker in self._random.sample(self.alive, len(self.alive)):
+            answer = await self.send(render(template("day_discussion_initiation"), delegate_player=speaker),
+                                     self.alive, ask=speaker)
+            if answer is not None:
+                await self.send(answer, self.alive, sender=speaker)
+
+        await self.send(render(template("wolf_elimination_consens")), self.alive)
+        votes = []
+        for voter in list(self.alive):
+            candidates = self._others(voter)
+            votes.append(await self.choose(
+                voter,
+                render(template("day_wolf_elimination_vote_casting"), delegate_player=voter),
+                render(template("day_wolf_elimination_vote_local_retry"), delegatte_player=voter,
+                       alive_players=", ".join(candidates)),
+                candidates, self.alive, GAME_ROOM,
+            ))
+        lynched = self._tally(votes)
+        audience = list(self.alive)
+        self._eliminate(lynched, "day")
+        await self.send(render(template("day_end_message"), eliminated_player=lynched,
+                               eliminated_player_role=self.roles[lynched], is_game_ended=self.winner() is not None,
+                               game_end_reason=self._end_reason()), audience)
+
+    async def run(self):
+        """
+        Plays the game to the end.
+
+        Returns:
+            dict: game_id, winner, rounds, roles, eliminations, message counts (notify, respond,
+                retries, random_choices, timeouts, errors), notify/respond latencies and wall_seconds.
+        """
+        started = time.perf_counter()
+        names = list(self.agents)
+        try:
+            await self.send(render(template("introduction"), moderator_name=MODERATOR_NAME, game_room=GAME_ROOM,
+                                   players=", ".join(names)), names)
+            for name in names:
+                await self.send(render(template("set_role"), player=name, role=self.roles[name]), [name],
+                                DIRECT_CHANNEL, direct=True)
+            # every day eliminates a player, so the game can't outlast its player count
+            while self.winner() is None and self.round < len(names):
+                await self.night()
+                if self.winner() is not None:
+                    break
+                await self.day()
+        finally:
+            for f in self._transcripts.values():
+                f.close()
+        return {
+            "game_id": self.game_id,
+            "winner": self.winner(),
+            "rounds": self.round,
+            "roles": dict(self.roles),
+            "eliminations": self.eliminations,
+            **{name: self.counts[name] for name in ("notify", "respond", "retries", "random_choices", "timeouts", "errors")},
+            "notify_latency": _latency_stats(self.latencies["notify"]),
+            "respond_latency": _latency_stats(self.latencies["respond"]),
+            "wall_seconds": time.perf_counter() - started,
+        }
+
+
+def make_backend(llm="stub", latency=0.5, jitter=0.0, seed=None):
+    """
+    The LLM stand-in factory for install_backend, None to keep the agents' own clients.
+
+    Args:
+        llm (str): "stub" (instant rule-based replies, see harness/mock_llm_server.py), "latency"
+            (the same after a random delay) or "endpoint" (the agents' clients, e.g. against the mock server).
+    """
+    if llm == "stub":
+        return lambda client: StubLLM(default_reply)
+    if llm == "latency":
+        rng = random.Random(seed)
+        # one seed per agent, so concurrent agents don't wait in lockstep
+        return lambda client: LatencyLLM(StubLLM(default_reply), latency, jitter, rng.getrandbits(32))
+    return None
+
+
+async def play_game(seating, game_id="local", wolves=DEFAULT_WOLVES, llm_config=None, backend=None, seed=None,
+                    **moderator_options):
+    """
+    Creates the agents of one game and plays it.
+
+    Args:
+        seating (dict): {player name: AGENT_CONFIGS key or agent spec dict}.
+        game_id (str): The game's id.
+        wolves (int): Number of wolves.
+        llm_config (dict): Passed to the agents, DEFAULT_LLM_CONFIG's dummy endpoint by default.
+        backend (Callable): LLM stand-in factory, see make_backend.
+        seed (int): Seed for roles and the moderator's choices.
+        **moderator_options: response_timeout, max_retries, transcript_dir.
+
+    Returns:
+        dict: Moderator.run's result, with each player's agent under "agents".
+    """
+    rng = random.Random(seed)
+    roles = deal_roles(list(seating), wolves, rng)
+    agents = {}
+    backends = []
+    # agents such as trust read the players from the list in their description
+    description = f"A werewolf player. The players in this game are {list(seating)}"
+    for name, agent in seating.items():
+        agents[name] = create_agent(agent, name, dict(llm_config or DEFAULT_LLM_CONFIG), description)
+        if backend is not None:
+            backends.extend(install_backend(agents[name], backend))
+    try:
+        result = await Moderator(agents, roles, game_id, rng.getrandbits(32), **moderator_options).run()
+    finally:
+        for installed in backends:
+            await installed.aclose()
+        for instance in agents.values():
+            close_agent(instance)
+    result["agents"] = {name: agent if isinstance(agent, str) else agent["agent_class"] for name, agent in seating.items()}
+    return result
+
+
+async def play_games(count, agents, players=DEFAULT_PLAYERS, concurrency=DEFAULT_CONCURRENCY, seed=None, **options):
+    """
+    Plays games concurrently in the running event loop.
+
+    Args:
+        count (int): Number of games.
+        agents (list): AGENT_CONFIGS keys, seated in turn; the seating rotates between games.
+        players (int): Players per game.
+        concurrency (int): Games in progress at once.
+        seed (int): Seed of the whole batch.
+        **options: Passed to play_game.
+
+    Returns:
+        list: play_game's results, in game order.
+    """
+    names = [PLAYER_NAMES[i % len(PLAYER_NAMES)] + (str(i // len(PLAYER_NAMES)) if i >= len(PLAYER_NAMES) else "")
+             for i in range(players)]
+    batch = int(time.time())
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(number):
+        seating = {name: agents[(number + seat) % len(agents)] for seat, name in enumerate(names)}
+        async with semaphore:
+            return await play_game(seating, f"{batch}_{number:04x}",
+                                   seed=None if seed is None else seed * 1_000_003 + number, **options)
+
+    return await asyncio.gather(*(one(number) for number in range(count)))
+
+
+def summarize(results):
+    """Team wins, per agent wins by role and the moderator's counters over many games."""
+    by_agent = defaultdict(lambda: defaultdict(lambda: {"games": 0, "wins": 0}))
+    for result in results:
+        for name, role in result["roles"].items():
+            entry = by_agent[result["agents"][name]][role]
+            entry["games"] += 1
+            entry["wins"] += (result["winner"] == WOLVES) == (role == WOLF)
+    totals = Counter()
+    for result in results:
+        totals.update({name: result[name] for name in ("notify", "respond", "retries", "random_choices", "timeouts", "errors")})
+    return {
+        "games": len(results),
+        "winners": dict(Counter(result["winner"] for result in results)),
+        "mean_rounds": sum(result["rounds"] for result in results) / len(results) if results else None,
+        "agents": {agent: dict(roles) for agent, roles in by_agent.items()},
+        **totals,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play werewolf games in-process with an emulated moderator")
+    parser.add_argument("--agents", default="trust", help=f"Comma separated agents ({', '.join(sorted(AGENT_CONFIGS))})")
+    parser.add_argument("--games", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Games played at once")
+    parser.add_argument("--players", type=int, default=DEFAULT_PLAYERS)
+    parser.add_argument("--wolves", type=int, default=DEFAULT_WOLVES)
+    parser.add_argument("--llm", default="stub", choices=("stub", "latency", "endpoint"),
+                        help="stub: instant rule-based replies, latency: the same after a delay, "
+                             "endpoint: the agents' own clients against --base-url")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean delay of --llm latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="The delay of --llm latency is mean +- jitter")
+    parser.add_argument("--base-url", help="LLM endpoint for --llm endpoint, e.g. a harness.mock_llm_server")
+    parser.add_argument("--api-key")
+    parser.add_argument("--model")
+    parser.add_argument("--response-timeout", type=float, default=DEFAULT_RESPONSE_TIMEOUT)
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES)
+    parser.add_argument("--transcripts", help="Write every player's transcript to this directory")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print every game's result as JSON")
+    args = parser.parse_args(argv)
+
+    agents = args.agents.split(",")
+    unknown = [agent for agent in agents if agent not in AGENT_CONFIGS]
+    if unknown:
+        parser.error(f"Unknown agents {', '.join(unknown)}, choose from {', '.join(sorted(AGENT_CONFIGS))}")
+    if args.llm == "endpoint" and not args.base_url:
+        parser.error("--llm endpoint needs --base-url")
+    llm_config = dict(DEFAULT_LLM_CONFIG)
+    for key, value in (("llm_base_url", args.base_url), ("api_key", args.api_key), ("llm_model_name", args.model)):
+        if value is not None:
+            llm_config[key] = value
+
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(play_games(
+            args.games, agents, args.players, args.concurrency, args.seed,
+            wolves=args.wolves, llm_config=llm_config, backend=make_backend(args.llm, args.latency, args.jitter, args.seed),
+            response_timeout=args.response_timeout, max_retries=args.max_retries, transcript_dir=args.transcripts,
+        ))
+    except ValueError as e:
+        parser.error(str(e))
+    wall = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    summary = summarize(results)
+    print(f"{summary['games']} games in {wall:.1f}s ({summary['games'] / wall:.2f} games/s), "
+          f"mean {summary['mean_rounds']:.1f} rounds, winners {summary['winners']}")
+    print(f"{summary['respond']} prompts, {summary['retries']} retries, {summary['random_choices']} random choices, "
+          f"{summary['timeouts']} timeouts, {summary['errors']} errors")
+    print(f"{'agent':<10}{'role':<10}{'games':>7}{'wins':>7}{'win rate':>10}")
+    for agent, roles in sorted(summary["agents"].items()):
+        for role, entry in sorted(roles.items()):
+            print(f"{agent:<10}{role:<10}{entry['games']:>7}{entry['wins']:>7}{entry['wins'] / entry['games']:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
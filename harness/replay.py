@@ -0,0 +1,301 @@
+"""
+Offline replay of a recorded transcript into an agent, with latency numbers.
+
+Feeds the messages a player received in a recorded game to any IReactiveAgent
+in-process, in order: moderator prompts that expect an answer (discussion,
+votes, the seer's and doctor's night actions) go to async_respond, everything
+else to async_notify. The player's own messages in the transcript are its
+old answers and are skipped. The agent's AsyncLLMClient is replaced by a
+backend from harness/llm_backends.py, so with the default stub LLM a replay
+takes seconds, needs no network and measures only the agent's own overhead.
+
+    python -m harness.replay transcript/GAME_ID_1730000000_4f2a/frodo_transcript.jsonl --agent cot
+    python -m harness.replay game_results/batch_1730000000/transcripts.wta --game-id 1730000000_4f2a \\
+        --player Chagent --agent cot --llm latency --latency 0.8 --jitter 0.3
+    python -m harness.replay frodo_transcript.jsonl --agent trust --llm recorded --recording llm.jsonl
+
+Agents that don't use AsyncLLMClient (autogen) can be replayed with
+--llm endpoint against an OpenAI-compatible server, e.g. a local mock.
+"""
+import argparse
+import asyncio
+import json
+import re
+import statistics
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from sentient_campaign.agents.v1.message import (
+    ActivityMessage,
+    ActivityMessageHeader,
+    MessageChannelType,
+    MimeType,
+    TextContent,
+)
+
+from harness.llm_backends import LatencyLLM, RecordedLLM, RecordingLLM, StubLLM, install_backend
+from harness.loader import AGENT_CONFIGS, close_agent, create_agent
+from transcript.archive import ARCHIVE_SUFFIX, TranscriptArchive
+from transcript.catalog import MODERATOR_NAME, message_fields, parse_transcript_name
+
+ReplayMessage = namedtuple("ReplayMessage", ["sender", "channel", "direct", "text", "respond"])
+
+# headings of the moderator prompts that wait for an answer, see z-moderator-prompts/templates
+RESPOND_HEADINGS = re.compile(r"^\s*(discussion|day vote|doctor save|seer guess|wolf vote)( retry)?\s*:", re.IGNORECASE)
+RESPOND_KEYS = ("respond", "requires_response", "expects_response")
+DIRECT_CHANNELS = ("direct", MODERATOR_NAME)
+DEFAULT_LLM_CONFIG = {"llm_model_name": "replay", "api_key": "replay", "llm_base_url": "http://127.0.0.1:9/v1"}
+
+
+def _channel_type(record):
+    header = record.get("header") if isinstance(record.get("header"), dict) else {}
+    value = header.get("channel_type", record.get("channel_type"))
+    return None if value is None else str(value).rsplit(".", 1)[-1].lower()
+
+
+def parse_messages(lines, player):
+    """
+    Turns transcript lines into the messages the player received.
+
+    Args:
+        lines (Iterable): JSON transcript lines (str or bytes).
+        player (str): The player whose transcript it is.
+
+    Returns:
+        list: ReplayMessage tuples, in order.
+    """
+    messages = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(record, dict):
+            continue
+        sender, channel, text = message_fields(record)
+        if sender == player:
+            continue
+        channel_type = _channel_type(record)
+        direct = channel_type == "direct" if channel_type is not None else (channel in DIRECT_CHANNELS or channel == sender)
+        explicit = next((record[key] for key in RESPOND_KEYS if key in record), None)
+        if explicit is not None:
+            respond = bool(explicit)
+        else:
+            # a group prompt is only answered by the player it addresses
+            respond = (sender == MODERATOR_NAME and RESPOND_HEADINGS.match(text) is not None
+                       and (direct or player in text))
+        messages.append(ReplayMessage(sender, channel, direct, text, respond))
+    return messages
+
+
+def load_transcript(path, player=None, game_id=None):
+    """
+    Reads the messages of one player's transcript.
+
+    Args:
+        path (str | Path): A .jsonl transcript, or a transcript archive.
+        player (str): The player, read from the file name if not given (required for archives).
+        game_id (str): The game in an archive, defaults to the archive's first game.
+
+    Returns:
+        tuple: (player, list of ReplayMessage).
+    """
+    path = Path(path)
+    if path.suffix == ARCHIVE_SUFFIX:
+        if player is None:
+            raise ValueError("--player is needed to replay from an archive")
+        with TranscriptArchive(path) as archive:
+            game_id = game_id or archive.games()[0]
+            lines = [
+                line for name, f in archive.files(game_id).items()
+                if f["player"] == player and name.endswith(".jsonl")
+                for line in archive.read(game_id, name).splitlines()
+            ]
+        return player, parse_messages(lines, player)
+
+    if player is None:
+        parsed = parse_transcript_name(path.name)
+        player = parsed[0] if parsed else path.name.rsplit("_", 1)[0]
+    with open(path, "rb") as f:
+        return player, parse_messages(f, player)
+
+
+def to_activity_message(message, index, player):
+    return ActivityMessage(
+        content_type=MimeType.TEXT_PLAIN,
+        header=ActivityMessageHeader(
+            message_id=str(index),
+            sender=message.sender,
+            channel=message.channel,
+            channel_type=MessageChannelType.DIRECT if message.direct else MessageChannelType.GROUP,
+            target_receivers=[player],
+        ),
+        content=TextContent(text=message.text),
+    )
+
+
+def _latency_stats(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    return {
+        "count": len(values),
+        "mean_ms": statistics.fmean(values) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+class ReplayReport:
+    """Per-message latencies of a replay, split by notify and respond."""
+
+    def __init__(self):
+        self.latencies = {"notify": [], "respond": []}
+        self.responses = []
+        self.wall_seconds = 0.0
+        self.drain_seconds = 0.0
+        self.llm = []
+
+    def to_dict(self):
+        messages = sum(len(values) for values in self.latencies.values())
+        return {
+            "messages": messages,
+            "wall_seconds": self.wall_seconds,
+            "messages_per_second": messages / self.wall_seconds if self.wall_seconds else None,
+            "notify": _latency_stats(self.latencies["notify"]),
+            "respond": _latency_stats(self.latencies["respond"]),
+            "background_drain_seconds": self.drain_seconds,
+            "llm": self.llm,
+        }
+
+    def format(self):
+        report = self.to_dict()
+        lines = [
+            f"{report['messages']} messages in {report['wall_seconds']:.3f}s "
+            f"({report['messages_per_second'] or 0:.1f} messages/s)"
+        ]
+        for kind in ("notify", "respond"):
+            stats = report[kind]
+            if stats["count"]:
+                lines.append(
+                    f"{kind:<8}{stats['count']:>6} calls  mean {stats['mean_ms']:8.2f}ms  p50 {stats['p50_ms']:8.2f}ms  "
+                    f"p95 {stats['p95_ms']:8.2f}ms  max {stats['max_ms']:8.2f}ms"
+                )
+        lines.append(f"background work drained in {report['background_drain_seconds']:.3f}s")
+        for backend in report["llm"]:
+            lines.append(f"llm: {json.dumps(backend)}")
+        return "\n".join(lines)
+
+
+async def replay(agent, messages, player, backends=(), drain_timeout=60.0):
+    """
+    Replays messages into an agent.
+
+    Args:
+        agent (IReactiveAgent): An initialized agent.
+        messages (list): ReplayMessage tuples from load_transcript.
+        player (str): The agent's player name.
+        backends (list): The LLM backends installed in the agent, for the report.
+        drain_timeout (float): Seconds to wait for the agent's background notify work at the end.
+
+    Returns:
+        ReplayReport: Latencies, the agent's responses and the LLM backend stats.
+    """
+    report = ReplayReport()
+    started = time.perf_counter()
+    for index, message in enumerate(messages):
+        activity_message = to_activity_message(message, index, player)
+        message_started = time.perf_counter()
+        if message.respond:
+            response = await agent.async_respond(activity_message)
+            report.responses.append({"index": index, "prompt": message.text, "response": response.response.text})
+        else:
+            await agent.async_notify(activity_message)
+        report.latencies["respond" if message.respond else "notify"].append(time.perf_counter() - message_started)
+
+    # agents with a notify queue keep working after async_notify returns
+    drain_started = time.perf_counter()
+    notify_queue = getattr(agent, "notify_queue", None)
+    if notify_queue is not None:
+        await notify_queue.drain(drain_timeout)
+    report.drain_seconds = time.perf_counter() - drain_started
+    report.wall_seconds = time.perf_counter() - started
+    report.llm = [{"backend": type(backend).__name__, **backend.stats()} for backend in backends]
+    return report
+
+
+def _make_backend(args):
+    if args.llm == "stub":
+        return lambda client: StubLLM()
+    if args.llm == "latency":
+        return lambda client: LatencyLLM(StubLLM(), args.latency, args.jitter, args.seed)
+    if args.llm == "recorded":
+        return lambda client: RecordedLLM(args.recording)
+    if args.llm == "record":
+        return lambda client: RecordingLLM(client, args.recording)
+    return None
+
+
+async def _run(args):
+    player, messages = load_transcript(args.transcript, args.player, args.game_id)
+    llm_config = dict(DEFAULT_LLM_CONFIG)
+    for key, value in (("llm_base_url", args.base_url), ("api_key", args.api_key), ("llm_model_name", args.model)):
+        if value is not None:
+            llm_config[key] = value
+
+    reports = []
+    for _ in range(args.repeat):
+        # a fresh agent per run, the agents keep game state
+        agent = create_agent(args.agent, player, llm_config)
+        make_backend = _make_backend(args)
+        backends = install_backend(agent, make_backend) if make_backend else []
+        reports.append(await replay(agent, messages, player, backends))
+        for backend in backends:
+            await backend.aclose()
+        close_agent(agent)
+    return player, messages, reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded transcript into an agent, offline")
+    parser.add_argument("transcript", help="A player's .jsonl transcript, or a transcripts archive")
+    parser.add_argument("--agent", required=True, choices=sorted(AGENT_CONFIGS))
+    parser.add_argument("--player", help="Player name, read from the transcript file name by default")
+    parser.add_argument("--game-id", help="Game to replay from an archive (default: its first game)")
+    parser.add_argument("--llm", default="stub", choices=("stub", "latency", "recorded", "record", "endpoint"),
+                        help="stub: instant canned replies, latency: stub replies after a delay, recorded: replies from "
+                             "--recording, record: the real endpoint, saved to --recording, endpoint: the real endpoint")
+    parser.add_argument("--recording", help="JSONL file of recorded LLM replies")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean delay of --llm latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="The delay of --llm latency is mean +- jitter")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--base-url", help="LLM endpoint for --llm record and endpoint")
+    parser.add_argument("--api-key")
+    parser.add_argument("--model")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay N times with a fresh agent each time")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    parser.add_argument("--responses", action="store_true", help="Print the agent's responses")
+    args = parser.parse_args(argv)
+    if args.llm in ("recorded", "record") and not args.recording:
+        parser.error(f"--llm {args.llm} needs --recording")
+
+    player, messages, reports = asyncio.run(_run(args))
+    if args.json:
+        print(json.dumps([report.to_dict() for report in reports], indent=2))
+    else:
+        respond_count = sum(message.respond for message in messages)
+        print(f"Replayed {len(messages)} messages ({respond_count} prompts) into {args.agent} as {player}")
+        for run, report in enumerate(reports, start=1):
+            print(f"\nRun {run}:")
+            print(report.format())
+    if args.responses:
+        for response in reports[-1].responses:
+            print(f"\n[{response['index']}] {response['prompt'].strip()}\n-> {response['response']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+The moderator's message templates, rendered without Jinja.
+
+z-moderator-prompts/templates holds the messages the game's moderator sends.
+render implements the small part of Jinja they use, {{ var }} and
+{% if %} / {% else %} / {% endif %}, so the harness's moderator and the
+benchmarks' synthetic games produce the same text as a real game without
+depending on jinja2. The templates are parsed by the trust agent's
+agent/moderator_templates.py, the parser its ModeratorTemplateMatcher
+compiles them with, so the harness and the agents read them the same way.
+
+The agents' wheels only ship their agent package, so the trust and cot agents
+carry a copy of the templates in TEMPLATES. check() compares the copies with
+the directory and renders each message the agents act on back through the
+matcher:
+
+    python -m harness.templates --check
+"""
+import argparse
+import re
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+from harness.loader import AGENT_CONFIGS, load_agent_module
+
+TEMPLATES_DIR = Path(__file__).resolve().parents[1] / "z-moderator-prompts" / "templates"
+# agents with a copy of the templates in agent/moderator_templates.py
+TEMPLATE_AGENTS = ("trust", "cot")
+# the moderator's own LLM prompt, never sent to a player
+NOT_MESSAGES = {"selection_identifier_prompt_text"}
+
+# (template, variables), one per branch the agents tell apart
+ROUND_TRIPS = [
+    ("set_role", {"player": "Frodo", "role": "seer"}),
+    ("day_start", {"eliminated_villager": ""}),
+    ("day_start", {"eliminated_villager": "Sam", "is_game_ended": False}),
+    ("day_start", {"eliminated_villager": "Sam", "is_game_ended": True, "game_end_reason": "the wolves outnumber the villagers"}),
+    ("day_end_message", {"eliminated_player": "Sam", "eliminated_player_role": "villager", "is_game_ended": False}),
+    ("day_end_message", {"eliminated_player": "Sam", "eliminated_player_role": "wolf", "is_game_ended": True,
+                         "game_end_reason": "every wolf was eliminated"}),
+    ("seer_guess_result", {"player": "Frodo", "selected_player": "Sam", "is_wolf": True}),
+    ("seer_guess_result", {"player": "Frodo", "selected_player": "Sam", "is_wolf": False}),
+]
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+_templates = {}
+
+
+@lru_cache(maxsize=None)
+def _moderator_templates(agent="trust"):
+    return load_agent_module(AGENT_CONFIGS[agent]["agent_dir"], "agent/moderator_templates.py")
+
+
+@lru_cache(maxsize=None)
+def _parsed(source):
+    return _moderator_templates()._parse_template(source)
+
+
+def template(name):
+    """The source of one moderator template, e.g. template("day_start")."""
+    if name not in _templates:
+        _templates[name] = (TEMPLATES_DIR / f"{name}.txt").read_text()
+    return _templates[name]
+
+
+def load_templates():
+    """Every moderator template in TEMPLATES_DIR, name (file name without .txt) to source."""
+    return {
+        path.stem: path.read_text() for path in sorted(TEMPLATES_DIR.glob("*.txt")) if path.stem not in NOT_MESSAGES
+    }
+
+
+def _condition(condition, values):
+    if condition.startswith("not "):
+        return not _condition(condition[4:].strip(), values)
+    equals = _moderator_templates()._EQUALS_CONDITION_RE.match(condition)
+    if equals:
+        return str(values.get(equals.group(1), "")) == equals.group(3)
+    return bool(values.get(condition))
+
+
+def _render_nodes(nodes, values, out):
+    for node in nodes:
+        if node[0] == "text":
+            out.append(node[1])
+        elif node[0] == "var":
+            out.append(str(values.get(node[1], "")))
+        else:
+            _, condition, then_nodes, else_nodes = node
+            _render_nodes(then_nodes if _condition(condition, values) else else_nodes, values, out)
+
+
+def render(source, **values):
+    """
+    Renders a moderator template.
+
+    Only what the templates use is supported: {{ name }}, and {% if %} / {% else %} /
+    {% endif %} on a variable, `not` a variable or `variable == "literal"`.
+
+    Args:
+        source (str): Template source.
+        **values: Template variables, missing ones render as "".
+
+    Returns:
+        str: The rendered message.
+    """
+    out = []
+    _render_nodes(_parsed(source), values, out)
+    return "".join(out)
+
+
+def check():
+    """
+    Compares the agents' copies of the templates with TEMPLATES_DIR and matches rendered messages.
+
+    Whitespace is compared collapsed, as the matcher reads it. Each of ROUND_TRIPS is rendered
+    from the directory's template and has to match that template with every variable it was
+    rendered with.
+
+    Returns:
+        list: The problems found, empty if there are none.
+    """
+    problems = []
+    templates = load_templates()
+    for agent in TEMPLATE_AGENTS:
+        module = _moderator_templates(agent)
+        for name in sorted(templates.keys() | module.TEMPLATES.keys()):
+            if name not in module.TEMPLATES:
+                problems.append(f"{agent}: {name} is missing from TEMPLATES")
+            elif name not in templates:
+                problems.append(f"{agent}: TEMPLATES has {name}, which isn't in {TEMPLATES_DIR}")
+            elif _WHITESPACE_RE.split(templates[name].strip()) != _WHITESPACE_RE.split(module.TEMPLATES[name].strip()):
+                problems.append(f"{agent}: TEMPLATES[{name!r}] differs from {name}.txt")
+
+        matcher = module.ModeratorTemplateMatcher()
+        for name, values in ROUND_TRIPS:
+            match = matcher.match(render(templates[name], **values))
+            if match is None or match.template != name:
+                found = match.template if match is not None else "no template"
+                problems.append(f"{agent}: {name} rendered with {values} matches {found}")
+                continue
+            wrong = {key: match.fields.get(key) for key, value in values.items() if match.fields.get(key) != value}
+            if wrong:
+                problems.append(f"{agent}: {name} rendered with {values} matches with {wrong}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="The moderator's message templates")
+    parser.add_argument("--check", action="store_true",
+                        help="Check the agents' copies of the templates and that their matcher reads rendered messages")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        problems = check()
+        for problem in problems:
+            print(problem)
+        print(f"{len(problems)} problems" if problems else "the agents' templates match z-moderator-prompts/templates")
+        return 1 if problems else 0
+    print("\n".join(sorted(load_templates())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Vectorized decision policies for the Monte Carlo simulator.
+
+Every decision of the game has its own policy, chosen by name from the
+registries at the bottom of this module:
+
+    wolf_kill     whom the wolves eliminate at night
+    doctor_save   whom the doctor protects
+    seer_check    whom the seer investigates
+    seer_reveal   whether the seer publishes their checks during the day
+    town_vote     whom the villagers, the seer and the doctor vote for
+    wolf_vote     whom the wolves vote for
+
+A policy is a function of the Table (see simulator.py) and a NumPy Generator
+that decides for every game of the batch at once: night policies return one
+player index per game (-1 when nobody can act), seer_reveal one bool per
+game, and vote policies a (games, players) array with every player's vote.
+Policies only read the table, the simulator applies their decisions.
+
+To try a new heuristic, write a function with the same signature and add it
+to its registry.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# far above any suspicion score, so public evidence always decides a vote
+EVIDENCE_WEIGHT = np.float32(1000.0)
+# how much the voters' own reading of the day spreads their votes around the shared suspicion
+VOTE_SPREAD = np.float32(1.0)
+
+Strategy = namedtuple("Strategy", ["wolf_kill", "doctor_save", "seer_check", "seer_reveal", "town_vote", "wolf_vote"])
+
+
+def pick(candidates, rng, score=None, tiebreak=True):
+    """
+    Picks one candidate per row.
+
+    Args:
+        candidates (np.ndarray): Bool mask, the last axis is the player.
+        rng (np.random.Generator): Breaks ties, or picks uniformly when there is no score.
+        score (np.ndarray): Broadcastable to candidates, the candidate with the highest score is picked.
+        tiebreak (bool): Add noise to break ties, unneeded when the score is already random.
+
+    Returns:
+        np.ndarray: Player index per row, -1 for rows without candidates.
+    """
+    if score is None:
+        score = rng.random(candidates.shape, dtype=np.float32)
+    elif tiebreak:
+        score = score + rng.random(candidates.shape, dtype=np.float32) * np.float32(1e-3)
+    choice = np.where(candidates, score, np.float32(-np.inf)).argmax(axis=-1)
+    return np.where(candidates.any(axis=-1), choice, -1)
+
+
+def _player(table, index):
+    # one-hot mask of a player index per game, all False for -1
+    return (np.arange(table.players) == index[:, None]) & (index[:, None] >= 0)
+
+
+# wolf_kill
+
+def kill_random(table, rng):
+    """A random living villager, seer or doctor."""
+    return pick(table.alive & ~table.is_wolf, rng)
+
+
+def kill_claimed_seer(table, rng):
+    """The seer once they have revealed themselves, else a random non-wolf."""
+    targets = table.alive & ~table.is_wolf
+    score = _player(table, np.where(table.seer_claimed, table.seer, -1))
+    return pick(targets, rng, score)
+
+
+def kill_least_suspicious(table, rng):
+    """The living non-wolf the town trusts most, the player whose word carries the day's votes."""
+    return pick(table.alive & ~table.is_wolf, rng, -table.suspicion)
+
+
+# doctor_save
+
+def save_random(table, rng):
+    """A random living player, the doctor included."""
+    return np.where(table.doctor_alive, pick(table.alive, rng), -1)
+
+
+def save_self(table, rng):
+    """Always the doctor."""
+    return np.where(table.doctor_alive, table.doctor, -1)
+
+
+def save_no_repeat(table, rng):
+    """A random living player other than last night's save."""
+    return np.where(table.doctor_alive, pick(table.alive & ~_player(table, table.last_save), rng), -1)
+
+
+def save_claimed_seer(table, rng):
+    """The seer once they have revealed themselves, else a random living player."""
+    score = _player(table, np.where(table.seer_claimed, table.seer, -1))
+    return np.where(table.doctor_alive, pick(table.alive, rng, score), -1)
+
+
+# seer_check
+
+def _check_candidates(table):
+    return table.alive & (table.seer_known == 0) & ~_player(table, table.seer)
+
+
+def check_random(table, rng):
+    """A random living player the seer hasn't checked yet."""
+    return np.where(table.seer_alive, pick(_check_candidates(table), rng), -1)
+
+
+def check_most_suspicious(table, rng):
+    """The unchecked living player the town suspects most."""
+    return np.where(table.seer_alive, pick(_check_candidates(table), rng, table.suspicion), -1)
+
+
+# seer_reveal
+
+def reveal_never(table, rng):
+    """The seer never speaks up."""
+    return np.zeros(table.games, dtype=bool)
+
+
+def reveal_on_wolf(table, rng):
+    """The seer reveals as soon as they have found a living wolf."""
+    return table.seer_alive & ((table.seer_known == 1) & table.alive).any(axis=1)
+
+
+def reveal_always(table, rng):
+    """The seer publishes every check from the first day on."""
+    return table.seer_alive.copy()
+
+
+# votes
+
+def _voter_candidates(table):
+    # (games, voter, target): living targets other than the voter
+    return table.alive[:, None, :] & ~np.eye(table.players, dtype=bool)
+
+
+def vote_random(table, rng):
+    """Every player votes for a random living player other than themselves."""
+    return pick(_voter_candidates(table), rng)
+
+
+def vote_suspicion(table, rng):
+    """
+    Known wolves first, then the day's suspicion as every voter reads it, cleared players last.
+    """
+    score = table.suspicion + EVIDENCE_WEIGHT * table.public_known
+    score = score[:, None, :] + VOTE_SPREAD * rng.random((table.games, table.players, table.players), dtype=np.float32)
+    return pick(_voter_candidates(table), rng, score, tiebreak=False)
+
+
+def vote_evidence(table, rng):
+    """Known wolves first, otherwise a random player nobody has cleared."""
+    score = (EVIDENCE_WEIGHT * table.public_known)[:, None, :]
+    return pick(_voter_candidates(table), rng, score)
+
+
+def wolf_vote_random(table, rng):
+    """Wolves vote for a random living non-wolf."""
+    candidates = _voter_candidates(table) & ~table.is_wolf[:, None, :]
+    return pick(candidates, rng)
+
+
+def wolf_vote_bandwagon(table, rng):
+    """Wolves all vote for the non-wolf the town suspects most, so their votes land together."""
+    target = pick(table.alive & ~table.is_wolf, rng, table.suspicion)
+    return np.broadcast_to(target[:, None], (table.games, table.players))
+
+
+WOLF_KILLS = {
+    "random": kill_random,
+    "claimed_seer": kill_claimed_seer,
+    "least_suspicious": kill_least_suspicious,
+}
+DOCTOR_SAVES = {
+    "random": save_random,
+    "self": save_self,
+    "no_repeat": save_no_repeat,
+    "claimed_seer": save_claimed_seer,
+}
+SEER_CHECKS = {
+    "random": check_random,
+    "most_suspicious": check_most_suspicious,
+}
+SEER_REVEALS = {
+    "never": reveal_never,
+    "on_wolf": reveal_on_wolf,
+    "always": reveal_always,
+}
+TOWN_VOTES = {
+    "random": vote_random,
+    "suspicion": vote_suspicion,
+    "evidence": vote_evidence,
+}
+WOLF_VOTES = {
+    "random": wolf_vote_random,
+    "bandwagon": wolf_vote_bandwagon,
+}
+
+REGISTRIES = Strategy(WOLF_KILLS, DOCTOR_SAVES, SEER_CHECKS, SEER_REVEALS, TOWN_VOTES, WOLF_VOTES)
+DEFAULT_STRATEGY = Strategy("claimed_seer", "random", "random", "on_wolf", "suspicion", "bandwagon")
+
+
+def strategy(**names):
+    """
+    Looks up a strategy's policies by name.
+
+    Args:
+        **names: Policy name per decision (wolf_kill="random", ...), DEFAULT_STRATEGY for the others.
+
+    Returns:
+        Strategy: The policy functions.
+    """
+    names = DEFAULT_STRATEGY._replace(**names)
+    policies = {}
+    for decision, name in names._asdict().items():
+        registry = getattr(REGISTRIES, decision)
+        if name not in registry:
+            raise ValueError(f"Unknown {decision} policy {name!r}, choose from {', '.join(registry)}")
+        policies[decision] = registry[name]
+    return Strategy(**policies)
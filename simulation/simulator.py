@@ -0,0 +1,300 @@
+"""
+Vectorized Monte Carlo simulator of werewolf games, for tuning heuristics.
+
+A batch of games is played in lockstep with NumPy: every game is one row of
+the Table's arrays (roles, alive mask, the seer's checks, public evidence,
+suspicion), and every night and day step is a handful of array operations on
+all rows at once. Games that are over drop out of the table between rounds.
+
+The rules are the moderator's: at night the wolves pick a victim, the doctor
+protects one player and the seer learns whether one player is a wolf; the
+victim dies unless protected. During the day the seer may publish their
+checks, everyone votes and the player with the most votes (ties broken at
+random) is eliminated and their role revealed. The village wins once every
+wolf is dead, the wolves once they are at least as many as the others.
+
+What the town can't get from rules, reading the discussion, is modelled by a
+shared suspicion score: every day each player's score grows by `tell` if they
+are a wolf, plus standard normal noise. tell=0 means wolves are perfectly
+disguised.
+
+Every decision is made by a policy from policies.py, so strategies can be
+compared on millions of games. Win rates come with Wilson score intervals:
+
+    python -m simulation.simulator --games 1000000
+    python -m simulation.simulator --games 200000 --doctor-save random,self,claimed_seer --seer-reveal never,on_wolf
+"""
+import argparse
+import itertools
+import json
+import math
+import time
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+
+from simulation.policies import DEFAULT_STRATEGY, REGISTRIES, strategy
+
+VILLAGER, WOLF, SEER, DOCTOR = 0, 1, 2, 3
+ONGOING, VILLAGE, WOLVES = 0, 1, 2
+
+DEFAULT_PLAYERS = 8
+DEFAULT_WOLVES = 2
+DEFAULT_TELL = 0.5
+DEFAULT_BATCH_SIZE = 65536
+DEFAULT_CONFIDENCE = 0.95
+
+Results = namedtuple("Results", ["games", "village_wins", "wolf_wins", "rounds", "seconds"])
+
+
+def wilson_interval(wins, games, confidence=DEFAULT_CONFIDENCE):
+    """
+    Wilson score interval of a win rate.
+
+    Returns:
+        tuple: (low, high), (0.0, 1.0) without games.
+    """
+    if games == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    rate = wins / games
+    center = (rate + z * z / (2 * games)) / (1 + z * z / games)
+    half = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+class Table:
+    """
+    A batch of games in progress, one row per game, one column per player.
+
+    Attributes:
+        roles (np.ndarray): int8 role per player (VILLAGER, WOLF, SEER, DOCTOR).
+        is_wolf (np.ndarray): bool, roles == WOLF.
+        alive (np.ndarray): bool.
+        seer, doctor (np.ndarray): The seer's and the doctor's player index per game.
+        seer_known (np.ndarray): int8, what the seer has checked: 1 wolf, -1 not a wolf, 0 unchecked.
+        public_known (np.ndarray): int8, the same for what the whole table knows, from the
+            seer's published checks and the roles revealed by eliminations.
+        seer_claimed (np.ndarray): bool per game, the seer has revealed themselves.
+        suspicion (np.ndarray): float32, the town's accumulated suspicion of every player.
+        tell (float): Daily suspicion added to a wolf, see the module docstring.
+        last_save (np.ndarray): The doctor's previous save per game, -1 before the first night.
+        rounds (np.ndarray): Nights played per game.
+        ids (np.ndarray): Row of every game in the batch it started in.
+    """
+
+    def __init__(self, games, players=DEFAULT_PLAYERS, wolves=DEFAULT_WOLVES, tell=DEFAULT_TELL, rng=None):
+        if players < wolves + 3:
+            raise ValueError(f"{players} players leave no villager next to {wolves} wolves, a seer and a doctor")
+        rng = rng if rng is not None else np.random.default_rng()
+        self.games = games
+        self.players = players
+        deck = np.array([WOLF] * wolves + [SEER, DOCTOR] + [VILLAGER] * (players - wolves - 2), dtype=np.int8)
+        # a random permutation of the deck per game
+        self.roles = deck[np.argsort(rng.random((games, players), dtype=np.float32), axis=1)]
+        self.is_wolf = self.roles == WOLF
+        self.alive = np.ones((games, players), dtype=bool)
+        self.seer = (self.roles == SEER).argmax(axis=1)
+        self.doctor = (self.roles == DOCTOR).argmax(axis=1)
+        self.seer_known = np.zeros((games, players), dtype=np.int8)
+        self.public_known = np.zeros((games, players), dtype=np.int8)
+        self.seer_claimed = np.zeros(games, dtype=bool)
+        self.suspicion = np.zeros((games, players), dtype=np.float32)
+        self.tell = np.float32(tell)
+        self.last_save = np.full(games, -1)
+        self.rounds = np.zeros(games, dtype=np.int16)
+        self.ids = np.arange(games)
+
+    @property
+    def seer_alive(self):
+        return self.alive[np.arange(self.games), self.seer]
+
+    @property
+    def doctor_alive(self):
+        return self.alive[np.arange(self.games), self.doctor]
+
+    def winner(self):
+        """VILLAGE, WOLVES or ONGOING per game."""
+        wolves = (self.alive & self.is_wolf).sum(axis=1)
+        others = self.alive.sum(axis=1) - wolves
+        return np.where(wolves == 0, VILLAGE, np.where(wolves >= others, WOLVES, ONGOING))
+
+    def keep(self, rows):
+        """Drops every game but the given rows (a bool mask or indices)."""
+        for name in ("roles", "is_wolf", "alive", "seer", "doctor", "seer_known", "public_known",
+                     "seer_claimed", "suspicion", "last_save", "rounds", "ids"):
+            setattr(self, name, getattr(self, name)[rows])
+        self.games = len(self.ids)
+
+
+def _eliminate(table, target):
+    # kills target[g] in every game where it isn't -1
+    rows = np.flatnonzero(target >= 0)
+    table.alive[rows, target[rows]] = False
+    return rows
+
+
+def _night(table, policies, rng):
+    victim = policies.wolf_kill(table, rng)
+    save = policies.doctor_save(table, rng)
+    check = policies.seer_check(table, rng)
+
+    rows = np.flatnonzero(check >= 0)
+    table.seer_known[rows, check[rows]] = np.where(table.is_wolf[rows, check[rows]], 1, -1)
+    table.last_save = np.where(save >= 0, save, table.last_save)
+    _eliminate(table, np.where(victim == save, -1, victim))
+    table.rounds += 1
+
+
+def _day(table, policies, rng):
+    table.suspicion += table.tell * table.is_wolf + rng.standard_normal(table.suspicion.shape, dtype=np.float32)
+
+    reveal = policies.seer_reveal(table, rng)
+    if reveal.any():
+        rows = np.flatnonzero(reveal)
+        known = table.seer_known[rows]
+        table.public_known[rows] = np.where(known != 0, known, table.public_known[rows])
+        table.public_known[rows, table.seer[rows]] = -1
+        table.seer_claimed |= reveal
+
+    votes = np.where(table.is_wolf, policies.wolf_vote(table, rng), policies.town_vote(table, rng))
+    votes = np.where(table.alive, votes, -1)
+    # tally every game at once: one bincount over (game, target) cells
+    cast = votes >= 0
+    cells = (np.arange(table.games)[:, None] * table.players + votes)[cast]
+    counts = np.bincount(cells, minlength=table.games * table.players).reshape(table.games, table.players)
+    # the noise is below one vote, so it only breaks ties
+    lynched = (counts + rng.random(counts.shape, dtype=np.float32) * np.float32(0.5)).argmax(axis=1)
+    lynched = np.where(counts.max(axis=1) > 0, lynched, -1)
+    rows = _eliminate(table, lynched)
+    table.public_known[rows, lynched[rows]] = np.where(table.is_wolf[rows, lynched[rows]], 1, -1)
+
+
+def play(games, policies, players=DEFAULT_PLAYERS, wolves=DEFAULT_WOLVES, tell=DEFAULT_TELL, rng=None):
+    """
+    Plays a batch of games to the end.
+
+    Args:
+        games (int): Games in the batch.
+        policies (Strategy): Policy functions, see policies.strategy.
+        players (int): Players per game.
+        wolves (int): Wolves per game.
+        tell (float): How much more suspicious a wolf looks each day, see the module docstring.
+        rng (np.random.Generator): Source of all randomness.
+
+    Returns:
+        tuple: (winner, rounds) arrays, one entry per game.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    table = Table(games, players, wolves, tell, rng)
+    winner = np.zeros(games, dtype=np.int8)
+    rounds = np.zeros(games, dtype=np.int16)
+
+    # every day eliminates a player, so no game outlasts its player count
+    for _ in range(players):
+        for step in (_night, _day):
+            step(table, policies, rng)
+            result = table.winner()
+            over = result != ONGOING
+            if over.any():
+                winner[table.ids[over]] = result[over]
+                rounds[table.ids[over]] = table.rounds[over]
+                table.keep(~over)
+            if table.games == 0:
+                return winner, rounds
+    return winner, rounds
+
+
+def simulate(games, policies=None, players=DEFAULT_PLAYERS, wolves=DEFAULT_WOLVES, tell=DEFAULT_TELL,
+             batch_size=DEFAULT_BATCH_SIZE, seed=None):
+    """
+    Plays many games in batches and counts the wins.
+
+    Args:
+        games (int): Number of games.
+        policies (Strategy): Policy functions, DEFAULT_STRATEGY's by default.
+        batch_size (int): Games played in lockstep, bounds the memory used.
+        seed (int): Seed, the same seed and arguments give the same results.
+        players, wolves, tell: See play.
+
+    Returns:
+        Results: Games, wins per team, total rounds and the seconds it took.
+    """
+    policies = policies if policies is not None else strategy()
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    village_wins = wolf_wins = total_rounds = 0
+    for start in range(0, games, batch_size):
+        winner, rounds = play(min(batch_size, games - start), policies, players, wolves, tell, rng)
+        village_wins += int((winner == VILLAGE).sum())
+        wolf_wins += int((winner == WOLVES).sum())
+        total_rounds += int(rounds.sum())
+    return Results(games, village_wins, wolf_wins, total_rounds, time.perf_counter() - started)
+
+
+def summary(results, confidence=DEFAULT_CONFIDENCE):
+    """Win rates, their intervals, mean rounds and throughput of some Results as a dict."""
+    village_low, village_high = wilson_interval(results.village_wins, results.games, confidence)
+    wolf_low, wolf_high = wilson_interval(results.wolf_wins, results.games, confidence)
+    return {
+        "games": results.games,
+        "village_win_rate": results.village_wins / results.games if results.games else None,
+        "village_interval": [village_low, village_high],
+        "wolf_win_rate": results.wolf_wins / results.games if results.games else None,
+        "wolf_interval": [wolf_low, wolf_high],
+        "mean_rounds": results.rounds / results.games if results.games else None,
+        "games_per_second": results.games / results.seconds if results.seconds else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo win rates of werewolf strategies")
+    parser.add_argument("--games", type=int, default=1_000_000, help="Games per strategy")
+    parser.add_argument("--players", type=int, default=DEFAULT_PLAYERS)
+    parser.add_argument("--wolves", type=int, default=DEFAULT_WOLVES)
+    parser.add_argument("--tell", type=float, default=DEFAULT_TELL,
+                        help="Extra daily suspicion of a wolf, in standard deviations of the noise")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    for decision, default in DEFAULT_STRATEGY._asdict().items():
+        parser.add_argument(
+            f"--{decision.replace('_', '-')}", default=default,
+            help=f"Comma separated {decision} policies, every combination is played "
+                 f"({', '.join(getattr(REGISTRIES, decision))}, default: {default})",
+        )
+    args = parser.parse_args(argv)
+
+    choices = {decision: getattr(args, decision).split(",") for decision in DEFAULT_STRATEGY._fields}
+    rows = []
+    for combination in itertools.product(*choices.values()):
+        names = dict(zip(choices, combination))
+        try:
+            results = simulate(args.games, strategy(**names), args.players, args.wolves, args.tell,
+                               args.batch_size, args.seed)
+        except ValueError as e:
+            parser.error(str(e))
+        rows.append({"strategy": names, **summary(results, args.confidence)})
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    varied = [decision for decision, names in choices.items() if len(names) > 1]
+    fixed = ", ".join(f"{decision}={names[0]}" for decision, names in choices.items() if len(names) == 1)
+    print(f"{args.players} players, {args.wolves} wolves, tell {args.tell}, {args.games} games per strategy")
+    print(fixed)
+    widths = {decision: max(map(len, [decision] + choices[decision])) + 2 for decision in varied}
+    print("".join(f"{decision:<{widths[decision]}}" for decision in varied)
+          + f"{'village':>9}{'interval':>18}{'rounds':>8}{'games/s':>11}")
+    for row in sorted(rows, key=lambda row: -row["village_win_rate"]):
+        low, high = row["village_interval"]
+        print("".join(f"{row['strategy'][decision]:<{widths[decision]}}" for decision in varied)
+              + f"{row['village_win_rate']:>9.2%}{f'[{low:.2%}, {high:.2%}]':>18}"
+              + f"{row['mean_rounds']:>8.2f}{row['games_per_second']:>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
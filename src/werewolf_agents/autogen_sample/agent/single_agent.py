@@ -6,8 +6,6 @@ import os
 import asyncio
 import logging
 
-from openai import RateLimitError
-import openai
 from sentient_campaign.agents.v1.api import IReactiveAgent
 from sentient_campaign.agents.v1.message import (
     ActivityMessage,
@@ -17,14 +15,11 @@ from sentient_campaign.agents.v1.message import (
     ActivityMessageHeader,
     MessageChannelType,
 )
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    retry_if_exception_type,
-    wait_exponential,
-)
 import random
 
+from agent.instrumentation import Instrumentation, instrumented
+from agent.rate_limiter import RESPOND, shared_rate_limiter
+
 # Configure logging
 logger = logging.getLogger("demo_agent")
 level = logging.DEBUG
@@ -93,7 +88,8 @@ class WerewolfAgent(IReactiveAgent):
                     "model": model_name,
                     "api_key": api_key,
                     "base_url": base_url,
-                    "max_retries": 3,
+                    # retries are scheduled by the shared rate limiter, see get_response_from_agent
+                    "max_retries": 0,
                     "timeout": 30,
                 }
             ]
@@ -106,6 +102,10 @@ class WerewolfAgent(IReactiveAgent):
             ),
             llm_config=llm_config,
         )
+        self.rate_limiter = shared_rate_limiter(base_url, api_key, self.config or {})
+        # per-message latency records, see agent/instrumentation.py
+        self.instrumentation = Instrumentation.from_config(name, type(self).__name__, self.config)
+        self.model_name = model_name
         self.listener_pipe = asyncio.Queue()
         self.game_agent = SentientAgent(listener_pipe=self.listener_pipe)
         logger.info(
@@ -130,37 +130,46 @@ class WerewolfAgent(IReactiveAgent):
             full_message = f"dirrect message from {sender}: {text_message}"
         return full_message
 
+    @instrumented("notify")
     async def async_notify(self, message: ActivityMessage):
         logger.info(f"async_notify called with message: {message}")
 
-        await asyncio.sleep(2)
+        with self.instrumentation.span("sleep", "sleep", seconds=2):
+            await asyncio.sleep(2)
 
         full_message = self.get_full_message(message)
 
-        await self.conversable_agent.a_receive(
-            full_message, self.game_agent, request_reply=False, silent=True
-        )
+        with self.instrumentation.span("a_receive", "state"):
+            await self.conversable_agent.a_receive(
+                full_message, self.game_agent, request_reply=False, silent=True
+            )
         logger.info(f"Message sent to conversable_agent: {full_message}")
 
+    @instrumented("respond")
     async def async_respond(self, message: ActivityMessage):
         logger.info(f"async_respond called with message: {message}")
-        await asyncio.sleep(1)
+        with self.instrumentation.span("sleep", "sleep", seconds=1):
+            await asyncio.sleep(1)
         full_message = self.get_full_message(message)
         await self.get_response_from_agent(full_message)
-        response: str = await self.listener_pipe.get()
+        with self.instrumentation.span("listener_pipe.get", "queue"):
+            response: str = await self.listener_pipe.get()
         logger.info(f"Response received from listener_pipe: {response}")
         return ActivityResponse(
             response=TextContent(text=response), response_type=MimeType.TEXT_PLAIN
         )
 
-    @retry(
-        wait=wait_exponential(multiplier=1, min=20, max=300),
-        stop=stop_after_attempt(5),
-        retry=retry_if_exception_type(RateLimitError),
-    )
     async def get_response_from_agent(self, text_message):
         logger.info(f"get_response_from_agent called with text_message: {text_message}")
-        await self.conversable_agent.a_receive(
-            text_message, self.game_agent, request_reply=True, silent=True
-        )
+        # autogen makes the LLM call inside a_receive, so the whole reply waits for a token and is retried on a 429
+        # autogen doesn't hand back the token usage, only time, queue wait and retries are recorded
+        with self.instrumentation.llm_call(self.model_name, "respond") as call:
+            await self.rate_limiter.call(
+                self._name,
+                lambda: self.conversable_agent.a_receive(
+                    text_message, self.game_agent, request_reply=True, silent=True
+                ),
+                RESPOND,
+                stats=call,
+            )
         logger.info("Message sent to conversable_agent for response.")
\ No newline at end of file
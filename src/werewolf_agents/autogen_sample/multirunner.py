@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import time
 import argparse
@@ -6,83 +7,105 @@ from dotenv import load_dotenv
 from pathlib import Path
 load_dotenv()
 
-from sentient_campaign.activity_runner.runner import WerewolfCampaignActivityRunner, PlayerAgentConfig
+# the shared batch tools live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from batch.build_cache import BuildCache
+from batch.executor import default_workers, run_games
+from batch.results_store import ResultsStore
+from transcript.archive import ARCHIVE_FILE, pack_transcripts
 
-def run_multiple_games(num_games: int, port: int = 8008, results_dir: str = "game_results"):
+AGENT_DIR = Path(__file__).resolve().parent
+
+def run_multiple_games(num_games: int, port: int = 8008, results_dir: str = "game_results", workers: int = None, resume: str = None,
+                       archive_transcripts: bool = True):
     # Create results directory if it doesn't exist
     Path(results_dir).mkdir(parents=True, exist_ok=True)
     
-    # Create a timestamp-based run ID for this batch of games
-    batch_id = int(time.time())
-    batch_dir = os.path.join(results_dir, f"batch_{batch_id}")
-    Path(batch_dir).mkdir(parents=True, exist_ok=True)
-    
-    # Ensure transcripts directory exists
-    Path("transcripts").mkdir(parents=True, exist_ok=True)
+    if resume:
+        # continue a batch that was interrupted, only its missing or failed games are run
+        store = ResultsStore.open(resume)
+        batch_dir = str(store.batch_dir)
+        print(f"Resuming batch {store.batch_id}: {store.successful_games} of {store.total_games} games already done")
+    else:
+        # Create a timestamp-based run ID for this batch of games
+        batch_id = int(time.time())
+        batch_dir = os.path.join(results_dir, f"batch_{batch_id}")
+        # every result is appended to results.jsonl in the batch directory as soon as its game ends
+        store = ResultsStore(batch_dir, batch_id, num_games)
     
-    # Store all game results
-    all_results = []
+    # the batch's own transcript folder, so packing it never sweeps up another run's transcripts
+    transcript_dir = os.path.join(batch_dir, "transcripts")
+    Path(transcript_dir).mkdir(parents=True, exist_ok=True)
     
-    for game_num in range(num_games):
-        print(f"\nStarting game {game_num + 1} of {num_games}")
-        
-        # Initialize runner with the specified port
-        try:
-            runner = WerewolfCampaignActivityRunner(com_server_port=port)
-            agent_config = PlayerAgentConfig(
-                player_name="James",  # select a name for your agent
-                agent_wheel_path="/Users/btsfinch/final-werewolf-template/werewolf-template/src/werewolf_agents/autogen_sample/dist/james-0.0.1-py3-none-any.whl",  # update wheel file path
-                module_path="agent/single_agent.py",
-                agent_class_name="WerewolfAgent", # update agent class name if you changed it
-                agent_config_file_path="config.yaml"
-            )
-            players_sentient_llm_api_keys = [os.getenv("MY_UNIQUE_API_KEY")] #here you can add you api key directly into this list "sk-yourapikey" replacing os.getenv("MY_UNIQUE_API_KEY")
+    # the wheel and image are only rebuilt when agent/, pyproject.toml or config.yaml change
+    build_cache = BuildCache()
 
-            # Run the game - transcripts will go to the transcripts directory
-            game_results = runner.run_locally(
-                agent_config,
-                players_sentient_llm_api_keys,
-                path_to_final_transcript_dump="transcripts",
-                force_rebuild_agent_image=True # necessary if you have rebuilt, must turn false if you want to run simultaneously in several terminals
-            )
-            
-            # Save game results in the game_results directory
-            results_file = os.path.join(batch_dir, f"game_{game_num + 1}_results_{game_results['activity_id']}.json")
-            with open(results_file, 'w') as f:
-                json.dump(game_results, f, indent=2)
-            
-            print(f"Game {game_num + 1} results saved to: {results_file}")
-            print(f"Game {game_num + 1} running on port: {port}")
-            
-            # Add to collection of all results
-            all_results.append(game_results)
-            
-        except Exception as e:
-            print(f"Error in game {game_num + 1}: {str(e)}")
-            error_info = {
-                "game_number": game_num + 1,
-                "error": str(e),
-                "status": "failed",
-                "port": port
-            }
-            all_results.append(error_info)
-    
-    # Save summary of all games in the batch directory
-    summary_file = os.path.join(batch_dir, f"batch_{batch_id}_summary.json")
-    summary = {
-        "batch_id": batch_id,
-        "total_games": num_games,
-        "successful_games": sum(1 for r in all_results if "error" not in r),
-        "failed_games": sum(1 for r in all_results if "error" in r),
-        "port_used": port,
-        "all_games_results": all_results
-    }
+    agent_config = dict(
+        player_name="James",  # select a name for your agent
+        agent_wheel_path=build_cache.ensure_wheel(AGENT_DIR),
+        module_path="agent/single_agent.py",
+        agent_class_name="WerewolfAgent", # update agent class name if you changed it
+        agent_config_file_path="config.yaml"
+    )
+    players_sentient_llm_api_keys = [os.getenv("MY_UNIQUE_API_KEY")] #here you can add you api key directly into this list "sk-yourapikey" replacing os.getenv("MY_UNIQUE_API_KEY")
+
+    missing_games = store.missing_games()
+    rebuild = build_cache.claim_image(AGENT_DIR) if missing_games else False
+    print(f"Agent image: {'rebuilding' if rebuild else 'reusing the cached build'}")
+
+    # every game gets its own port, the image is built once before the games fan out
+    games = [
+        {
+            "game_number": game_num,
+            "agents": [agent_config],
+            "api_keys": players_sentient_llm_api_keys,
+            "transcript_dir": transcript_dir,
+            "force_rebuild_agent_image": rebuild, # the executor only rebuilds for the first game
+            # the agent's latency and token records and their histograms, see batch/metrics.py
+            "metrics_dir": os.path.join(batch_dir, "metrics", f"game_{game_num}"),
+        }
+        for game_num in missing_games
+    ]
+    workers = workers or default_workers()
+    store.metadata["workers"] = workers
+    # lets batch/results_db.py attribute the games to this agent
+    store.metadata["agents"] = {agent_config["player_name"]: AGENT_DIR.name}
+    print(f"\nStarting {len(games)} games, {min(workers, max(len(games), 1))} at a time")
+
+    def on_rebuilt(game):
+        build_cache.image_built(AGENT_DIR, ok="error" not in game)
+
+    # results arrive as games finish, not in game order
+    for game in run_games(games, workers, start_port=port, on_rebuilt=on_rebuilt):
+        game_num = game["game_number"]
+        store.append(game)
+
+        if "error" in game:
+            print(f"Error in game {game_num}: {game['error']}")
+            continue
+
+        game_results = game["results"]
+
+        # Save game results in the game_results directory
+        results_file = os.path.join(batch_dir, f"game_{game_num}_results_{game_results['activity_id']}.json")
+        with open(results_file, 'w') as f:
+            json.dump(game_results, f, indent=2)
+        
+        print(f"Game {game_num} results saved to: {results_file}")
+        print(f"Game {game_num} ran on port: {game['port']}")
     
-    with open(summary_file, 'w') as f:
-        json.dump(summary, f, indent=2)
+    # the summary has been kept up to date as games finished, this writes the final version
+    store.metadata["build_cache"] = build_cache.stats(AGENT_DIR)
+    store.close()
+
+    if archive_transcripts:
+        # one compressed archive per batch instead of a file per player and game, see transcript/archive.py
+        archive_path = Path(batch_dir) / ARCHIVE_FILE
+        packed = pack_transcripts(transcript_dir, archive_path)
+        print(f"\nTranscripts of {len(packed)} games packed into: {archive_path}")
     
-    print(f"\nBatch summary saved to: {summary_file}")
-    return summary
+    print(f"\nBatch results saved to: {store.results_path}")
+    return store.summary
 
 if __name__ == "__main__":
     # Set up command line argument parsing
@@ -90,16 +113,28 @@ if __name__ == "__main__":
     parser.add_argument('--games', type=int, default=3,
                       help='Number of games to run (default: 3)')
     parser.add_argument('--port', type=int, default=8008,
-                      help='Port number for the communication server (default: 8008)')
+                      help='First port to try for the communication servers, busy ports are skipped (default: 8008)')
+    parser.add_argument('--workers', type=int, default=None,
+                      help='Games to run at once (default: bounded by CPU count, memory and --api-rpm)')
+    parser.add_argument('--memory-per-game', type=float, default=2.0,
+                      help='GB of memory one game needs, used for the default --workers (default: 2.0)')
+    parser.add_argument('--api-rpm', type=int, default=None,
+                      help='Requests per minute allowed by your API key, used for the default --workers')
+    parser.add_argument('--resume', type=str, default=None,
+                      help='Batch directory of an interrupted run, e.g. game_results/batch_1730000000, to run only its missing games')
+    parser.add_argument('--keep-transcripts', action='store_true',
+                      help="Leave the transcripts as loose files instead of packing them into the batch's archive")
     
     args = parser.parse_args()
+    workers = args.workers or default_workers(args.memory_per_game, args.api_rpm)
     
     # Run the games with specified parameters
-    summary = run_multiple_games(args.games, args.port)
+    summary = run_multiple_games(args.games, args.port, workers=workers, resume=args.resume,
+                                 archive_transcripts=not args.keep_transcripts)
     
     # Print final summary
     print("\nFinal Summary:")
     print(f"Total games run: {summary['total_games']}")
     print(f"Successful games: {summary['successful_games']}")
     print(f"Failed games: {summary['failed_games']}")
-    print(f"Port used: {summary['port_used']}") 
+    print(f"Batch id: {summary['batch_id']}") 
@@ -0,0 +1,199 @@
+"""
+Token-budgeted message history for the agents' prompts.
+
+ContextWindow keeps every message the agent has seen but only sends what fits
+a token budget: pinned messages (the system prompt, the role assignment) are
+always sent, then the messages of the one request (a state summary, the
+prompt), shortened from the front of the first ones when they alone are over
+budget. The history gets the rest: the most recent turns verbatim, as many of
+them as fit, then older turns newest first while they fit. Turns that don't
+fit are folded into one compact "earlier messages" block, truncated per line,
+or dropped once even that is over budget. Token counts are estimated once per
+message and cached.
+"""
+import math
+
+DEFAULT_MAX_TOKENS = 8000
+DEFAULT_KEEP_RECENT = 10
+DEFAULT_COMPACT_CHARS = 160
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+# put in front of a message whose start was cut to fit the budget
+TRUNCATED_MARK = "..."
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate, roughly 4 characters per token for English text.
+
+    Args:
+        text (str): Message content.
+
+    Returns:
+        int: Estimated token count including per-message overhead.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextWindow:
+    """
+    Message history that builds prompts within a token budget.
+
+    Args:
+        system_prompt (str): Pinned first message, sent with every request.
+        max_tokens (int): Token budget for one request.
+        keep_recent (int): Number of latest turns sent verbatim ahead of older ones, fewer when
+            the budget can't hold them.
+        compact_chars (int): Characters kept per turn in the compacted block.
+    """
+
+    def __init__(self, system_prompt=None, max_tokens=DEFAULT_MAX_TOKENS,
+                 keep_recent=DEFAULT_KEEP_RECENT, compact_chars=DEFAULT_COMPACT_CHARS):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.compact_chars = compact_chars
+        # (message, estimated tokens) pairs, estimates are computed once on insert
+        self._pinned = []
+        self._turns = []
+        if system_prompt is not None:
+            self.pin({"role": "system", "content": system_prompt})
+
+    @classmethod
+    def from_config(cls, system_prompt, config):
+        """Builds a window using the context_* settings of the agent's config.yaml."""
+        return cls(
+            system_prompt,
+            max_tokens=config.get("context_max_tokens", DEFAULT_MAX_TOKENS),
+            keep_recent=config.get("context_keep_recent", DEFAULT_KEEP_RECENT),
+            compact_chars=config.get("context_compact_chars", DEFAULT_COMPACT_CHARS),
+        )
+
+    def pin(self, message):
+        """Adds a message that is sent with every request, e.g. the role assignment."""
+        message = self._as_message(message)
+        self._pinned.append((message, estimate_tokens(message["content"])))
+
+    def append(self, message):
+        """
+        Adds a turn to the history.
+
+        Args:
+            message (dict | str): A chat message, or text to add as a user message.
+        """
+        message = self._as_message(message)
+        self._turns.append((message, estimate_tokens(message["content"])))
+
+    def __len__(self):
+        return len(self._turns)
+
+    @property
+    def messages(self):
+        """Every pinned message and turn, without applying the budget."""
+        return [message for message, _ in self._pinned + self._turns]
+
+    def pop_turns(self):
+        """
+        Removes every turn from the history, pinned messages stay.
+
+        Returns:
+            list: The removed messages, oldest first.
+        """
+        turns = [message for message, _ in self._turns]
+        self._turns = []
+        return turns
+
+    def build(self, extra=(), prefix=(), max_tokens=None):
+        """
+        Selects the messages for one request.
+
+        The estimated tokens of the result stay within the budget unless the pinned messages
+        alone exceed it. What doesn't fit gives way in this order: older turns (compacted,
+        then dropped), the recent turns from the oldest one, then the start of prefix and
+        extra, first message first. Pinned messages are always sent in full.
+
+        Args:
+            extra (Iterable[dict]): Messages for this request only, sent after the history
+                (e.g. the current state summary). They count against the budget.
+            prefix (Iterable[dict]): Messages for this request only, sent between the pinned
+                messages and the history (e.g. summaries of earlier phases).
+            max_tokens (int): Overrides the configured budget.
+
+        Returns:
+            list: Chat messages, pinned first, then prefix, history oldest to newest, then extra.
+        """
+        budget = max_tokens or self.max_tokens
+        extra = [(message, estimate_tokens(message["content"])) for message in map(self._as_message, extra)]
+        prefix = [(message, estimate_tokens(message["content"])) for message in map(self._as_message, prefix)]
+        budget -= sum(tokens for _, tokens in self._pinned)
+        over = sum(tokens for _, tokens in prefix + extra) - max(budget, 0)
+        prefix, over = self._cut_head(prefix, over)
+        extra, _ = self._cut_head(extra, over)
+        budget -= sum(tokens for _, tokens in prefix + extra)
+
+        # recent turns, newest first, while they fit
+        recent_start = max(len(self._turns) - self.keep_recent, 0)
+        index = len(self._turns)
+        selected = []
+        while index > recent_start and self._turns[index - 1][1] <= budget:
+            index -= 1
+            selected.append(self._turns[index][0])
+            budget -= self._turns[index][1]
+
+        # older turns, newest first, while they fit verbatim, once every recent turn did
+        while index == recent_start and index > 0 and self._turns[index - 1][1] <= budget:
+            recent_start = index = index - 1
+            selected.append(self._turns[index][0])
+            budget -= self._turns[index][1]
+        selected.reverse()
+
+        if index > 0:
+            compacted = self._compact(self._turns[:index], budget)
+            if compacted is not None:
+                selected.insert(0, compacted)
+
+        return [message for message, _ in self._pinned + prefix] + selected + [message for message, _ in extra]
+
+    @staticmethod
+    def _cut_head(messages, over):
+        # shortens the messages from the start of the first one until over tokens are saved,
+        # returns the (message, tokens) pairs left and the tokens still over
+        kept = []
+        for message, tokens in messages:
+            if over <= 0:
+                kept.append((message, tokens))
+                continue
+            chars = (tokens - over - MESSAGE_OVERHEAD_TOKENS) * CHARS_PER_TOKEN - len(TRUNCATED_MARK)
+            if chars <= 0:
+                # nothing useful left of it
+                over -= tokens
+                continue
+            message = {**message, "content": TRUNCATED_MARK + message["content"][-chars:]}
+            shortened = estimate_tokens(message["content"])
+            over -= tokens - shortened
+            kept.append((message, shortened))
+        return kept, over
+
+    def _compact(self, turns, budget):
+        # keep the newest evicted turns that fit, one truncated line each
+        header = "Earlier messages (shortened):"
+        budget -= estimate_tokens(header)
+        lines = []
+        for message, _ in reversed(turns):
+            line = message["content"].replace("\n", " ")
+            if len(line) > self.compact_chars:
+                line = line[:self.compact_chars] + "..."
+            cost = math.ceil((len(line) + 1) / CHARS_PER_TOKEN)
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+        if not lines:
+            return None
+        lines.reverse()
+        return {"role": "system", "content": "\n".join([header] + lines)}
+
+    @staticmethod
+    def _as_message(message):
+        if isinstance(message, str):
+            return {"role": "user", "content": message}
+        return message
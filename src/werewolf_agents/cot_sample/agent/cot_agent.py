@@ -3,11 +3,10 @@ from autogen import ConversableAgent, Agent, runtime_logging
 
 import os,json,re
 import asyncio
+import time
 import logging
 from collections import defaultdict
 
-import openai
-from openai import RateLimitError, OpenAI
 from sentient_campaign.agents.v1.api import IReactiveAgent
 from sentient_campaign.agents.v1.message import (
     ActivityMessage,
@@ -17,16 +16,21 @@ from sentient_campaign.agents.v1.message import (
     ActivityMessageHeader,
     MessageChannelType,
 )
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    retry_if_exception_type,
-    wait_exponential,
-)
+
+from agent.context_window import ContextWindow
+from agent.history_summarizer import PhaseSummarizer
+from agent.instrumentation import Instrumentation, instrumented, traced
+from agent.llm_client import AsyncLLMClient, NotifyQueue
+from agent.moderator_templates import ModeratorTemplateMatcher
+from agent.player_names import PlayerNames, extract_names
+from agent.rate_limiter import NOTIFY
+
 GAME_CHANNEL = "play-arena"
 WOLFS_CHANNEL = "wolf's-den"
 MODERATOR_NAME = "moderator"
 MODEL_NAME = "Llama31-70B-Instruct"
+# moderator prompts answered with a player's name
+CHOICE_PHASES = ("seer_guess", "doctor_save", "wolf_vote", "day_vote")
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -42,6 +46,16 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# compiled once per process, shared by every agent instance
+MODERATOR_TEMPLATES = ModeratorTemplateMatcher()
+
+
+def moderator_phase(text):
+    # message type of a moderator message for the instrumentation, e.g. "day_vote" or "announcement"
+    classified = MODERATOR_TEMPLATES.classify(text)
+    return classified.phase if classified is not None else None
+
+
 class CoTAgent(IReactiveAgent):
     # input -> thoughts -> init action -> reflection -> final action
 
@@ -69,6 +83,30 @@ class CoTAgent(IReactiveAgent):
     3. Vary your protection pattern to avoid being predictable.
     4. Participate in discussions without revealing your role."""
 
+    # how to phrase an action, {action_type} is filled in per call
+    ACTION_INSTRUCTIONS = "Respond with only the {action_type} and no other sentences/thoughts. If it is a dialogue response, you can provide the full response that adds to the discussions so far. For all other cases a single sentence response is expected. If you are in the wolf-group channel, the sentence must contain the name of a person you wish to eliminate, and feel free to change your mind so that there is consensus. If you are in the game-room channel, the sentence must contain your response or vote, and it must be a vote to eliminate someone if the game moderator has recently messaged you asking for a vote, and also feel free to justify your vote, and later change your mind when the final vote count happens. You can justify any change of mind too. If the moderator for the reason behind the vote, you must provide the reason in the response."
+
+    FINAL_VOTE_INSTRUCTIONS = "If the moderator asked for the vote, you must mention at least one name to eliminate. If the moderator asked for a final vote, you must answer in a single sentence the name of the person you are voting to eliminate even if you are not sure."
+
+    # moderator phase (see moderator_templates.PHASES) -> handler
+    PHASE_HANDLERS = {
+        "seer_guess": "_get_response_for_seer_guess",
+        "doctor_save": "_get_response_for_doctors_save",
+        "wolf_vote": "_get_response_for_wolf_channel_to_kill_villagers",
+        "day_discussion": "_get_discussion_message_or_vote_response_for_common_room",
+        "day_vote": "_get_vote_response_for_common_room",
+    }
+
+    # response pipeline depth per action: "fused" (one structured call), "two_stage" (thoughts, action) or "full" (thoughts, action, reflection, final action).
+    # "day" is the discussion, "day_vote" the answer to the moderator's call for a vote. config.yaml's pipeline_depths overrides these
+    DEFAULT_PIPELINE_DEPTHS = {
+        "seer": "full",
+        "doctor": "full",
+        "day": "full",
+        "day_vote": "full",
+        "wolf": "full",
+    }
+
     def __init__(self):
         logger.debug("WerewolfAgent initialized.")
         
@@ -87,30 +125,66 @@ class CoTAgent(IReactiveAgent):
         self.direct_messages = defaultdict(list)
         self.group_channel_messages = defaultdict(list)
         self.seer_checks = {}  # To store the seer's checks and results
-        self.game_history = []  # To store the interwoven game history
+        # the roster and who is still alive, to name choices the way the moderator lists the players
+        self.player_names = PlayerNames(extract_names(description))
+        # To store the interwoven game history of the current phase, trimmed to a token budget when it is put in a prompt
+        self.game_history = ContextWindow.from_config(None, self.config or {})
+        # finished phases are only kept as summaries, see _summarize_game_history
+        self.history_summarizer = PhaseSummarizer(
+            MODERATOR_NAME,
+            max_phase_summaries=(self.config or {}).get("max_phase_summaries", 6),
+            max_summary_chars=(self.config or {}).get("max_summary_chars", 1500),
+        )
+        self.summary_model = (self.config or {}).get("summary_model")
+        self.phase_label = "Game start"
+        self.night_count = 0
 
         self.llm_config = self.sentient_llm_config["config_list"][0]
-        self.openai_client = OpenAI(
-            api_key=self.llm_config["api_key"],
-            base_url=self.llm_config["llm_base_url"],
-        )
+        # per-message latency and token records, see agent/instrumentation.py
+        self.instrumentation = Instrumentation.from_config(self._name, type(self).__name__, self.config, classify=moderator_phase)
+        self.llm = AsyncLLMClient.from_config(self.llm_config, self.config or {}, name=self._name, instrumentation=self.instrumentation)
+        # role detection runs in the background so async_notify returns immediately
+        self.notify_queue = NotifyQueue((self.config or {}).get("notify_concurrency", 4))
 
         self.model = self.llm_config["llm_model_name"]
+
+        # per-action pipeline depth and the time budget for one response (the moderator waits at most 60s)
+        self.pipeline_depths = {**self.DEFAULT_PIPELINE_DEPTHS, **(self.config or {}).get("pipeline_depths", {})}
+        self.response_budget = (self.config or {}).get("response_budget_seconds", 45)
+        self.min_stage_latency = (self.config or {}).get("min_stage_latency_seconds", 5)
+        self.response_deadline = None
+        self.stage_latencies = defaultdict(list)  # stage name -> seconds per call
         logger.info(
             f"WerewolfAgent initialized with name: {name}, description: {description}, and config: {config}"
         )
         self.game_intro = None
 
+    @instrumented("notify")
     async def async_notify(self, message: ActivityMessage):
         logger.info(f"ASYNC NOTIFY called with message: {message}")
+        if message.header.sender == self._name:
+            # our own responses come back as notifications, async_respond already recorded them
+            return
+        if message.header.sender == self.MODERATOR_NAME:
+            match = MODERATOR_TEMPLATES.match(message.content.text)
+            self._track_players(match)
+            self._close_phase_if_needed(match)
         if message.header.channel_type == MessageChannelType.DIRECT:
             user_messages = self.direct_messages.get(message.header.sender, [])
             user_messages.append(message.content.text)
             self.direct_messages[message.header.sender] = user_messages
-            self.game_history.append(f"[From - {message.header.sender}| To - {self._name} (me)| Direct Message]: {message.content.text}")
+            event = f"[From - {message.header.sender}| To - {self._name} (me)| Direct Message]: {message.content.text}"
             if not len(user_messages) > 1 and message.header.sender == self.MODERATOR_NAME:
-                self.role = self.find_my_role(message)
-                logger.info(f"Role found for user {self._name}: {self.role}")
+                # the role assignment is kept in every prompt whatever the history budget
+                self.game_history.pin(event)
+                role = self._find_my_role_locally(message.content.text)
+                if role is not None:
+                    self._set_role(role)
+                else:
+                    # the message doesn't match the role template, fall back to asking the LLM
+                    self.notify_queue.submit(self.find_my_role(message), self._set_role)
+            else:
+                self.game_history.append(event)
         else:
             group_messages = self.group_channel_messages.get(message.header.channel, [])
             group_messages.append((message.header.sender, message.content.text))
@@ -121,21 +195,19 @@ class CoTAgent(IReactiveAgent):
                 self.game_intro = message.content.text
         logger.info(f"message stored in messages {message}")
 
+    @traced("prompt")
     def get_interwoven_history(self, include_wolf_channel=False):
+        summaries = self.history_summarizer.render()
+        prefix = [{"role": "system", "content": summaries}] if summaries else []
         return "\n".join([
-            event for event in self.game_history
-            if include_wolf_channel or not event.startswith(f"[{self.WOLFS_CHANNEL}]")
+            event["content"] for event in self.game_history.build(prefix=prefix)
+            if include_wolf_channel or not event["content"].startswith(f"[{self.WOLFS_CHANNEL}]")
         ])
 
-    @retry(
-        wait=wait_exponential(multiplier=1, min=20, max=300),
-        stop=stop_after_attempt(5),
-        retry=retry_if_exception_type(openai.RateLimitError),
-    )
-    def find_my_role(self, message):
-        response = self.openai_client.chat.completions.create(
-            model=self.model,
-            messages=[
+    @traced("parse")
+    async def find_my_role(self, message):
+        my_role_guess = await self.llm.complete(
+            [
                 {
                     "role": "system",
                     "content": f"The user is playing a game of werewolf as user {self._name}, help the user with question with less than a line answer",
@@ -146,47 +218,122 @@ class CoTAgent(IReactiveAgent):
                     "content": f"You have got message from moderator here about my role in the werewolf game, here is the message -> '{message.content.text}', what is your role? possible roles are 'wolf','villager','doctor' and 'seer'. answer in a few words.",
                 },
             ],
+            model=self.model,
+            priority=NOTIFY,
         )
-        my_role_guess = response.choices[0].message.content
         logger.info(f"my_role_guess: {my_role_guess}")
-        if "villager" in my_role_guess.lower():
-            role = "villager"
-        elif "seer" in my_role_guess.lower():
-            role = "seer"
-        elif "doctor" in my_role_guess.lower():
-            role = "doctor"
-        else:
-            role = "wolf"
-        
-        return role
-
+        return self._normalize_role(my_role_guess)
+
+    @staticmethod
+    def _normalize_role(text):
+        text = text.lower()
+        if "villager" in text:
+            return "villager"
+        elif "seer" in text:
+            return "seer"
+        elif "doctor" in text:
+            return "doctor"
+        return "wolf"
+
+    def _find_my_role_locally(self, text):
+        classified = MODERATOR_TEMPLATES.classify(text)
+        if classified is None or classified.phase != "role_assignment":
+            return None
+        return self._normalize_role(classified.match.fields["role"])
+
+    def _set_role(self, role):
+        self.role = role
+        self.instrumentation.set_role(role)
+        logger.info(f"Role found for user {self._name}: {self.role}")
+
+    @instrumented("respond")
     async def async_respond(self, message: ActivityMessage):
         logger.info(f"ASYNC RESPOND called with message: {message}")
+        self.response_deadline = time.monotonic() + self.response_budget
 
+        # only the role is needed from notify-side work, wait for it if it's still being worked out
+        if self.role is None:
+            with self.instrumentation.span("drain_notify_queue", "state", pending=self.notify_queue.pending):
+                await self.notify_queue.drain()
+
+        classified = MODERATOR_TEMPLATES.classify(message.content.text) if message.header.sender == self.MODERATOR_NAME else None
+        handler = self._response_handler(message, classified)
         if message.header.channel_type == MessageChannelType.DIRECT and message.header.sender == self.MODERATOR_NAME:
             self.direct_messages[message.header.sender].append(message.content.text)
-            if self.role == "seer":
-                response_message = self._get_response_for_seer_guess(message)
-            elif self.role == "doctor":
-                response_message = self._get_response_for_doctors_save(message)
-            
-            response = ActivityResponse(response=response_message)
+            response_message = self._normalize_choice(await handler(message), classified)
             self.game_history.append(f"[From - {message.header.sender}| To - {self._name} (me)| Direct Message]: {message.content.text}")
             self.game_history.append(f"[From - {self._name} (me)| To - {message.header.sender}| Direct Message]: {response_message}")    
         elif message.header.channel_type == MessageChannelType.GROUP:
             self.group_channel_messages[message.header.channel].append(
                 (message.header.sender, message.content.text)
             )
-            if message.header.channel == self.GAME_CHANNEL:
-                response_message = self._get_discussion_message_or_vote_response_for_common_room(message)
-            elif message.header.channel == self.WOLFS_CHANNEL:
-                response_message = self._get_response_for_wolf_channel_to_kill_villagers(message)
+            response_message = self._normalize_choice(await handler(message), classified)
             self.game_history.append(f"[From - {message.header.sender}| To - {self._name} (me)| Group Message in {message.header.channel}]: {message.content.text}")
             self.game_history.append(f"[From - {self._name} (me)| To - {message.header.sender}| Group Message in {message.header.channel}]: {response_message}")
         
         return ActivityResponse(response=response_message)
 
-    def _get_inner_monologue(self, role_prompt, game_situation, specific_prompt):
+    def _response_handler(self, message, classified):
+        # route on what the moderator asks for, channel and role are only a fallback for messages no template matches
+        if classified is not None and classified.phase in self.PHASE_HANDLERS:
+            logger.info(f"Moderator asks for {classified.phase}{' (retry)' if classified.is_retry else ''}")
+            return getattr(self, self.PHASE_HANDLERS[classified.phase])
+        if message.header.channel == self.WOLFS_CHANNEL:
+            return self._get_response_for_wolf_channel_to_kill_villagers
+        if message.header.channel_type == MessageChannelType.DIRECT and self.role == "seer":
+            return self._get_response_for_seer_guess
+        if message.header.channel_type == MessageChannelType.DIRECT and self.role == "doctor":
+            return self._get_response_for_doctors_save
+        return self._get_discussion_message_or_vote_response_for_common_room
+
+    def _normalize_choice(self, response, classified):
+        # answers to the moderator's prompts for a player name the choice as listed, so the moderator finds it
+        if classified is None or classified.phase not in CHOICE_PHASES:
+            return response
+        # the doctor may save themselves, nobody else chooses themselves
+        exclude = None if classified.phase == "doctor_save" else self._name
+        return self.player_names.normalize_choice(response, exclude=exclude)
+
+    async def _run_pipeline(self, role_prompt, game_situation, specific_prompt, action_type, pipeline_key):
+        # input -> thoughts -> init action -> reflection -> final action, cut short by the configured depth or the deadline
+        depth = self.pipeline_depths.get(pipeline_key, "full")
+
+        if depth == "fused":
+            return await self._get_fused_action(role_prompt, game_situation, specific_prompt, action_type)
+
+        inner_monologue = await self._get_inner_monologue(role_prompt, game_situation, specific_prompt)
+        initial_action = await self._get_initial_action(role_prompt, game_situation, inner_monologue, action_type)
+
+        if depth == "two_stage":
+            return initial_action
+
+        # reflection and final action are two more calls, only start them if both should finish in time
+        expected = self._expected_latency("reflection") + self._expected_latency("final_action")
+        remaining = self.response_deadline - time.monotonic()
+        if remaining < expected:
+            logger.info(f"Skipping reflection for {pipeline_key}: {remaining:.1f}s left, about {expected:.1f}s needed")
+            return initial_action
+
+        reflection = await self._get_reflection(role_prompt, game_situation, inner_monologue, initial_action)
+        return await self._get_revised_action(role_prompt, game_situation, inner_monologue, initial_action, reflection, action_type)
+
+    async def _timed_completion(self, stage, messages):
+        start = time.monotonic()
+        with self.instrumentation.tag(stage=stage), self.instrumentation.span(stage, "stage"):
+            response = await self.llm.complete(messages, model=self.model)
+        elapsed = time.monotonic() - start
+        self.stage_latencies[stage].append(elapsed)
+        logger.info(f"Stage {stage} took {elapsed:.2f}s")
+        return response
+
+    def _expected_latency(self, stage):
+        # mean of the last few calls of this stage, the configured floor until there are any
+        latencies = self.stage_latencies[stage][-5:]
+        if not latencies:
+            return self.min_stage_latency
+        return max(sum(latencies) / len(latencies), self.min_stage_latency)
+
+    async def _get_inner_monologue(self, role_prompt, game_situation, specific_prompt):
         prompt = f"""{role_prompt}
 
 Current game situation (including your past thoughts and actions): 
@@ -194,21 +341,51 @@ Current game situation (including your past thoughts and actions):
 
 {specific_prompt}"""
 
-        response = self.openai_client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": f"You are a {self.role} in a Werewolf game."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        inner_monologue = response.choices[0].message.content
+        inner_monologue = await self._timed_completion("monologue", [
+            {"role": "system", "content": f"You are a {self.role} in a Werewolf game."},
+            {"role": "user", "content": prompt}
+        ])
         # self.game_history.append(f"\n [My Thoughts]: {inner_monologue}")
 
         logger.info(f"My Thoughts: {inner_monologue}")
         
         return inner_monologue
 
-    def _get_final_action(self, role_prompt, game_situation, inner_monologue, action_type):
+    async def _get_fused_action(self, role_prompt, game_situation, specific_prompt, action_type):
+        prompt = f"""{role_prompt}
+
+Current game situation (including your past thoughts and actions): 
+{game_situation}
+
+{specific_prompt}
+
+Then decide on your {action_type}. {self.ACTION_INSTRUCTIONS.format(action_type=action_type)}
+
+Answer with only a JSON object of the form {{"thoughts": "<your step-by-step answers>", "action": "<your {action_type}>"}}."""
+
+        response = await self._timed_completion("fused", [
+            {"role": "system", "content": f"You are a {self.role} in a Werewolf game. Provide your final {action_type}."},
+            {"role": "user", "content": prompt}
+        ])
+
+        thoughts, action = self._parse_fused_response(response)
+        logger.info(f"My Thoughts: {thoughts}")
+        return action
+
+    @staticmethod
+    def _parse_fused_response(response):
+        # fall back to the whole response as the action if the model didn't return valid JSON
+        match = re.search(r"\{.*\}", response, re.DOTALL)
+        if match:
+            try:
+                parsed = json.loads(match.group(0))
+                if isinstance(parsed, dict) and parsed.get("action"):
+                    return parsed.get("thoughts", ""), str(parsed["action"]).strip("\n ")
+            except json.JSONDecodeError:
+                pass
+        return "", response.strip("\n ")
+
+    async def _get_initial_action(self, role_prompt, game_situation, inner_monologue, action_type):
         prompt = f"""{role_prompt}
 
 Current game situation (including past thoughts and actions): 
@@ -217,18 +394,17 @@ Current game situation (including past thoughts and actions):
 Your thoughts:
 {inner_monologue}
 
-Based on your thoughts and the current situation, what is your {action_type}? Respond with only the {action_type} and no other sentences/thoughts. If it is a dialogue response, you can provide the full response that adds to the discussions so far. For all other cases a single sentence response is expected. If you are in the wolf-group channel, the sentence must contain the name of a person you wish to eliminate, and feel free to change your mind so that there is consensus. If you are in the game-room channel, the sentence must contain your response or vote, and it must be a vote to eliminate someone if the game moderator has recently messaged you asking for a vote, and also feel free to justify your vote, and later change your mind when the final vote count happens. You can justify any change of mind too. If the moderator for the reason behind the vote, you must provide the reason in the response."""
+Based on your thoughts and the current situation, what is your {action_type}? {self.ACTION_INSTRUCTIONS.format(action_type=action_type)}"""
 
-        response = self.openai_client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": f"You are a {self.role} in a Werewolf game. Provide your final {action_type}."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        initial_action = await self._timed_completion("initial_action", [
+            {"role": "system", "content": f"You are a {self.role} in a Werewolf game. Provide your final {action_type}."},
+            {"role": "user", "content": prompt}
+        ])
         
-        logger.info(f"My initial {action_type}: {response.choices[0].message.content}")
-        initial_action = response.choices[0].message.content
+        logger.info(f"My initial {action_type}: {initial_action}")
+        return initial_action.strip("\n ")
+
+    async def _get_reflection(self, role_prompt, game_situation, inner_monologue, initial_action):
         # do another run to reflect on the final action and do a sanity check, modify the response if need be
         prompt = f"""{role_prompt}
 
@@ -239,7 +415,7 @@ Your thoughts:
 {inner_monologue}
 
 Your initial action:
-{response.choices[0].message.content}
+{initial_action}
 
 Reflect on your final action given the situation and provide any criticisms. Answer the folling questions:
 1. What is my name and my role ? 
@@ -247,17 +423,15 @@ Reflect on your final action given the situation and provide any criticisms. Ans
 3. Is my action going against what my objective is in the game?
 3. How can I improve my action to better help the agents on my team and help me survive?"""
         
-        response = self.openai_client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": f"You are a {self.role} in a Werewolf game. Reflect on your final action."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        reflection = await self._timed_completion("reflection", [
+            {"role": "system", "content": f"You are a {self.role} in a Werewolf game. Reflect on your final action."},
+            {"role": "user", "content": prompt}
+        ])
 
-        logger.info(f"My reflection: {response.choices[0].message.content}")
+        logger.info(f"My reflection: {reflection}")
+        return reflection
 
-         # do another run to reflect on the final action and do a sanity check, modify the response if need be
+    async def _get_revised_action(self, role_prompt, game_situation, inner_monologue, initial_action, reflection, action_type):
         prompt = f"""{role_prompt}
 
 Current game situation (including past thoughts and actions):
@@ -270,32 +444,58 @@ Your initial action:
 {initial_action}
 
 Your reflection:
-{response.choices[0].message.content}
+{reflection}
 
-Based on your thoughts, the current situation, and your reflection on the initial action, what is your absolute final {action_type}? Respond with only the {action_type} and no other sentences/thoughts. If it is a dialogue response, you can provide the full response that adds to the discussions so far. For all other cases a single sentence response is expected. If you are in the wolf-group channel, the sentence must contain the name of a person you wish to eliminate, and feel free to change your mind so that there is consensus. If you are in the game-room channel, the sentence must contain your response or vote, and it must be a vote to eliminate someone if the game moderator has recently messaged you asking for a vote, and also feel free to justify your vote, and later change your mind when the final vote count happens. You can justify any change of mind too. If the moderator for the reason behind the vote, you must provide the reason in the response. If the moderator asked for the vote, you must mention at least one name to eliminate. If the moderator asked for a final vote, you must answer in a single sentence the name of the person you are voting to eliminate even if you are not sure."""
+Based on your thoughts, the current situation, and your reflection on the initial action, what is your absolute final {action_type}? {self.ACTION_INSTRUCTIONS.format(action_type=action_type)} {self.FINAL_VOTE_INSTRUCTIONS}"""
         
-        response = self.openai_client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": f"You are a {self.role} in a Werewolf game. Provide your final {action_type}."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        final_action = await self._timed_completion("final_action", [
+            {"role": "system", "content": f"You are a {self.role} in a Werewolf game. Provide your final {action_type}."},
+            {"role": "user", "content": prompt}
+        ])
         
-        return response.choices[0].message.content.strip("\n ")
+        return final_action.strip("\n ")
     
-    def _summarize_game_history(self):
-
-        self.detailed_history = "\n".join(self.game_history)
-
-        # send the llm the previous summary of each of the other players and suspiciona nd information, the detailed chats of this day or night
-        # llm will summarize the game history and provide a summary of the game so far
-        # summarized game history is used for current situation
+    @traced("state")
+    def _track_players(self, match):
+        # the introduction lists the players, the day start and end name who was eliminated
+        if match is None:
+            return
+        if match.template == "introduction":
+            names = extract_names(match.fields["players"])
+            if names and names != self.player_names.names:
+                self.player_names = PlayerNames(names)
+        elif match.template == "day_start" and match.fields.get("eliminated_villager"):
+            self.player_names.eliminate(match.fields["eliminated_villager"])
+        elif match.template == "day_end_message":
+            self.player_names.eliminate(match.fields["eliminated_player"])
+
+    @traced("state")
+    def _close_phase_if_needed(self, match):
+        if match is None:
+            return
+        if match.template == "night_start":
+            self.night_count += 1
+            self._summarize_game_history(f"Night {self.night_count}")
+        elif match.template == "day_start":
+            self._summarize_game_history(f"Day {self.night_count}")
+
+    def _summarize_game_history(self, next_phase_label):
+        # the phase that just ended is compressed once and cached, only the new phase stays verbatim
+        events = [event["content"] for event in self.game_history.pop_turns()]
+        phase_id = self.history_summarizer.close_phase(self.phase_label, events)
+        logger.info(f"Summarized {self.phase_label} ({len(events)} events), starting {next_phase_label}")
+
+        if self.summary_model and events:
+            # a better summary from a cheap model replaces the extractive one when it arrives, off the response path
+            self.notify_queue.submit(
+                self.llm.complete(self.history_summarizer.llm_summary_messages(self.phase_label, events), model=self.summary_model, priority=NOTIFY),
+                lambda summary, phase_id=phase_id: self.history_summarizer.replace_summary(phase_id, summary),
+            )
 
-        pass
+        self.phase_label = next_phase_label
 
 
-    def _get_response_for_seer_guess(self, message):
+    async def _get_response_for_seer_guess(self, message):
         seer_checks_info = "\n".join([f"Checked {player}: {result}" for player, result in self.seer_checks.items()])
         game_situation = f"{self.get_interwoven_history()}\n\nMy past seer checks:\n{seer_checks_info}"
         
@@ -306,13 +506,11 @@ Based on your thoughts, the current situation, and your reflection on the initia
 4. What information would be most valuable for the village at this point in the game?
 5. How can I guide the discussion during the day subtly to help the village? Should I reveal my role at this point?"""
 
-        inner_monologue = self._get_inner_monologue(self.SEER_PROMPT, game_situation, specific_prompt)
-
-        action = self._get_final_action(self.SEER_PROMPT, game_situation, inner_monologue, "choice of player to investigate")
+        action = await self._run_pipeline(self.SEER_PROMPT, game_situation, specific_prompt, "choice of player to investigate", "seer")
 
         return action
 
-    def _get_response_for_doctors_save(self, message):
+    async def _get_response_for_doctors_save(self, message):
         game_situation = self.get_interwoven_history()
         
         specific_prompt = """think through your response by answering the following step-by-step:
@@ -322,12 +520,14 @@ Based on your thoughts, the current situation, and your reflection on the initia
 4. How can I vary my protection pattern to avoid being predictable to the werewolves?
 5. How can I contribute to the village discussions with or without revealing my role? Should I reveal my role at this point?"""
 
-        inner_monologue = self._get_inner_monologue(self.DOCTOR_PROMPT, game_situation, specific_prompt)
-
-        action = self._get_final_action(self.DOCTOR_PROMPT, game_situation, inner_monologue, "choice of player to protect")        
+        action = await self._run_pipeline(self.DOCTOR_PROMPT, game_situation, specific_prompt, "choice of player to protect", "doctor")
         return action
 
-    def _get_discussion_message_or_vote_response_for_common_room(self, message):
+    async def _get_vote_response_for_common_room(self, message):
+        # the discussion prompt, with the vote's own pipeline depth
+        return await self._get_discussion_message_or_vote_response_for_common_room(message, pipeline_key="day_vote")
+
+    async def _get_discussion_message_or_vote_response_for_common_room(self, message, pipeline_key="day"):
         role_prompt = getattr(self, f"{self.role.upper()}_PROMPT", self.VILLAGER_PROMPT)
         game_situation = self.get_interwoven_history()
         
@@ -339,12 +539,10 @@ Based on your thoughts, the current situation, and your reflection on the initia
 5. If it's time to vote, who should I vote for and why, considering all the information available?
 6. How do I respond if accused during the day without revealing my role?"""
 
-        inner_monologue = self._get_inner_monologue(role_prompt, game_situation, specific_prompt)
-
-        action = self._get_final_action(role_prompt, game_situation, inner_monologue, "vote and discussion point which includes reasoning behind your vote")        
+        action = await self._run_pipeline(role_prompt, game_situation, specific_prompt, "vote and discussion point which includes reasoning behind your vote", pipeline_key)
         return action
 
-    def _get_response_for_wolf_channel_to_kill_villagers(self, message):
+    async def _get_response_for_wolf_channel_to_kill_villagers(self, message):
         if self.role != "wolf":
             return "I am not a werewolf and cannot participate in this channel."
         
@@ -358,7 +556,5 @@ Based on your thoughts, the current situation, and your reflection on the initia
 5. Arrive at a consensus for the target and suggest it to the group. Always make suggestions to eliminate at least one person.
 6. How can we defend ourselves if accused during the day without revealing our roles?"""
 
-        inner_monologue = self._get_inner_monologue(self.WOLF_PROMPT, game_situation, specific_prompt)
-
-        action = self._get_final_action(self.WOLF_PROMPT, game_situation, inner_monologue, "suggestion for target")        
+        action = await self._run_pipeline(self.WOLF_PROMPT, game_situation, specific_prompt, "suggestion for target", "wolf")
         return action
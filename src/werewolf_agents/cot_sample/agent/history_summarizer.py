@@ -0,0 +1,147 @@
+"""
+Rolling summaries of completed game phases.
+
+When a night or day ends, its events are compressed into one cached summary
+and only the current phase is kept verbatim, so prompts stay roughly the same
+size however long the game runs. Summaries are extractive by default (no LLM
+call, so closing a phase costs microseconds). When too many phase summaries
+pile up, the oldest two are merged into one, which keeps the total bounded.
+
+An LLM-written summary can replace the extractive one once it's ready: call
+llm_summary_messages for the prompt and replace_summary with the result, off
+the response path.
+"""
+import re
+
+DEFAULT_MAX_PHASE_SUMMARIES = 6
+DEFAULT_MAX_SUMMARY_CHARS = 1500
+MODERATOR_LINE_CHARS = 300
+PLAYER_LINE_CHARS = 160
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def _shorten(text, limit):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "..."
+
+
+def _first_sentence(text):
+    return _SENTENCE_END_RE.split(" ".join(text.split()), maxsplit=1)[0]
+
+
+def extractive_summary(events, moderator_name="moderator", max_chars=DEFAULT_MAX_SUMMARY_CHARS):
+    """
+    Picks the lines of a phase worth keeping, without an LLM call.
+
+    Moderator announcements (deaths, eliminations, seer results) and the agent's own
+    messages are kept first, then the first sentence of every other player's message,
+    until max_chars is reached. Kept lines stay in their original order.
+
+    Args:
+        events (list): History lines of the phase, "[From - sender| ...]: text".
+        moderator_name (str): Sender name of the moderator.
+        max_chars (int): Upper bound on the summary length.
+
+    Returns:
+        str: One line per kept event.
+    """
+    candidates = []
+    for index, event in enumerate(events):
+        if f"[From - {moderator_name}|" in event:
+            candidates.append((0, index, _shorten(event, MODERATOR_LINE_CHARS)))
+        elif "(me)|" in event.split("]:", 1)[0] and event.startswith("[From - "):
+            candidates.append((1, index, _shorten(event, PLAYER_LINE_CHARS)))
+        else:
+            candidates.append((2, index, _shorten(_first_sentence(event), PLAYER_LINE_CHARS)))
+
+    kept = []
+    used = 0
+    for priority, index, line in sorted(candidates):
+        if used + len(line) + 1 > max_chars:
+            continue
+        kept.append((index, line))
+        used += len(line) + 1
+    return "\n".join(line for _, line in sorted(kept))
+
+
+class PhaseSummarizer:
+    """
+    Cached summaries of closed phases plus the hierarchy that keeps them bounded.
+
+    Args:
+        moderator_name (str): Sender name of the moderator.
+        max_phase_summaries (int): Closed phases kept separately before the oldest are merged.
+        max_summary_chars (int): Length bound for each summary.
+    """
+
+    def __init__(self, moderator_name="moderator", max_phase_summaries=DEFAULT_MAX_PHASE_SUMMARIES,
+                 max_summary_chars=DEFAULT_MAX_SUMMARY_CHARS):
+        self.moderator_name = moderator_name
+        self.max_phase_summaries = max_phase_summaries
+        self.max_summary_chars = max_summary_chars
+        # [phase id, label, summary text], oldest first
+        self._summaries = []
+        self._next_phase_id = 0
+        self._rendered = None
+
+    def close_phase(self, label, events):
+        """
+        Summarizes a finished phase and caches the result.
+
+        Args:
+            label (str): Phase name shown in the prompt, e.g. "Night 2".
+            events (list): History lines of the phase.
+
+        Returns:
+            int: Id of the phase, for replace_summary.
+        """
+        phase_id = self._next_phase_id
+        self._next_phase_id += 1
+        if events:
+            summary = extractive_summary(events, self.moderator_name, self.max_summary_chars)
+            self._summaries.append([phase_id, label, summary])
+            self._merge_oldest()
+            self._rendered = None
+        return phase_id
+
+    def replace_summary(self, phase_id, summary):
+        """Swaps in a better summary for a phase, ignored if the phase was merged in the meantime."""
+        for entry in self._summaries:
+            if entry[0] == phase_id:
+                entry[2] = summary.strip()
+                self._rendered = None
+                return
+
+    def render(self):
+        """
+        Returns every phase summary as one text block, cached until a phase closes.
+
+        Returns:
+            str: "Summary of <label>:" sections, oldest first, or "" before the first phase closes.
+        """
+        if self._rendered is None:
+            self._rendered = "\n".join(f"Summary of {label}:\n{summary}" for _, label, summary in self._summaries)
+        return self._rendered
+
+    def llm_summary_messages(self, label, events):
+        """Prompt for an LLM-written summary of a phase, for agents configured with a summary model."""
+        return [
+            {"role": "system", "content": "You summarize rounds of a Werewolf game for a player. Be brief and factual."},
+            {"role": "user", "content": (
+                f"Summarize {label} of the game below in at most {self.max_summary_chars // 5} words. "
+                "Keep who died or was eliminated and their role, seer results, votes, role claims and accusations.\n\n"
+                + "\n".join(events)
+            )},
+        ]
+
+    def _merge_oldest(self):
+        while len(self._summaries) > self.max_phase_summaries:
+            (_, first_label, first), (_, second_label, second) = self._summaries[:2]
+            first_start = first_label.split(" - ")[0]
+            second_end = second_label.split(" - ")[-1]
+            merged = extractive_summary(
+                first.splitlines() + second.splitlines(), self.moderator_name, self.max_summary_chars
+            )
+            # merged summaries get no id, a late replace_summary for either phase is dropped
+            self._summaries[:2] = [[None, f"{first_start} - {second_end}", merged]]
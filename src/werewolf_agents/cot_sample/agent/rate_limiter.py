@@ -0,0 +1,265 @@
+"""
+Process-wide rate limiting for the agents' LLM calls.
+
+Every agent in a process that talks to the same endpoint with the same key
+shares one RateLimiter (see shared_rate_limiter), so when several agents run
+in one process they draw from one token bucket instead of each hitting the
+limit and backing off on their own. Requests wait in one queue ordered by
+priority (respond before notify), then by how many requests each agent has
+already been granted, so a chatty agent can't starve the others.
+
+The bucket follows the endpoint's x-ratelimit-* and retry-after headers when
+the client can read them. A 429 is retried after a short jittered backoff
+instead of a fixed multi-second wait, so retries from different agents don't
+arrive together.
+
+The bucket is shared within one process only. Agents in their own containers
+(the activity runner, versus_runner.py) each have a bucket of their own, and
+set llm_requests_per_minute to their share of the key's quota. There the
+headers and 429 backoff are what keeps them apart. A limiter serves one event
+loop at a time: its queue is tied to the loop, so when a later asyncio.run uses
+it the queue starts over and the bucket carries on.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import re
+import time
+from collections import defaultdict
+
+logger = logging.getLogger("rate_limiter")
+
+RESPOND = 0
+NOTIFY = 1
+
+DEFAULT_REQUESTS_PER_MINUTE = 120
+DEFAULT_BURST = 8
+DEFAULT_MAX_RETRIES = 6
+DEFAULT_BASE_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 20.0
+
+_DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+# one limiter per (endpoint, key) for the whole process
+_LIMITERS = {}
+
+
+def parse_duration(value):
+    """
+    Parses the durations used by rate limit headers.
+
+    Args:
+        value (str): Seconds ("1.5") or a unit string ("20ms", "6m0s").
+
+    Returns:
+        float | None: Seconds, None if the value can't be read.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def is_rate_limit_error(error):
+    """True for an HTTP 429 from the OpenAI client (or anything else carrying status_code 429)."""
+    return getattr(error, "status_code", None) == 429
+
+
+def _error_headers(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None) or {}
+
+
+class RateLimiter:
+    """
+    Token bucket with a fair priority queue and jittered retries.
+
+    Args:
+        requests_per_minute (float): Sustained request rate.
+        burst (int): Requests that may be sent at once after an idle period.
+        max_retries (int): Retries of a rate limited request before the error is raised.
+        base_backoff (float): First retry delay in seconds, doubled per attempt.
+        max_backoff (float): Upper bound for one retry delay.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=DEFAULT_BURST,
+                 max_retries=DEFAULT_MAX_RETRIES, base_backoff=DEFAULT_BASE_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        # (priority, grants so far, arrival, agent, future), see acquire
+        self._waiters = []
+        self._arrival = itertools.count()
+        self._granted = defaultdict(int)
+        self._dispatcher = None
+        self._loop = None
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay(self, now):
+        # seconds until one token can be spent
+        self._refill(now)
+        blocked = self._blocked_until - now
+        missing = (1.0 - self._tokens) / self.rate if self._tokens < 1.0 else 0.0
+        return max(blocked, missing, 0.0)
+
+    def _bind(self, loop):
+        # waiters and the dispatcher belong to the loop that created them and never finish once it
+        # has stopped, so a new loop (another asyncio.run) starts with an empty queue
+        if loop is not self._loop:
+            self._loop = loop
+            self._waiters = []
+            self._dispatcher = None
+
+    async def acquire(self, agent, priority=RESPOND):
+        """
+        Waits until the agent may send one request.
+
+        Args:
+            agent (str): Name used for fair queuing between agents.
+            priority (int): RESPOND or NOTIFY, lower values are served first.
+        """
+        loop = asyncio.get_running_loop()
+        self._bind(loop)
+        if not self._waiters and self._delay(time.monotonic()) == 0.0:
+            self._tokens -= 1.0
+            self._granted[agent] += 1
+            return
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, self._granted[agent], next(self._arrival), agent, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        while self._waiters:
+            if self._waiters[0][-1].done():
+                # the waiting request was cancelled
+                heapq.heappop(self._waiters)
+                continue
+            delay = self._delay(time.monotonic())
+            if delay > 0.0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, _, agent, future = heapq.heappop(self._waiters)
+            self._tokens -= 1.0
+            self._granted[agent] += 1
+            future.set_result(None)
+
+    def update_from_headers(self, headers):
+        """
+        Adjusts the bucket to what the endpoint reports.
+
+        Args:
+            headers (Mapping): Response headers, x-ratelimit-remaining-requests,
+                x-ratelimit-reset-requests and retry-after are read when present.
+        """
+        if not headers:
+            return
+        now = time.monotonic()
+        self._refill(now)
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        if remaining is not None:
+            try:
+                self._tokens = min(self._tokens, float(remaining))
+            except ValueError:
+                remaining = None
+        reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+        if remaining is not None and float(remaining) < 1.0 and reset:
+            self._blocked_until = max(self._blocked_until, now + reset)
+        retry_after = parse_duration(headers.get("retry-after"))
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def backoff(self, attempt):
+        """Full jitter delay for a retry, so agents that were limited together retry apart."""
+        return random.uniform(0.0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    async def call(self, agent, request, priority=RESPOND, stats=None):
+        """
+        Runs a request under the limiter, retrying it when it is rate limited.
+
+        Args:
+            agent (str): Name used for fair queuing between agents.
+            request (Callable): Returns a new awaitable for each attempt.
+            priority (int): RESPOND or NOTIFY.
+            stats (dict): If given, queue_wait (seconds spent waiting for a token), retries and
+                backoff (seconds slept before retries) are added to it, and phases gets a
+                (name, start, end) time.monotonic() interval for every queue_wait, request and backoff.
+
+        Returns:
+            Any: The request's result.
+        """
+        attempt = 0
+        while True:
+            waiting = time.monotonic()
+            await self.acquire(agent, priority)
+            sending = time.monotonic()
+            if stats is not None:
+                stats["queue_wait"] = stats.get("queue_wait", 0.0) + sending - waiting
+                stats.setdefault("phases", []).append(("queue_wait", waiting, sending))
+            try:
+                return await request()
+            except Exception as error:
+                if not is_rate_limit_error(error) or attempt >= self.max_retries:
+                    raise
+                self.update_from_headers(_error_headers(error))
+                # the endpoint says the bucket is empty, don't let queued requests spend tokens it doesn't have
+                self._tokens = min(self._tokens, 0.0)
+                delay = self.backoff(attempt)
+                attempt += 1
+                if stats is not None:
+                    stats["retries"] = attempt
+                    stats["backoff"] = stats.get("backoff", 0.0) + delay
+            finally:
+                if stats is not None:
+                    stats["phases"].append(("request", sending, time.monotonic()))
+            logger.warning(f"Rate limited ({agent}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            backing_off = time.monotonic()
+            await asyncio.sleep(delay)
+            if stats is not None:
+                stats["phases"].append(("backoff", backing_off, time.monotonic()))
+
+
+def shared_rate_limiter(base_url, api_key, config=None):
+    """
+    Returns the process-wide limiter for an endpoint and key, creating it on first use.
+
+    Only agents in this process share it, see the module docstring.
+
+    Args:
+        base_url (str): LLM endpoint.
+        api_key (str): Key the quota belongs to.
+        config (dict): Agent config, the llm_requests_per_minute, llm_burst and
+            llm_max_retries settings of the first agent to ask are used.
+
+    Returns:
+        RateLimiter: The shared limiter.
+    """
+    key = (base_url, api_key)
+    if key not in _LIMITERS:
+        config = config or {}
+        _LIMITERS[key] = RateLimiter(
+            requests_per_minute=config.get("llm_requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE),
+            burst=config.get("llm_burst", DEFAULT_BURST),
+            max_retries=config.get("llm_max_retries", DEFAULT_MAX_RETRIES),
+        )
+    return _LIMITERS[key]
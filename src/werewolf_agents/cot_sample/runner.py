@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 from dotenv import load_dotenv
 from pathlib import Path
@@ -6,17 +7,24 @@ load_dotenv()
 
 from sentient_campaign.activity_runner.runner import WerewolfCampaignActivityRunner, PlayerAgentConfig
 
+# the shared batch tools live at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from batch.build_cache import BuildCache
+
+AGENT_DIR = Path(__file__).resolve().parent
+
 # Create results directory if it doesn't exist
 Path("game_results").mkdir(parents=True, exist_ok=True)
 # Ensure transcripts directory exists
 Path("transcripts").mkdir(parents=True, exist_ok=True)
 
+# the wheel and image are only rebuilt when agent/, pyproject.toml or config.yaml change
+build_cache = BuildCache()
+
 runner = WerewolfCampaignActivityRunner()
 agent_config = PlayerAgentConfig(
     player_name="Chagent", # select a name for your agent
-                
-    #TODO: IMPORTANT!! After building your agent for the first time, you must update this path:
-    agent_wheel_path="dist/chagent-0.1.0-py3-none-any.whl", 
+    agent_wheel_path=build_cache.ensure_wheel(AGENT_DIR),
     module_path="agent/cot_agent.py",
     agent_class_name="CoTAgent",
     agent_config_file_path="config.yaml" 
@@ -24,12 +32,13 @@ agent_config = PlayerAgentConfig(
 players_sentient_llm_api_keys = [os.getenv("MY_UNIQUE_API_KEY")]
 
 # Run the game and save the results
-game_results = runner.run_locally(
-    agent_config,
-    players_sentient_llm_api_keys,
-    path_to_final_transcript_dump="transcripts",
-    force_rebuild_agent_image=True
-)
+with build_cache.image(AGENT_DIR) as rebuild:
+    game_results = runner.run_locally(
+        agent_config,
+        players_sentient_llm_api_keys,
+        path_to_final_transcript_dump="transcripts",
+        force_rebuild_agent_image=rebuild
+    )
 
 # Save the game results to a JSON file in game_results directory
 results_file = os.path.join("game_results", f"game_results_{game_results['activity_id']}.json")
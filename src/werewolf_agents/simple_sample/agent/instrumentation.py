@@ -0,0 +1,452 @@
+"""
+Per-message latency and token records for the agents.
+
+Instrumentation writes one JSON record per handled message (async_notify or
+async_respond) and one per LLM call, tagged with the agent, its role, the
+game phase and the message type. LLM calls made while a message is handled,
+including the background work it queues, carry that message's id and tags, so
+the records show which phase and which kind of message the time went to:
+
+    {"kind": "llm", "agent": "Chagent", "agent_class": "CoTAgent", "instance": "812_3f9c02ab", "role": "seer",
+     "phase": "night", "message_type": "seer_guess", "message_id": "17", "priority": "respond", "wall": 2.41,
+     "queue_wait": 0.3, "retries": 1, "backoff": 0.7, "prompt_tokens": 1830, "completion_tokens": 96}
+
+Records are appended to <metrics dir>/<agent>_<instance>.jsonl as they happen,
+the instance being the process id and a random suffix, so agents of concurrent
+games in one process (harness/moderator.py) each write their own files. The
+directory is the metrics_dir setting of config.yaml, or else the
+WEREWOLF_METRICS_DIR environment variable of the agent's process. Agents in
+the runner's containers can't reach the host's directories, so the batch
+executor sets metrics_url in their config.yaml instead: the lines are then
+posted from a background thread to its metrics server
+(batch/metrics_server.py), which appends them to files of the same name.
+Without either the latest records are kept in memory only. batch/metrics.py
+turns a game's records into p50/p95/p99 histograms. The files are closed when
+the moderator announces the end of the game, or at the latest when the agent
+is garbage collected or its process exits.
+
+The same timings are also written as spans to <agent>_<instance>.trace.json, in the
+trace event format trace viewers (Perfetto, chrome://tracing) open: the
+handlers, every LLM call with its rate limiter queue wait, requests and
+backoff, and whatever the agent marks with span() or @traced, e.g. parsing,
+game state updates and prompt construction. Each asyncio task is its own
+track, so background parses show up next to the handler that queued them.
+Timestamps are wall clock microseconds, so batch/trace.py can merge the files
+of all agents of a game into one timeline. Set trace: false in config.yaml to
+write the records only.
+"""
+import contextvars
+import asyncio
+import functools
+import inspect
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+METRICS_DIR_ENV = "WEREWOLF_METRICS_DIR"
+METRICS_URL_ENV = "WEREWOLF_METRICS_URL"
+# seconds one post to the metrics server, and the final flush when closing, may take
+UPLOAD_TIMEOUT = 5.0
+MODERATOR_NAME = "moderator"
+TRACE_SUFFIX = ".trace.json"
+# records kept in memory by an instrumentation without a metrics directory
+MAX_KEPT_RECORDS = 10_000
+
+# the message being handled, inherited by the tasks it creates
+_current = contextvars.ContextVar("instrumentation_scope", default=None)
+
+
+class _Scope:
+    # tags of the message being handled and the LLM work done for it so far
+
+    __slots__ = ("tags", "llm_calls", "queue_wait", "retries", "prompt_tokens", "completion_tokens")
+
+    def __init__(self, tags):
+        self.tags = tags
+        self.llm_calls = 0
+        self.queue_wait = 0.0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+
+def _phase_change(sender, text):
+    # the moderator's announcements move the phase, the same rule as transcript/catalog.py
+    if str(sender).lower() != MODERATOR_NAME:
+        return None
+    heading = text.lstrip().lower()
+    if heading.startswith("night start"):
+        return "night"
+    if heading.startswith("day start"):
+        return "day"
+    return None
+
+
+def _game_ended(sender, text):
+    # the moderator's day_start and day_end_message templates announce the end of the game
+    return str(sender).lower() == MODERATOR_NAME and "game has ended" in text.lower()
+
+
+class _RemoteFile:
+    """
+    A record or trace file on the batch executor's metrics server, for agents in containers.
+
+    Lines are posted from a background thread in the order they were written, everything
+    written since the last post in one request, so the event loop never waits for the network.
+    Lines that can't be sent are dropped, a game never fails because of its metrics.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self._lines = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._send, name="metrics-upload", daemon=True)
+        self._thread.start()
+
+    def write(self, text):
+        self._lines.put(text)
+
+    def _send(self):
+        closed = False
+        while not closed:
+            chunks = [self._lines.get()]
+            while True:
+                try:
+                    chunks.append(self._lines.get_nowait())
+                except queue.Empty:
+                    break
+            # None is put by close, after the last line
+            closed = chunks[-1] is None
+            body = "".join(chunk for chunk in chunks if chunk is not None)
+            if not body:
+                continue
+            try:
+                request = urllib.request.Request(self.url, data=body.encode(), method="POST")
+                urllib.request.urlopen(request, timeout=UPLOAD_TIMEOUT).close()
+            except OSError:
+                pass
+
+    def close(self):
+        self._lines.put(None)
+        self._thread.join(UPLOAD_TIMEOUT)
+
+
+def _close_files(*files):
+    for file in files:
+        if file is not None:
+            file.close()
+
+
+class Instrumentation:
+    """
+    Records handler and LLM call timings of one agent.
+
+    Args:
+        agent (str): The agent's player name.
+        agent_class (str): The agent implementation, e.g. "CoTAgent".
+        metrics_dir (str | Path): Directory for the JSONL records.
+        classify (Callable): Returns the message type of a moderator message's text, or None
+            if it doesn't know it, e.g. a moderator template matcher's phase.
+        trace (bool): Also write spans to a trace event file next to the records.
+        metrics_url (str): Metrics server (batch/metrics_server.py) to post the records to instead
+            of metrics_dir. Without either, the latest MAX_KEPT_RECORDS records are kept in `records`.
+    """
+
+    def __init__(self, agent, agent_class=None, metrics_dir=None, classify=None, trace=True, metrics_url=None):
+        self.agent = agent
+        self.agent_class = agent_class
+        self.classify = classify
+        self.role = None
+        self.phase = "setup"
+        self.metrics_dir = metrics_dir
+        self.metrics_url = metrics_url.rstrip("/") if metrics_url else None
+        # tells apart agents of the same name, e.g. in concurrent games of one process, in file names and records
+        self.instance = f"{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        self.records = deque(maxlen=MAX_KEPT_RECORDS)
+        self._file = None
+        self._trace = None
+        # trace viewers want wall clock microseconds, the spans are timed with the monotonic clock
+        self._epoch = time.time() - time.monotonic()
+        self._tids = weakref.WeakKeyDictionary()
+        self._next_tid = itertools.count(1)
+        if self.metrics_url or metrics_dir:
+            self._file = self._open(f"{agent}_{self.instance}.jsonl")
+            if trace:
+                self._trace = self._open(f"{agent}_{self.instance}{TRACE_SUFFIX}")
+                # the array format, viewers read it without the closing bracket, so a killed game's trace still opens
+                self._trace.write("[\n")
+                self._event({"ph": "M", "name": "process_name", "tid": 0,
+                             "args": {"name": f"{agent} ({agent_class})" if agent_class else agent}})
+                self._event({"ph": "M", "name": "thread_name", "tid": 0, "args": {"name": "main"}})
+        # agents have no shutdown hook, this closes the files of an agent that never saw the game end
+        self._closer = weakref.finalize(self, _close_files, self._file, self._trace)
+
+    def _open(self, name):
+        if self.metrics_url:
+            return _RemoteFile(f"{self.metrics_url}/{urllib.parse.quote(name)}")
+        Path(self.metrics_dir).mkdir(parents=True, exist_ok=True)
+        # line buffered, a game that is killed keeps every record written so far
+        return open(Path(self.metrics_dir) / name, "w", buffering=1)
+
+    @classmethod
+    def from_config(cls, agent, agent_class, config, classify=None):
+        """
+        Builds the agent's instrumentation from config.yaml's metrics_url, metrics_dir and trace settings.
+
+        metrics_url and metrics_dir fall back to $WEREWOLF_METRICS_URL and $WEREWOLF_METRICS_DIR.
+        """
+        config = config or {}
+        return cls(
+            agent,
+            agent_class,
+            config.get("metrics_dir") or os.environ.get(METRICS_DIR_ENV),
+            classify,
+            trace=config.get("trace", True),
+            metrics_url=config.get("metrics_url") or os.environ.get(METRICS_URL_ENV),
+        )
+
+    @property
+    def tracing(self):
+        return self._trace is not None
+
+    def set_role(self, role):
+        self.role = role
+
+    def message_type(self, message):
+        """What a message is: the classifier's answer for moderator messages, else moderator or player."""
+        sender = str(message.header.sender)
+        if sender.lower() != MODERATOR_NAME:
+            return "player"
+        if self.classify is not None:
+            message_type = self.classify(message.content.text)
+            if message_type is not None:
+                return message_type
+        return "moderator"
+
+    def record(self, kind, **fields):
+        record = {"kind": kind, "t": time.time(), "agent": self.agent, "agent_class": self.agent_class,
+                  "instance": self.instance, **fields}
+        if self._file is not None:
+            self._file.write(json.dumps(record, default=str) + "\n")
+        elif not (self.metrics_dir or self.metrics_url):
+            self.records.append(record)
+        return record
+
+    def _event(self, event):
+        event["pid"] = os.getpid()
+        self._trace.write(json.dumps(event, default=str) + ",\n")
+
+    def _tid(self):
+        # one track per asyncio task, spans of one task nest properly, concurrent tasks would not
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            return 0
+        tid = self._tids.get(task)
+        if tid is None:
+            tid = self._tids[task] = next(self._next_tid)
+            self._event({"ph": "M", "name": "thread_name", "tid": tid, "args": {"name": task.get_name()}})
+        return tid
+
+    def _complete(self, name, category, started, ended, args, tid=None):
+        # started and ended are time.monotonic() values
+        self._event({
+            "ph": "X", "name": name, "cat": category,
+            "ts": round((self._epoch + started) * 1e6), "dur": round((ended - started) * 1e6),
+            "tid": self._tid() if tid is None else tid,
+            "args": {key: value for key, value in args.items() if value is not None},
+        })
+
+    @contextmanager
+    def span(self, name, category, **args):
+        """
+        Traces a block, e.g. span("parse_message", "parse").
+
+        Args:
+            name (str): Span name.
+            category (str): What kind of work it is: "parse", "state", "prompt", "sleep", ...
+            **args: Shown with the span.
+
+        Yields:
+            dict: The args, more can be added inside the block.
+        """
+        if self._trace is None:
+            yield args
+            return
+        tid = self._tid()
+        started = time.monotonic()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            # the game may have ended, and the trace been closed, meanwhile
+            if self._trace is not None:
+                self._complete(name, category, started, time.monotonic(), args, tid)
+
+    @contextmanager
+    def handler(self, kind, message):
+        """
+        Times the handling of one message, LLM calls made meanwhile are tagged with it.
+
+        Args:
+            kind (str): "notify" or "respond".
+            message (ActivityMessage): The message being handled.
+        """
+        change = _phase_change(message.header.sender, message.content.text)
+        if change is not None:
+            self.phase = change
+        scope = _Scope({
+            "role": self.role,
+            "phase": self.phase,
+            "message_type": self.message_type(message),
+            "message_id": getattr(message.header, "message_id", None),
+            "channel_type": str(message.header.channel_type).rsplit(".", 1)[-1].lower(),
+        })
+        token = _current.set(scope)
+        started = time.monotonic()
+        error = None
+        try:
+            yield scope
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            ended = time.monotonic()
+            _current.reset(token)
+            # the role may have been learnt from this very message
+            tags = {**scope.tags, "role": scope.tags["role"] or self.role}
+            if self._trace is not None:
+                self._complete(f"async_{kind} {tags['message_type']}", "handler", started, ended,
+                               {**tags, "sender": str(message.header.sender), "error": error})
+            self.record(
+                kind,
+                **tags,
+                wall=ended - started,
+                llm_calls=scope.llm_calls,
+                queue_wait=scope.queue_wait,
+                retries=scope.retries,
+                prompt_tokens=scope.prompt_tokens,
+                completion_tokens=scope.completion_tokens,
+                error=error,
+            )
+            if _game_ended(message.header.sender, message.content.text):
+                self.close()
+
+    @contextmanager
+    def tag(self, **tags):
+        """Adds tags (e.g. stage="reflection") to the LLM calls made inside the block."""
+        scope = _current.get()
+        inner = _Scope({**(scope.tags if scope is not None else {}), **tags})
+        token = _current.set(inner)
+        try:
+            yield inner
+        finally:
+            _current.reset(token)
+            if scope is not None:
+                for name in ("llm_calls", "queue_wait", "retries", "prompt_tokens", "completion_tokens"):
+                    setattr(scope, name, getattr(scope, name) + getattr(inner, name))
+
+    @contextmanager
+    def llm_call(self, model=None, priority=None):
+        """
+        Times one LLM call.
+
+        Yields:
+            dict: Filled in by the caller: queue_wait, retries, backoff and phases (see
+                RateLimiter.call), prompt_tokens and completion_tokens.
+        """
+        scope = _current.get()
+        call = {"queue_wait": 0.0, "retries": 0, "backoff": 0.0, "prompt_tokens": None, "completion_tokens": None}
+        tid = self._tid() if self._trace is not None else None
+        started = time.monotonic()
+        error = None
+        try:
+            yield call
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            ended = time.monotonic()
+            phases = call.pop("phases", ())
+            tags = dict(scope.tags) if scope is not None else {"phase": self.phase}
+            tags["role"] = tags.get("role") or self.role
+            if self._trace is not None:
+                for name, phase_started, phase_ended in phases:
+                    self._complete(name, "rate_limit" if name != "request" else "llm", phase_started, phase_ended, {}, tid)
+                self._complete(f"llm {tags.get('stage') or priority}", "llm", started, ended,
+                               {**tags, "model": model, "priority": priority, "error": error, **call}, tid)
+            self.record("llm", **tags, model=model, priority=priority, wall=ended - started, error=error, **call)
+            if scope is not None:
+                scope.llm_calls += 1
+                scope.queue_wait += call["queue_wait"]
+                scope.retries += call["retries"]
+                scope.prompt_tokens += call["prompt_tokens"] or 0
+                scope.completion_tokens += call["completion_tokens"] or 0
+
+    def close(self):
+        """Closes the record and trace files, later records and spans are dropped."""
+        self._closer()
+        self._file = None
+        self._trace = None
+
+
+def instrumented(kind):
+    """
+    Decorates async_notify / async_respond to time them with the agent's `instrumentation`.
+
+    Args:
+        kind (str): "notify" or "respond".
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        async def wrapper(self, message, *args, **kwargs):
+            instrumentation = getattr(self, "instrumentation", None)
+            if instrumentation is None:
+                return await method(self, message, *args, **kwargs)
+            with instrumentation.handler(kind, message):
+                return await method(self, message, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def traced(category, name=None):
+    """
+    Decorates an agent method, sync or async, to trace its calls with the agent's `instrumentation`.
+
+    Args:
+        category (str): Span category, see Instrumentation.span.
+        name (str): Span name, the method's name by default.
+    """
+    def decorate(method):
+        span_name = name or method.__name__
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                instrumentation = getattr(self, "instrumentation", None)
+                if instrumentation is None or not instrumentation.tracing:
+                    return await method(self, *args, **kwargs)
+                with instrumentation.span(span_name, category):
+                    return await method(self, *args, **kwargs)
+        else:
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                instrumentation = getattr(self, "instrumentation", None)
+                if instrumentation is None or not instrumentation.tracing:
+                    return method(self, *args, **kwargs)
+                with instrumentation.span(span_name, category):
+                    return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,187 @@
+"""
+Non-blocking LLM access for the agents.
+
+AsyncLLMClient wraps AsyncOpenAI with a bounded connection pool so completions
+never block the event loop. Its requests go through the process-wide rate
+limiter in rate_limiter.py, which also owns retries. NotifyQueue runs notify-side work (message parsing,
+role detection) in the background: the LLM calls of queued items run
+concurrently, but their results are applied to the agent in the order the
+messages arrived, so game state stays consistent.
+"""
+import asyncio
+import logging
+from collections import deque
+
+import httpx
+from openai import AsyncOpenAI
+
+from agent.rate_limiter import RESPOND, shared_rate_limiter
+
+logger = logging.getLogger("llm_client")
+
+DEFAULT_MAX_CONNECTIONS = 8
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 4
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_NOTIFY_CONCURRENCY = 4
+
+
+class AsyncLLMClient:
+    """
+    Async chat completion client with a configurable connection pool.
+
+    Args:
+        llm_config (dict): One entry of sentient_llm_config["config_list"].
+        max_connections (int): Maximum concurrent connections to the LLM endpoint.
+        max_keepalive_connections (int): Idle connections kept open for reuse.
+        timeout (float): Per-request timeout in seconds.
+        name (str): Agent name, for fair queuing in the shared rate limiter.
+        rate_limiter (RateLimiter): Defaults to the process-wide limiter for the endpoint and key.
+        instrumentation (Instrumentation): Records every call's latency, queue wait, retries and tokens.
+    """
+
+    def __init__(self, llm_config, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS, timeout=DEFAULT_TIMEOUT,
+                 name=None, rate_limiter=None, instrumentation=None):
+        self.model = llm_config["llm_model_name"]
+        self.name = name or "agent"
+        self.instrumentation = instrumentation
+        self.rate_limiter = rate_limiter or shared_rate_limiter(llm_config["llm_base_url"], llm_config["api_key"])
+        self._client = AsyncOpenAI(
+            api_key=llm_config["api_key"],
+            base_url=llm_config["llm_base_url"],
+            timeout=timeout,
+            # retries are scheduled by the rate limiter
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive_connections,
+                ),
+                timeout=timeout,
+            ),
+        )
+
+    @classmethod
+    def from_config(cls, llm_config, config, name=None, instrumentation=None):
+        """Builds a client using the llm_* pool and rate limit settings of the agent's config.yaml."""
+        return cls(
+            llm_config,
+            max_connections=config.get("llm_max_connections", DEFAULT_MAX_CONNECTIONS),
+            max_keepalive_connections=config.get("llm_max_keepalive_connections", DEFAULT_MAX_KEEPALIVE_CONNECTIONS),
+            timeout=config.get("llm_timeout", DEFAULT_TIMEOUT),
+            name=name,
+            rate_limiter=shared_rate_limiter(llm_config["llm_base_url"], llm_config["api_key"], config),
+            instrumentation=instrumentation,
+        )
+
+    async def complete(self, messages, model=None, priority=RESPOND, **kwargs):
+        """
+        Requests a chat completion.
+
+        Args:
+            messages (list): Chat messages in the OpenAI format.
+            model (str): Overrides the configured model.
+            priority (int): RESPOND for calls a response waits on, NOTIFY for background work.
+
+        Returns:
+            str: The content of the first choice.
+        """
+        async def request():
+            raw = await self._client.chat.completions.with_raw_response.create(
+                model=model or self.model,
+                messages=messages,
+                **kwargs,
+            )
+            self.rate_limiter.update_from_headers(raw.headers)
+            return raw.parse()
+
+        if self.instrumentation is None:
+            response = await self.rate_limiter.call(self.name, request, priority)
+            return response.choices[0].message.content
+
+        with self.instrumentation.llm_call(model or self.model, "respond" if priority == RESPOND else "notify") as call:
+            response = await self.rate_limiter.call(self.name, request, priority, stats=call)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                call["prompt_tokens"] = usage.prompt_tokens
+                call["completion_tokens"] = usage.completion_tokens
+        return response.choices[0].message.content
+
+    async def aclose(self):
+        await self._client.close()
+
+
+class NotifyQueue:
+    """
+    Background queue for notify-side work.
+
+    Each submitted item is a coroutine (usually an LLM call) and a callback that
+    applies its result. Coroutines run concurrently, bounded by `concurrency`,
+    callbacks run one at a time in submission order.
+
+    Args:
+        concurrency (int): Maximum number of coroutines running at once.
+    """
+
+    def __init__(self, concurrency=DEFAULT_NOTIFY_CONCURRENCY):
+        self._concurrency = concurrency
+        self._semaphore = None
+        self._pending = deque()
+        self._applier = None
+
+    def submit(self, coroutine, apply=None):
+        """
+        Schedules a coroutine and returns immediately.
+
+        Args:
+            coroutine (Coroutine): Work to run in the background.
+            apply (Callable): Called with the coroutine's result, in submission order.
+
+        Returns:
+            asyncio.Task: The task running the coroutine.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        task = asyncio.ensure_future(self._run(coroutine))
+        self._pending.append((task, apply))
+        if self._applier is None or self._applier.done():
+            self._applier = asyncio.ensure_future(self._apply_in_order())
+        return task
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    async def drain(self, timeout=None):
+        """
+        Waits until every submitted item has been applied.
+
+        Args:
+            timeout (float): Give up after this many seconds, the queued work keeps running.
+
+        Returns:
+            bool: True if the queue is empty, False if the timeout expired first.
+        """
+        while self._applier is not None and not self._applier.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(self._applier), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Notify queue not drained after {timeout}s, {self.pending} items pending")
+                return False
+        return True
+
+    async def _run(self, coroutine):
+        async with self._semaphore:
+            return await coroutine
+
+    async def _apply_in_order(self):
+        while self._pending:
+            task, apply = self._pending[0]
+            try:
+                result = await task
+                if apply is not None:
+                    apply(result)
+            except Exception:
+                logger.exception("Notify work failed")
+            finally:
+                self._pending.popleft()
@@ -1,8 +1,11 @@
-from openai import OpenAI
 import logging
 from sentient_campaign.agents.v1.api import IReactiveAgent
 from sentient_campaign.agents.v1.message import ActivityMessage, ActivityResponse, MimeType, ActivityMessageHeader, MessageChannelType, TextContent
 
+from agent.context_window import ContextWindow
+from agent.instrumentation import Instrumentation, instrumented
+from agent.llm_client import AsyncLLMClient
+
 # Set up logging
 logger = logging.getLogger("simple_agent")
 level = logging.DEBUG
@@ -27,28 +30,37 @@ class SimpleReactiveAgent(IReactiveAgent):
 
         # This comes from the runner, it has a method to set these configs with a key you provide there: 
         self.llm_config = self.sentient_llm_config["config_list"][0]
-        self.openai_client = OpenAI(
-            api_key=self.llm_config["api_key"],
-            base_url=self.llm_config["llm_base_url"],
-        )
+        # per-message latency and token records, see agent/instrumentation.py
+        self.instrumentation = Instrumentation.from_config(self._name, type(self).__name__, self._config)
+        # async client, its requests share the process-wide rate limiter with every other agent on this key
+        self.llm = AsyncLLMClient.from_config(self.llm_config, self._config, name=self._name, instrumentation=self.instrumentation)
 
         ########################### System Prompt ###########################
-        # Here we create a simple list for storing message history
-        # In the first entry of this list we put the system prompt. 
+        # Here we create the message history, trimmed to a token budget on every request (see agent/context_window.py)
+        # Its first, pinned entry is the system prompt.
         # The easiest way to modify this message is to edit this system prompt!     
 
-        self.message_history = [{
-            "role": "system",
-            "content": f"You are {self._name}, an expert player in the game Werewolf (Mafia). You will be assigned one of these roles: Villager, Werewolf, Seer, or Doctor. Adapt your strategy based on your role:\n\n- Villager: Find and eliminate werewolves. Observe and vote carefully.\n- Werewolf: Eliminate villagers and blend in. Coordinate with your team during the night. Keep night actions private and avoid mentioning them during day discussions.\n- Seer: Identify werewolves. Use info wisely, avoid early exposure.\n- Doctor: Protect players. Keep your role hidden if possible.\n\nThe game alternates between Night (private actions) and Day (discussion and voting). Your goal is to lead your team to victory using logic, persuasion, and strategic thinking. Always contribute and vote thoughtfully."
+        self.message_history = ContextWindow.from_config(
+            f"You are {self._name}, an expert player in the game Werewolf (Mafia). You will be assigned one of these roles: Villager, Werewolf, Seer, or Doctor. Adapt your strategy based on your role:\n\n- Villager: Find and eliminate werewolves. Observe and vote carefully.\n- Werewolf: Eliminate villagers and blend in. Coordinate with your team during the night. Keep night actions private and avoid mentioning them during day discussions.\n- Seer: Identify werewolves. Use info wisely, avoid early exposure.\n- Doctor: Protect players. Keep your role hidden if possible.\n\nThe game alternates between Night (private actions) and Day (discussion and voting). Your goal is to lead your team to victory using logic, persuasion, and strategic thinking. Always contribute and vote thoughtfully.",
+            self._config,
             # "content": f"You are {self._name}. You are an expert at the conversational game Werewolf, also known as Mafia. Your goal is to use logic, deception, and persuasive reasoning to achieve victory for your assigned role. If you are a werewolf, your goal is to mislead the villagers and avoid being discovered. If you are a villager, your goal is to uncover the werewolves and protect the village. Always actively participate in discussions, and when prompted for any kind of vote, make a thoughtful decision based on the information available. Use clever tactics to either create doubt or expose inconsistencies in others' stories, depending on your role. Remember to be convincing and adaptable in your arguments to influence others effectively. If you refuse to vote or contribute, you will be penalized."
-        }]
+        )
+        self.role_pinned = False
         logger.debug(f"Initialized {self._name} with config: {self._config}")
 
     # this is another required method, this is the method that the game controller will call to notify your agent of something when no response is needed
+    @instrumented("notify")
     async def async_notify(self, message: ActivityMessage):
 
         # here we add the message to the message history, extracting relevant information from the ActivityMessage object it came in
         message_text = f"[From - {message.header.sender}| {message.header.channel}]: {message.content.text}"
+
+        # the moderator's first direct message assigns our role, keep it in every prompt
+        if not self.role_pinned and message.header.channel_type == MessageChannelType.DIRECT and message.header.sender == "moderator":
+            self.message_history.pin({"role": "user", "content": message_text})
+            self.role_pinned = True
+            return
+
         self.message_history.append({
             "role": "user",
             "content": message_text
@@ -56,6 +68,7 @@ class SimpleReactiveAgent(IReactiveAgent):
         logger.debug(f"Message added to history: {message_text}")
 
     # this is a required method, this is the method that the game controller will call to notify your agent of something when a response is needed
+    @instrumented("respond")
     async def async_respond(self, message: ActivityMessage) -> ActivityResponse:
 
         message_text = f"[From - {message.header.sender}| {message.header.channel}]: {message.content.text}"
@@ -66,19 +79,18 @@ class SimpleReactiveAgent(IReactiveAgent):
         logger.debug(f"Message added to history: {message_text}")
         
         logger.debug("Generating response from OpenAI...")
-        response = self.openai_client.chat.completions.create(
-            model=self.llm_config["llm_model_name"],
-            messages=self.message_history,
-        )
+        with self.instrumentation.span("build_prompt", "prompt"):
+            messages = self.message_history.build()
+        response = await self.llm.complete(messages)
         
-        assistant_message = f"[From {self._name} (me) | {message.header.channel}]: {response.choices[0].message.content}"
+        assistant_message = f"[From {self._name} (me) | {message.header.channel}]: {response}"
         self.message_history.append({
             "role": "assistant",
             "content": assistant_message
         })
         logger.debug(f"Assistant response added to history: {assistant_message}")
         
-        return ActivityResponse(response.choices[0].message.content)
+        return ActivityResponse(response)
 
 # Testing the agent: Make sure to comment out this code when you want to actually run the agent in some games. 
 
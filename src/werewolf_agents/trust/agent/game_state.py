@@ -0,0 +1,328 @@
+from enum import IntEnum
+
+import numpy as np
+
+from agent.narrative import GameNarrative
+from agent.player_names import PlayerNames
+
+NO_PLAYER = -1
+NO_ROUND = -1
+
+
+class Role(IntEnum):
+  UNKNOWN = 0
+  VILLAGER = 1
+  DOCTOR = 2
+  SEER = 3
+  WOLF = 4
+  GOOD = 5 # only ever claimed or suggested, e.g. "I saved X so X is good"
+
+  @property
+  def label(self):
+    return self.name.lower()
+
+  @classmethod
+  def from_label(cls, label):
+    if label is None:
+      return cls.UNKNOWN
+    if isinstance(label, cls):
+      return label
+    label = str(label).strip().lower()
+    if label == "werewolf":
+      return cls.WOLF
+    return cls.__members__.get(label.upper(), cls.UNKNOWN)
+
+
+class Certainty(IntEnum):
+  NONE = 0
+  GUESS = 1
+  CONFIDENT = 2
+
+  @classmethod
+  def from_label(cls, label):
+    if label is None:
+      return cls.CONFIDENT
+    return cls.__members__.get(str(label).strip().upper(), cls.GUESS)
+
+
+class GameState():
+  """
+  What the agent knows about the game, stored as arrays indexed by integer player id.
+
+  Player ids are positions in player_list. Roles and certainty levels are stored as
+  Role / Certainty codes, votes as a (round, voter) array of target ids and accusations
+  as three (accuser, accused) planes for round, role and certainty. The name based
+  methods (record_vote, claim_checked, ...) are kept for the parsers, simulations can
+  call the *_by_id variants directly and pass narrative=False to skip building sentences.
+  Names go through a PlayerNames index, so a misspelt name is matched to its player and
+  an unknown one is ignored rather than raising.
+  """
+
+  __slots__ = (
+    "player_list", "_names", "players_left", "wolves_left", "doctor_confirm_dead",
+    "seer_confirm_dead", "first_known_wolf", "current_round", "player_alive_state",
+    "player_role_claims_codes", "player_role_claims_round", "player_role_confirmed_codes",
+    "votes", "accusation_round", "accusation_role", "accusation_certainty",
+    "player_left_per_round", "wolf_kill_ids", "lynch_ids", "suspicious_attempts",
+    "given_role", "partner_wolves", "confirmed_good", "confirmed_bad", "my_checked_history",
+    "narrative",
+  )
+
+  def __init__(self, player_list, wolves=2, max_rounds=8, narrative=True):
+    n = len(player_list)
+    self.player_list = list(player_list)
+    self.players_left = n
+    self.wolves_left = wolves
+    self.doctor_confirm_dead = False
+    self.seer_confirm_dead = False
+    self.first_known_wolf = False
+    self.current_round = 0
+
+    self.player_alive_state = np.ones(n, dtype=np.bool_)
+    self._names = None
+    self.player_role_claims_codes = np.zeros(n, dtype=np.int8)
+    self.player_role_claims_round = np.full(n, NO_ROUND, dtype=np.int16) # round in which player claimed the role
+    self.player_role_confirmed_codes = np.zeros(n, dtype=np.int8)
+
+    self.votes = np.full((max_rounds, n), NO_PLAYER, dtype=np.int16) # votes[round, voter] = target, NO_PLAYER if they didn't vote
+    self.accusation_round = np.full((n, n), NO_ROUND, dtype=np.int16)
+    self.accusation_role = np.zeros((n, n), dtype=np.int8)
+    self.accusation_certainty = np.zeros((n, n), dtype=np.int8)
+
+    self.player_left_per_round = [n] # 0, start of game, 1 is after first kill phase
+    self.wolf_kill_ids = []
+    self.lynch_ids = []
+    self.suspicious_attempts = [[] for p in self.player_list]
+
+    self.given_role = None
+    self.partner_wolves = []
+    self.confirmed_good = []
+    self.confirmed_bad = []
+    self.my_checked_history = []
+
+    # sentences are appended by the mutators below, see convert_game_state_to_text
+    self.narrative = GameNarrative(self.player_list, wolves) if narrative else None
+
+  # ---- name facade, used by the message parsers ---- #
+
+  @property
+  def names(self):
+    # built on the first lookup, simulations that only use the *_by_id variants never need it.
+    # it shares player_alive_state, so matching against the living players needs no bookkeeping
+    if self._names is None:
+      self._names = PlayerNames(self.player_list, alive=self.player_alive_state)
+    return self._names
+
+  def player_index(self, player_name):
+    player_id = self.names.resolve(player_name)
+    return NO_PLAYER if player_id is None else player_id
+
+  def _optional_index(self, player_name):
+    # None for "nobody", e.g. a night without a kill, an unknown name is NO_PLAYER as well
+    return NO_PLAYER if player_name is None else self.player_index(player_name)
+
+  def _name(self, player_id):
+    return None if player_id == NO_PLAYER else self.player_list[player_id]
+
+  @property
+  def player_vote_history(self):
+    rounds = min(self.current_round + 1, len(self.votes))
+    return [
+      [self.player_list[target] for target in self.votes[:rounds, voter] if target != NO_PLAYER]
+      for voter in range(len(self.player_list))
+    ]
+
+  @property
+  def player_role_claims(self):
+    return [Role(code).label if code else None for code in self.player_role_claims_codes]
+
+  @property
+  def player_role_confirmed(self):
+    return [Role(code).label if code else False for code in self.player_role_confirmed_codes]
+
+  @property
+  def player_accusation_history(self):
+    return [
+      [
+        {
+          "round": int(self.accusation_round[accuser, accused]),
+          "role": Role(self.accusation_role[accuser, accused]).label,
+          "certainty": Certainty(self.accusation_certainty[accuser, accused]).name.lower(),
+        } if self.accusation_round[accuser, accused] != NO_ROUND else None
+        for accused in range(len(self.player_list))
+      ]
+      for accuser in range(len(self.player_list))
+    ]
+
+  @property
+  def wolf_kill_history(self):
+    return [self._name(player_id) for player_id in self.wolf_kill_ids]
+
+  @property
+  def lynch_history(self):
+    return [self.player_list[player_id] for player_id in self.lynch_ids]
+
+  def init_role(self, player_role):
+    self.given_role = player_role
+    if self.narrative is not None:
+      self.narrative.add(f"I was assigned the role of {player_role}.")
+
+  def init_partner_wolf(self, player_name):
+    player_name = self.names.name(player_name) or player_name
+    self.partner_wolves.append(player_name)
+    if self.narrative is not None:
+      self.narrative.add(f"{player_name} is my fellow werewolf.")
+
+  def record_check(self, checked_player_name, is_good):
+    checked_player_name = self.names.name(checked_player_name) or checked_player_name
+    if is_good:
+      self.confirmed_good.append({
+        "player": checked_player_name,
+        "rationale": f"As seer, I checked {checked_player_name} on the {self.current_round} round and he's the innocent."
+      })
+    else:
+      self.confirmed_bad.append({
+        "player": checked_player_name,
+        "rationale": f"As seer, I checked {checked_player_name} on the {self.current_round} round and he's the wolf."
+      })
+    self.my_checked_history.append({
+      "player_name": checked_player_name,
+      "is_good": is_good
+    })
+    if self.narrative is not None:
+      self.narrative.add(f"In round {self.current_round}, I checked {checked_player_name} as seer and they are {'not a wolf' if is_good else 'a wolf'}.")
+
+  def record_night_phase_death(self, player_name):
+    self.record_night_phase_death_by_id(self._optional_index(player_name))
+
+  def record_vote(self, from_player_name, voted_player_name):
+    voter_id = self.player_index(from_player_name)
+    target_id = self._optional_index(voted_player_name)
+    if voter_id == NO_PLAYER or (target_id == NO_PLAYER and voted_player_name is not None):
+      return
+    self.record_vote_by_id(voter_id, target_id)
+
+  def record_lynch(self, player_name, player_role): # roles: "villager", "doctor", "seer", "wolf"
+    player_id = self.player_index(player_name)
+    if player_id != NO_PLAYER:
+      self.record_lynch_by_id(player_id, Role.from_label(player_role))
+
+  def claim_seer(self, player_name):
+    player_id = self.player_index(player_name)
+    if player_id != NO_PLAYER:
+      self.claim_role_by_id(player_id, Role.SEER)
+
+  def claim_doctor(self, player_name):
+    player_id = self.player_index(player_name)
+    if player_id != NO_PLAYER:
+      self.claim_role_by_id(player_id, Role.DOCTOR)
+
+  def claim_checked(self, player_name, player_checked_name, player_role, round_checked):
+    player_id = self.player_index(player_name)
+    to_player_id = self.player_index(player_checked_name)
+    if NO_PLAYER in (player_id, to_player_id):
+      return
+    self._accuse(player_id, to_player_id, self._round(round_checked), Role.from_label(player_role), Certainty.CONFIDENT)
+    if self.narrative is not None:
+      self.narrative.add(f"In round {self.current_round}, {self.player_list[player_id]} claimed to have checked {self.player_list[to_player_id]} in round {round_checked} and found them to be a {player_role}.")
+
+  def claim_saved(self, player_name, player_saved_name, round_saved):
+    player_id = self.player_index(player_name)
+    to_player_id = self.player_index(player_saved_name)
+    if NO_PLAYER in (player_id, to_player_id):
+      return
+    self._accuse(player_id, to_player_id, self._round(round_saved), Role.GOOD, Certainty.CONFIDENT)
+    if self.narrative is not None:
+      self.narrative.add(f"In round {self.current_round}, {self.player_list[player_id]} claimed to have saved {self.player_list[to_player_id]} in round {round_saved}.")
+
+  def player_suggests(self, player_name, player_suggested_role_name, suggested_role, certainty):
+    """
+    Records that a player said another player has a role.
+
+    Args:
+        player_name (str): Player making the suggestion.
+        player_suggested_role_name (str): Player the suggestion is about.
+        suggested_role ("villager", "doctor", "seer", wolf", "good"): The suggested role.
+        certainty ("guess" or "confident"): How sure the player sounded.
+    """
+    player_id = self.player_index(player_name)
+    to_player_id = self.player_index(player_suggested_role_name)
+    if NO_PLAYER in (player_id, to_player_id):
+      return
+    self.player_suggests_by_id(player_id, to_player_id, Role.from_label(suggested_role), Certainty.from_label(certainty))
+
+  def player_suspicious_action(self, player_name, message):
+    player_id = self.player_index(player_name)
+    if player_id == NO_PLAYER:
+      return
+    self.suspicious_attempts[player_id].append(message)
+    if self.narrative is not None:
+      self.narrative.add(f"{self.player_list[player_id]} was noted to have a suspicious attempt: {message}.")
+
+  # ---- integer id core ---- #
+
+  def record_night_phase_death_by_id(self, player_id):
+    self.wolf_kill_ids.append(player_id)
+    if player_id != NO_PLAYER:
+      self.player_alive_state[player_id] = False
+      self.players_left -= 1
+      self.player_left_per_round.append(self.players_left)
+    self.current_round += 1
+    if self.narrative is not None:
+      if player_id != NO_PLAYER:
+        self.narrative.add(f"In round {self.current_round}, the werewolves killed {self.player_list[player_id]}.")
+        self.narrative.add(f"At the start of round {self.current_round}, there were {self.players_left} players left.")
+      else:
+        self.narrative.add(f"In round {self.current_round}, nobody was killed by the werewolves.")
+
+  def record_vote_by_id(self, voter_id, target_id):
+    while self.current_round >= len(self.votes):
+      # games rarely outlast max_rounds, double the plane when one does
+      self.votes = np.concatenate([self.votes, np.full_like(self.votes, NO_PLAYER)])
+    self.votes[self.current_round, voter_id] = target_id
+    if self.narrative is None:
+      return
+    if target_id == NO_PLAYER:
+      # an abstention, recorded so it replaces an earlier vote this round
+      self.narrative.add(f"In round {self.current_round}, {self.player_list[voter_id]} did not vote.")
+    else:
+      self.narrative.add(f"In round {self.current_round}, {self.player_list[voter_id]} voted to eliminate {self.player_list[target_id]}.")
+
+  def record_lynch_by_id(self, player_id, role):
+    self.lynch_ids.append(player_id)
+    self.player_alive_state[player_id] = False
+    self.player_role_confirmed_codes[player_id] = role
+    self.players_left -= 1
+    if role == Role.WOLF:
+      self.wolves_left -= 1
+    elif role == Role.SEER:
+      self.seer_confirm_dead = True
+    elif role == Role.DOCTOR:
+      self.doctor_confirm_dead = True
+    if self.narrative is not None:
+      self.narrative.add(f"In round {self.current_round}, the players voted to lynch {self.player_list[player_id]}, who was a {role.label}.")
+      if role in (Role.SEER, Role.DOCTOR):
+        self.narrative.add(f"The {role.label} was confirmed dead.")
+
+  def claim_role_by_id(self, player_id, role):
+    self.player_role_claims_codes[player_id] = role
+    self.player_role_claims_round[player_id] = self.current_round
+    if self.narrative is not None:
+      self.narrative.add(f"In round {self.current_round}, {self.player_list[player_id]} claimed to be a {role.label}.")
+
+  def player_suggests_by_id(self, player_id, to_player_id, role, certainty):
+    self._accuse(player_id, to_player_id, self.current_round, role, certainty)
+    if self.narrative is not None:
+      self.narrative.add(f"In round {self.current_round}, {self.player_list[player_id]} accused {self.player_list[to_player_id]} of being a {role.label} with {certainty.name.lower()} certainty.")
+
+  def _accuse(self, player_id, to_player_id, round_number, role, certainty):
+    self.accusation_round[player_id, to_player_id] = round_number
+    self.accusation_role[player_id, to_player_id] = role
+    self.accusation_certainty[player_id, to_player_id] = certainty
+
+  def _round(self, round_number):
+    # rounds claimed by players come from the LLM parse and may be missing or not a number
+    try:
+      return int(round_number)
+    except (TypeError, ValueError):
+      return self.current_round
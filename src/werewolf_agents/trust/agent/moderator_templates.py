@@ -0,0 +1,345 @@
+"""
+Precompiled matchers for the moderator's messages.
+
+The moderator renders every message it sends from the Jinja templates in
+z-moderator-prompts/templates. The agent wheel only ships the agent package, so
+the templates are copied into TEMPLATES below and compiled once at import time
+into anchored regular expressions, one per {% if %} branch. A moderator message
+can then be recognised, and its template variables pulled out, without an LLM call.
+`python -m harness.templates --check` checks the copy against the directory.
+"""
+import re
+from collections import defaultdict, namedtuple
+
+TEMPLATES = {
+    "day_discussion_initiation": """\
+Discussion:
+Hey {{delegate_player}}, who do you think is or is not a 'wolf' in the group and what is your reason?
+""",
+    "day_end_message": """\
+Day End:
+day elimination : Player -> '{{eliminated_player}}' was eliminated by the vote today. Their role was -> '{{eliminated_player_role}}'.
+{% if is_game_ended %}
+    The game has ended.
+    Reason: {{ game_end_reason }}
+{% endif %}
+""",
+    "day_start": """\
+Day start:
+
+Hello players, Good Morning. Please wake up.
+
+{% if eliminated_villager == "" %}
+    Every one from yesterday has made it to today.  looks like the doctor has saved a player from elimination.
+{% else %}
+    villager dead : Alas!,A villager player has been eliminated by the wolves. his name is -> '{{eliminated_villager}}'
+
+   {% if is_game_ended  %}
+       The Game has ended because {{ game_end_reason }}
+   {% else %}
+       Let me ask one by one about who are the wolfs among overselves.
+   {% endif %}
+{% endif %}
+""",
+    "day_wolf_elimination_vote_casting": """\
+Day vote:
+
+Hello {{ delegate_player }}, please cast your final vote on who you think the wolf is. "Please respond in few words".
+""",
+    "day_wolf_elimination_vote_local_retry": """\
+Day vote retry:
+Hello {{ delegatte_player }} I was not able to understand who you are choosing to vote out of the game. Could you please vote again? Remember to respond with only one player's name who you wish to vote for elimination.
+here are the players who are still alive in game today ->  {{ alive_players }}
+""",
+    "doctor_save": """\
+Doctor save:
+Hello Doctor {{ player }} please wake up and select one player to protect from being eliminated by werewolves in the night. here are the list of alive player for to night -> [ {{ alive_players }} ]
+""",
+    "doctor_save_local_retry": """\
+Doctor save retry:
+Hello {{ player }} I was not able to understand who you choose to save. Please tell me which player you would like to try to save.
+Here are the players who are still alive this night :  {{  alive_players }}
+""",
+    "introduction": """\
+Introduction:
+
+Hello players, welcome to the Werewolf game hosted by Sentient! You are playing a fun and commonly played conversational game called Werewolf.
+
+I am your moderator, my name is "{{ moderator_name }}".
+
+You are now part of a game communication group called '{{ game_room }}', where all players can interact. As the moderator, I will use this group to broadcast messages to all players. All players can see messages in this group.
+
+
+
+Here are the general instructions of this game:
+
+Game Instructions:
+
+1. Roles:
+   At the start of each game you will be asigned one of the following roles:
+   - Villagers : The majority of players. Their goal is to identify and eliminate the werewolves.
+   - Werewolves : A small group of players who aim to eliminate the villagers.
+   - Seer  :  A "special villager" who can learn the true identity of one player each night with help of moderator.
+   - Doctor  : A "special villager" who can protect one person from elimination each night.
+
+2. Gameplay:
+   The game alternates between night and day phases.
+
+   Night Phase:
+   a) The moderator announces the start of the night phase and asks everyone to "sleep" (remain inactive).
+   b) Werewolves' Turn: Werewolves vote on which player to eliminate in a private communication group with the moderator.
+   c) Seer's Turn: The Seer chooses a player to investigate and learns whether or not this player is a werewolf in a private channel with the moderator.
+   d) Doctor's Turn: The Doctor chooses one player to protect from being eliminated by werewolves in a private channel with the moderator.
+
+   Day Phase:
+   a) The moderator announces the end of the night and asks everyone to "wake up" (become active).
+   b) The moderator reveals if anyone was eliminated during the night.
+   c) Players discuss and debate who they suspect to be werewolves.
+   d) Players vote on who to eliminate. The player with the most votes is eliminated and their role is revealed.
+
+3. Winning the Game:
+   - Villagers win if they eliminate all werewolves.
+   - Werewolves win if they equal or outnumber the villagers.
+
+4. Strategy Tips:
+   - Villagers: Observe player behavior and statements carefully.
+   - Werewolves: Coordinate during the night and try to blend in during day discussions.
+   - Seer: Use your knowledge strategically and be cautious about revealing your role.
+   - Doctor: Protect players wisely and consider keeping your role secret.
+
+5. Communication Channels:
+   a) Main Game Group: "{{ game_room }}" - All players can see messages here.
+   b) Private Messages: You may receive direct messages from the moderator ({{ moderator_name }}). These are private messages that only you have access to.
+   c) Werewolf Group: If you're a werewolf, you'll have access to a private group  wolf's-den for night discussions.
+
+Here is the list of your fellow player in the game. - {{players}}
+
+Remember to engage actively, think strategically, and enjoy the game!
+""",
+    "night_start": """\
+ Night Start:
+ Hello players night has started. Please go to sleep.
+""",
+    "seer_guess": """\
+Seer guess:
+Hello seer {{ player }}, please guess which fellow player in the game is a wolf.here is the list of alive players ->  {{ alive_players }} . Just take a wild guess and pick a player if you can't reason for now.
+""",
+    "seer_guess_local_retry": """\
+Seer guess retry:
+Hello Seer, I was not able to understand whom you guessed to be a wolf.
+
+You need to guess one player as the wolf. Even if it's the first day or you don't have enough information yet, please make a random guess.
+
+Please guess again. Here are the alive players for this night -> {{ alive_players }}
+
+Respond with your guess in a few words.
+""",
+    "seer_guess_result": """\
+Seer guess result:
+{% if is_wolf %}
+    Nice! : {{player}} you guessed it right player -> '{{selected_player}}' is a wolf.
+{% else %}
+    Hmm! '{{player}}' you are off the mark by bit. player -> '{{selected_player}}' is not a wolf.
+{% endif %}
+""",
+    "set_role": """\
+Role setting:
+Hello {{player}} you are now playing the game werewolf with the role -> '{{role}}' in the game. Please keep this information discreet.
+""",
+    "wolf_elimination_consens": """\
+Day consensus:
+Okay lets come to a consensus and lets vote on the elimination of a wolf.
+""",
+    "wolf_night_introduction": """\
+Wolf night:
+{% if is_first_night %}
+Hello wolfs I have created this new private group between wolfs called "wolfs-group" .
+
+I will use this group to ask you to vote a player to eliminate every night
+
+{%else%}
+
+Hello wolfs another day has passed and night has started. Lets start the process of voting to eliminate a player.
+
+{% endif %}
+
+Here are the alive villager players for this night ->  {{players}}
+""",
+    "wolf_vote": """\
+Wolf vote:
+Hello wolf {{ delegate_player }} please vote a player to eliminate.
+""",
+    "wolf_vote_local_retry": """\
+Wolf vote retry:
+hello {{ delegatte_player }} I was not able to unerstand which vilager you tried to eliminate. please vote again
+You have to select one player. if today is first day , take random guess but please vote to eliminate one player.
+
+here are the alive players for this night ->  {{ alive_players }} , anwser the choice in few words.
+""",
+}
+
+TemplateMatch = namedtuple("TemplateMatch", ["template", "fields"])
+ModeratorPhase = namedtuple("ModeratorPhase", ["phase", "is_retry", "match"])
+
+# the turn a template asks its receiver for, retries ask for the same turn again
+PHASES = {
+    "set_role": "role_assignment",
+    "seer_guess": "seer_guess",
+    "seer_guess_local_retry": "seer_guess",
+    "doctor_save": "doctor_save",
+    "doctor_save_local_retry": "doctor_save",
+    "wolf_vote": "wolf_vote",
+    "wolf_vote_local_retry": "wolf_vote",
+    "day_discussion_initiation": "day_discussion",
+    "day_wolf_elimination_vote_casting": "day_vote",
+    "day_wolf_elimination_vote_local_retry": "day_vote",
+}
+ANNOUNCEMENT = "announcement"
+
+_TAG_RE = re.compile(r"(\{\{.*?\}\}|\{%.*?%\})", re.DOTALL)
+_WHITESPACE_RE = re.compile(r"\s+")
+_EQUALS_CONDITION_RE = re.compile(r"^(\w+)\s*==\s*(['\"])(.*)\2$")
+
+
+def _parse_template(source):
+    # nodes are ("text", str), ("var", name) or ("if", condition, then_nodes, else_nodes)
+    root = []
+    stack = [(None, root)]
+    for token in _TAG_RE.split(source):
+        if token.startswith("{{"):
+            stack[-1][1].append(("var", token[2:-2].strip()))
+        elif token.startswith("{%"):
+            statement = token[2:-2].strip()
+            if statement.startswith("if "):
+                node = ["if", statement[3:].strip(), [], []]
+                stack[-1][1].append(node)
+                stack.append((node, node[2]))
+            elif statement == "else":
+                node = stack.pop()[0]
+                stack.append((node, node[3]))
+            elif statement == "endif":
+                stack.pop()
+            else:
+                raise ValueError(f"Unsupported template statement: {statement}")
+        elif token:
+            stack[-1][1].append(("text", token))
+    if len(stack) != 1:
+        raise ValueError("Unbalanced {% if %} in template")
+    return root
+
+
+def _condition_fields(condition, value):
+    # the fields a branch implies, e.g. `eliminated_villager == ""` being true binds eliminated_villager to ""
+    negated = condition.startswith("not ")
+    if negated:
+        condition = condition[4:].strip()
+        value = not value
+    equals = _EQUALS_CONDITION_RE.match(condition)
+    if equals:
+        return {equals.group(1): equals.group(3)} if value else {}
+    return {condition: value}
+
+
+def _expand_branches(nodes):
+    # every combination of {% if %} outcomes as a flat (parts, fields) pair
+    branches = [([], {})]
+    for node in nodes:
+        if node[0] != "if":
+            branches = [(parts + [node], fields) for parts, fields in branches]
+            continue
+        _, condition, then_nodes, else_nodes = node
+        options = []
+        for value, sub_nodes in ((True, then_nodes), (False, else_nodes)):
+            for sub_parts, sub_fields in _expand_branches(sub_nodes):
+                options.append((sub_parts, {**_condition_fields(condition, value), **sub_fields}))
+        branches = [
+            (parts + sub_parts, {**fields, **sub_fields})
+            for parts, fields in branches
+            for sub_parts, sub_fields in options
+        ]
+    return branches
+
+
+def _branch_regex(parts):
+    pattern = []
+    seen = set()
+    for kind, value in parts:
+        if kind == "text":
+            words = _WHITESPACE_RE.split(value)
+            pattern.append(r"\s*".join(re.escape(word) for word in words))
+        elif value in seen:
+            pattern.append(f"(?P={value})")
+        else:
+            seen.add(value)
+            pattern.append(f"(?P<{value}>.*?)")
+    return re.compile(r"\s*" + "".join(pattern) + r"\s*", re.DOTALL)
+
+
+def _header(text):
+    # first non-empty line, e.g. "role setting:", used to pick candidate templates
+    for line in text.splitlines():
+        line = _WHITESPACE_RE.sub(" ", line).strip().lower()
+        if line and "{{" not in line and "{%" not in line:
+            return line
+        if line:
+            return None
+    return None
+
+
+class ModeratorTemplateMatcher:
+    """
+    Matches moderator messages against the compiled templates.
+
+    Args:
+        templates (dict): Template name to Jinja source, defaults to TEMPLATES.
+    """
+
+    def __init__(self, templates=None):
+        self._by_header = defaultdict(list)
+        self._all = []
+        for name, source in (templates or TEMPLATES).items():
+            header = _header(source)
+            for parts, fields in _expand_branches(_parse_template(source)):
+                compiled = (name, _branch_regex(parts), fields)
+                self._all.append(compiled)
+                if header:
+                    self._by_header[header].append(compiled)
+
+    def match(self, text):
+        """
+        Finds the template a moderator message was rendered from.
+
+        Args:
+            text (str): The moderator's message.
+
+        Returns:
+            TemplateMatch | None: The template name and its variables, None if no template matches.
+        """
+        candidates = self._by_header.get(_header(text)) or self._all
+        for name, pattern, fields in candidates:
+            found = pattern.fullmatch(text)
+            if found:
+                values = {key: value.strip() for key, value in found.groupdict().items()}
+                return TemplateMatch(name, {**fields, **values})
+        return None
+
+    def classify(self, text):
+        """
+        Works out what a moderator message asks for.
+
+        Args:
+            text (str): The moderator's message.
+
+        Returns:
+            ModeratorPhase | None: The phase (one of PHASES' values, or ANNOUNCEMENT for messages
+                that ask for nothing), whether it is a retry, and the template match.
+                None if no template matches.
+        """
+        match = self.match(text)
+        if match is None:
+            return None
+        return ModeratorPhase(
+            PHASES.get(match.template, ANNOUNCEMENT),
+            match.template.endswith("_local_retry"),
+            match,
+        )
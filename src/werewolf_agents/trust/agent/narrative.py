@@ -0,0 +1,53 @@
+"""
+Append-only narrative of the game, written as events happen.
+
+GameState's mutators add one sentence per event, so the state summary sent
+with every response only formats the new events instead of walking every
+claim, vote and the full accusation matrix again. The text itself still has
+to be one string for the prompt: rendering after new events copies the whole
+narrative once (a single C-level concatenation), rendering without new
+events returns the cached string.
+"""
+
+
+class GameNarrative:
+    """
+    Sentences describing the game so far, with a cached rendering.
+
+    Args:
+        player_list (list): Names of every player at the start of the game.
+        wolf_count (int): Number of werewolves in the game.
+    """
+
+    def __init__(self, player_list, wolf_count=2):
+        self._sentences = [
+            f"There are {len(player_list)} players in the game, with {wolf_count} werewolves among them.",
+            f"The players are: {', '.join(player_list)}.",
+            "At the start of the game, no players were confirmed as the doctor or seer.",
+            f"At the start of round 0, there were {len(player_list)} players left.",
+        ]
+        self._rendered = ""
+        self._rendered_count = 0
+
+    def add(self, sentence):
+        self._sentences.append(sentence)
+
+    def __len__(self):
+        return len(self._sentences)
+
+    def render(self):
+        """
+        Returns the narrative as one text block.
+
+        Sentences added since the last call are joined and appended to the cached text. That
+        copies the whole text once, O(total length), but no earlier sentence is visited again.
+        Without new sentences the cached string is returned as it is.
+
+        Returns:
+            str: Sentences separated by newlines.
+        """
+        if self._rendered_count < len(self._sentences):
+            new_text = "\n".join(self._sentences[self._rendered_count:])
+            self._rendered = f"{self._rendered}\n{new_text}" if self._rendered else new_text
+            self._rendered_count = len(self._sentences)
+        return self._rendered
@@ -0,0 +1,285 @@
+"""
+Resolves the player names written in messages to the game's roster.
+
+The roster is listed once, in the game description. Names written later can
+differ from it: in message headers, in votes, in claims and in the LLM's
+parse of them. The differences are case, punctuation, spacing or a typo.
+The moderator works out which player an answer chose with an LLM call; the
+agents can do it locally. PlayerNames is built once per game from
+extract_names(description) and tries, in order:
+
+    exact      the name as listed
+    casefold   "bob" for "Bob"
+    alias      punctuation and spaces dropped ("@Bob!", "mary ann" for "MaryAnn"),
+               the first word of multi-word names and configured aliases
+    edit       the closest player within a small edit distance ("Bbo" for "Bob")
+
+Lookups never raise. A name that matches nobody, or several players equally
+well, resolves to None.
+"""
+import re
+
+DEFAULT_MAX_DISTANCE = 2
+# a typo may change at most one character in three, so short names only match exactly
+DISTANCE_RATIO = 3
+# distinct misspellings whose closest players are remembered
+MAX_CACHED_TYPOS = 1024
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def extract_names(description):
+    """
+    The player names listed in a game description.
+
+    Args:
+        description (str): Text with the players as a list, e.g. "... players: ['Frodo', 'Sam']",
+            or just the names separated by commas.
+
+    Returns:
+        list: The names in the order they are listed.
+    """
+    start = description.find("[")
+    end = description.find("]", start)
+    listed = description[start + 1:end] if start != -1 and end != -1 else description
+    names = [name.strip().strip("'\"").strip() for name in listed.split(",")]
+    return [name for name in names if name]
+
+
+def _key(text):
+    # casefolded letters and digits only, "Mary-Ann " and "maryann" share a key
+    return "".join(_WORD_RE.findall(text.casefold()))
+
+
+def edit_distance(a, b, bound):
+    """
+    Levenshtein distance where swapping two adjacent characters counts as one edit.
+
+    Args:
+        a (str): First string.
+        b (str): Second string.
+        bound (int): Stop once the distance is known to exceed this.
+
+    Returns:
+        int: The distance, bound + 1 if it is larger than bound.
+    """
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if before is not None and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        if min(current) > bound:
+            return bound + 1
+        before, previous = previous, current
+    return min(previous[-1], bound + 1)
+
+
+def _unique(pairs):
+    # key -> player id, keys shared by different players are dropped
+    ids = {}
+    for key, player_id in pairs:
+        if key:
+            ids.setdefault(key, set()).add(player_id)
+    return {key: next(iter(found)) for key, found in ids.items() if len(found) == 1}
+
+
+class PlayerNames:
+    """
+    Name resolution index over one game's roster.
+
+    Args:
+        names (list): The players, as extract_names returns them. Their positions are the player ids.
+        aliases (dict): Extra spellings of a listed name, e.g. {"Sammy": "Sam"}.
+        max_distance (int): Largest edit distance of a typo. It is also capped at a third of the name's length.
+        alive (Sequence): Truthy per player while they are alive. It can be shared with the caller, e.g.
+            GameState's player_alive_state, so eliminations are seen without telling the index.
+            By default it is a list of its own that eliminate updates.
+    """
+
+    def __init__(self, names, aliases=None, max_distance=DEFAULT_MAX_DISTANCE, alive=None):
+        self.names = list(names)
+        self.alive = alive if alive is not None else [True] * len(self.names)
+        self.max_distance = max_distance
+        self._aliases = aliases or {}
+
+        self._exact = {}
+        for player_id, name in enumerate(self.names):
+            self._exact.setdefault(name, player_id)
+        # most names arrive as listed, the other tables are built on the first one that doesn't
+        self._folded = None
+        self._keys = None
+        self._max_words = 1
+        self._typos = {}
+
+    def _build(self):
+        self._folded = _unique((name.casefold(), player_id) for player_id, name in enumerate(self.names))
+        keys = []
+        for player_id, name in enumerate(self.names):
+            words = _WORD_RE.findall(name)
+            keys.append((_key(name), player_id))
+            if len(words) > 1:
+                keys.append((words[0].casefold(), player_id))
+            # names and aliases are matched in free text as runs of up to this many words
+            self._max_words = max(self._max_words, len(words))
+        for alias, name in self._aliases.items():
+            if name in self._exact:
+                keys.append((_key(alias), self._exact[name]))
+        self._keys = _unique(keys)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def alive_names(self):
+        return [name for player_id, name in enumerate(self.names) if self.alive[player_id]]
+
+    def resolve(self, text, alive_only=False):
+        """
+        The player a name refers to.
+
+        Args:
+            text (str): A name as a player, the moderator or the LLM wrote it.
+            alive_only (bool): Only match living players, e.g. for votes.
+
+        Returns:
+            int | None: The player id, None if the name matches nobody or several players equally well.
+        """
+        # the LLM's parse can hand over anything, e.g. a list of names
+        player_id = self._exact.get(text) if isinstance(text, str) else None
+        if player_id is None and text is not None:
+            if self._keys is None:
+                self._build()
+            text = str(text).strip()
+            key = _key(text)
+            player_id = self._exact.get(text)
+            if player_id is None:
+                player_id = self._folded.get(text.casefold())
+            if player_id is None:
+                player_id = self._keys.get(key)
+            if player_id is None:
+                player_id = self._closest(key, alive_only)
+        if player_id is None or (alive_only and not self.alive[player_id]):
+            return None
+        return player_id
+
+    def name(self, text, alive_only=False):
+        """The listed spelling of a name, None if it doesn't resolve."""
+        player_id = self.resolve(text, alive_only)
+        return None if player_id is None else self.names[player_id]
+
+    def _candidates(self, key):
+        # (distance, player id) of every name and alias within the typo bound, closest first
+        candidates = self._typos.get(key)
+        if candidates is None:
+            bound = min(self.max_distance, len(key) // DISTANCE_RATIO)
+            candidates = []
+            if bound > 0:
+                for candidate, player_id in self._keys.items():
+                    distance = edit_distance(key, candidate, bound)
+                    if distance <= bound:
+                        candidates.append((distance, player_id))
+                candidates.sort()
+            if len(self._typos) >= MAX_CACHED_TYPOS:
+                self._typos.clear()
+            self._typos[key] = candidates
+        return candidates
+
+    def _closest(self, key, alive_only):
+        # the closest player, alive_only is applied here as the cached candidates include the dead
+        best, found = None, None
+        for distance, player_id in self._candidates(key):
+            if alive_only and not self.alive[player_id]:
+                continue
+            if best is None:
+                best, found = distance, player_id
+            elif distance > best:
+                break
+            elif player_id != found:
+                # equally close to two players
+                return None
+        return found
+
+    def mentions(self, text, alive_only=True):
+        """
+        The players a free text names, by exact, casefolded or alias spelling.
+
+        Typos are only matched by resolve. In a sentence, too many ordinary words are a
+        letter or two away from some player's name.
+
+        Args:
+            text (str): A message, e.g. a vote with its reasoning.
+            alive_only (bool): Only living players.
+
+        Returns:
+            list: Player ids in the order of their first mention.
+        """
+        if self._keys is None:
+            self._build()
+        words = _WORD_RE.findall(str(text or "").casefold())
+        found = []
+        for start in range(len(words)):
+            for length in range(min(self._max_words, len(words) - start), 0, -1):
+                player_id = self._keys.get("".join(words[start:start + length]))
+                if player_id is not None:
+                    if player_id not in found and (not alive_only or self.alive[player_id]):
+                        found.append(player_id)
+                    break
+        return found
+
+    def choice(self, text, alive_only=True, exclude=None):
+        """
+        The one player an answer chooses, e.g. a vote, a seer guess or a doctor save.
+
+        Args:
+            text (str): The answer.
+            alive_only (bool): Only living players can be chosen.
+            exclude (str): A player who doesn't count when named, e.g. the speaker naming themselves.
+
+        Returns:
+            int | None: The player id, None if the answer names nobody or several players.
+        """
+        excluded = self.resolve(exclude)
+        named = [player_id for player_id in self.mentions(text, alive_only) if player_id != excluded]
+        if not named:
+            # a bare, misspelt name
+            player_id = self.resolve(text, alive_only)
+            named = [player_id] if player_id is not None and player_id != excluded else []
+        return named[0] if len(named) == 1 else None
+
+    def normalize_choice(self, text, exclude=None):
+        """
+        Makes sure an answer names its choice as listed, so whoever reads it finds the player.
+
+        Args:
+            text (str): The answer.
+            exclude (str): A player who doesn't count when named, e.g. the speaker.
+
+        Returns:
+            str: The answer unchanged if it names its choice exactly, or names nobody or several
+                players. Otherwise the answer prefixed with the listed name.
+        """
+        player_id = self.choice(text, exclude=exclude)
+        if player_id is None:
+            return text
+        name = self.names[player_id]
+        if re.search(rf"(?<!\w){re.escape(name)}(?!\w)", text):
+            return text
+        return f"{name}: {text}"
+
+    def eliminate(self, text):
+        """
+        Marks a player dead, for callers that don't share their alive state.
+
+        Returns:
+            int | None: The player id, None if the name doesn't resolve.
+        """
+        player_id = self.resolve(text)
+        if player_id is not None:
+            self.alive[player_id] = False
+        return player_id
@@ -0,0 +1,286 @@
+"""
+Single-file, compressed transcript archives.
+
+A batch writes thousands of small transcript files. pack_transcripts() packs
+them into one archive per batch, with every game's transcripts compressed
+together as one zlib member, so a reader only decompresses the game it needs:
+
+    MAGIC | game member | game member | ... | index | trailer
+
+The index is zlib compressed JSON mapping each game id to its member's offset
+and length, and each transcript file (named <player>_<kind> as in the game
+directories of transcript/catalog.py) to its byte range in the decompressed
+member. The trailer holds the index offset and length followed by MAGIC again.
+TranscriptArchive mmaps the file and reads the index from the trailer, so
+opening an archive and reading one game costs a few page faults, not a
+directory scan:
+
+    with TranscriptArchive("game_results/batch_1730000000/transcripts.wta") as archive:
+        for game_id in archive.games():
+            for message in archive.messages(game_id, player="Chagent"):
+                ...
+"""
+import json
+import mmap
+import os
+import struct
+import zlib
+from collections import defaultdict
+from pathlib import Path
+
+from transcript.catalog import CATALOG_FILE, TRANSCRIPT_SUFFIXES, TranscriptCatalog, parse_transcript_name
+
+MAGIC = b"WWTARCH1"
+ARCHIVE_SUFFIX = ".wta"
+ARCHIVE_FILE = "transcripts" + ARCHIVE_SUFFIX
+# index offset, index length, magic
+_TRAILER = struct.Struct("<QQ8s")
+
+
+class TranscriptArchive:
+    """
+    Read access to an archive written by ArchiveWriter.
+
+    Args:
+        path (str | Path): The archive file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < len(MAGIC) + _TRAILER.size or self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a transcript archive")
+        index_offset, index_length, magic = _TRAILER.unpack_from(self._map, len(self._map) - _TRAILER.size)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} has no index, it was not closed properly")
+        self.index_offset = index_offset
+        self.index = json.loads(zlib.decompress(self._map[index_offset:index_offset + index_length]))
+        # the last game read stays decompressed, readers usually go through one game's files in a row
+        self._cached = (None, None)
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, game_id):
+        return game_id in self.index["games"]
+
+    def __iter__(self):
+        """Yields (game id, {file name: bytes}) for every game, in the order they were written."""
+        for game_id in self.games():
+            yield game_id, self.read_game(game_id)
+
+    def games(self):
+        """Game ids in the order they were written."""
+        return sorted(self.index["games"], key=lambda game_id: self.index["games"][game_id]["offset"])
+
+    def files(self, game_id):
+        """{file name: {"player", "kind", "start", "end"}} for one game."""
+        return self.index["games"][game_id]["files"]
+
+    def _decompressed(self, game_id):
+        cached_id, data = self._cached
+        if cached_id != game_id:
+            entry = self.index["games"][game_id]
+            data = zlib.decompress(self._map[entry["offset"]:entry["offset"] + entry["length"]])
+            self._cached = (game_id, data)
+        return data
+
+    def read_game(self, game_id):
+        """Decompresses one game, {file name: bytes}."""
+        data = self._decompressed(game_id)
+        return {name: data[f["start"]:f["end"]] for name, f in self.files(game_id).items()}
+
+    def read(self, game_id, name):
+        """One transcript file, e.g. read(game_id, "frodo_transcript.jsonl")."""
+        f = self.files(game_id)[name]
+        return self._decompressed(game_id)[f["start"]:f["end"]]
+
+    def messages(self, game_id, player=None):
+        """
+        Yields the lines of a game's transcripts, parsed when they are JSON.
+
+        Args:
+            game_id (str): Game id.
+            player (str): Only this player's transcripts.
+
+        Yields:
+            dict: player, file, seq and message (the JSON object, or the line as a str).
+        """
+        for name, f in self.files(game_id).items():
+            if player is not None and f["player"] != player:
+                continue
+            for seq, line in enumerate(line for line in self.read(game_id, name).splitlines() if line.strip()):
+                text = line.decode("utf-8", "replace")
+                message = text
+                if name.endswith(".jsonl"):
+                    try:
+                        message = json.loads(text)
+                    except ValueError:
+                        pass
+                yield {"player": f["player"], "file": name, "seq": seq, "message": message}
+
+
+class ArchiveWriter:
+    """
+    Writes games into an archive, the index is written by close().
+
+    A new archive is written to a temporary file and renamed into place by close(), so
+    it only ever exists complete. Appending to an existing archive (append=True) writes
+    the new games and a new index after the old trailer, which stays valid until then,
+    and a game added again replaces the earlier copy.
+
+    Args:
+        path (str | Path): The archive file.
+        append (bool): Add games to an existing archive instead of replacing it.
+        level (int): zlib compression level.
+    """
+
+    def __init__(self, path, append=False, level=6):
+        self.path = Path(path)
+        self.level = level
+        self.games = {}
+        if append and self.path.exists():
+            with TranscriptArchive(self.path) as archive:
+                self.games = archive.index["games"]
+            self._target = self.path
+            self._file = open(self.path, "r+b")
+            self._appended_at = self._file.seek(0, os.SEEK_END)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._target = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            self._file = open(self._target, "wb")
+            self._file.write(MAGIC)
+
+    def add_game(self, game_id, files):
+        """
+        Compresses one game's transcripts into the archive.
+
+        Args:
+            game_id (str): Game id.
+            files (dict): {file name: path or bytes}, names as <player>_<kind>.
+        """
+        chunks = []
+        entries = {}
+        position = 0
+        for name, content in sorted(files.items()):
+            data = content if isinstance(content, (bytes, bytearray)) else Path(content).read_bytes()
+            player, _, kind = name.rpartition("_")
+            entries[name] = {"player": player, "kind": kind, "start": position, "end": position + len(data)}
+            chunks.append(data)
+            position += len(data)
+        member = zlib.compress(b"".join(chunks), self.level)
+        self.games[game_id] = {"offset": self._file.tell(), "length": len(member), "size": position, "files": entries}
+        self._file.write(member)
+
+    def close(self):
+        index = zlib.compress(json.dumps({"version": 1, "games": self.games}).encode(), self.level)
+        index_offset = self._file.tell()
+        self._file.write(index)
+        self._file.write(_TRAILER.pack(index_offset, len(index), MAGIC))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if self._target != self.path:
+            os.replace(self._target, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        # a failed new archive is discarded, a failed append is cut back to the old archive
+        if self._target != self.path:
+            self._file.close()
+            os.unlink(self._target)
+        else:
+            self._file.truncate(self._appended_at)
+            self._file.close()
+
+
+def _collect(folder):
+    # {game id: {file name: path}} for the loose transcripts and the GAME_ID_* directories of a folder
+    games = defaultdict(dict)
+    for entry in os.scandir(folder):
+        if entry.is_file():
+            parsed = parse_transcript_name(entry.name)
+            if parsed is not None:
+                player, game_id, kind = parsed
+                games[game_id][f"{player}_{kind}"] = Path(entry.path)
+        elif entry.is_dir() and entry.name.startswith("GAME_ID_"):
+            for path in Path(entry.path).iterdir():
+                if path.is_file() and path.name.endswith(TRANSCRIPT_SUFFIXES) and "_" in path.name:
+                    games[entry.name[len("GAME_ID_"):]][path.name] = path
+    return games
+
+
+def pack_transcripts(folder, archive_path, remove=True, level=6, game_ids=None):
+    """
+    Packs the transcripts of a folder into an archive, adding to it if it exists.
+
+    Batches give every run its own folder, so a pack never takes another run's games. If the
+    folder has a catalog (see transcript/catalog.py), the index of the removed files is dropped
+    and the games' dir points at the archive.
+
+    Args:
+        folder (str | Path): Transcript folder, with loose runner files and/or GAME_ID_* directories.
+        archive_path (str | Path): The archive file.
+        remove (bool): Delete the packed files once the archive is safely written.
+        level (int): zlib compression level.
+        game_ids (Iterable): Only pack these games, by default every game in the folder.
+
+    Returns:
+        list: Game ids that were packed.
+    """
+    folder = Path(folder)
+    if not folder.is_dir():
+        return []
+    games = _collect(folder)
+    if game_ids is not None:
+        game_ids = set(game_ids)
+        games = {game_id: files for game_id, files in games.items() if game_id in game_ids}
+    if not games:
+        return []
+    with ArchiveWriter(archive_path, append=True, level=level) as writer:
+        for game_id, files in sorted(games.items()):
+            writer.add_game(game_id, files)
+    if remove:
+        paths = [path for files in games.values() for path in files.values()]
+        if (folder / CATALOG_FILE).exists():
+            with TranscriptCatalog(folder) as catalog:
+                catalog.forget_files(paths, archive_path)
+        for path in paths:
+            path.unlink()
+        for game_dir in folder.glob("GAME_ID_*"):
+            if game_dir.is_dir() and not any(game_dir.iterdir()):
+                game_dir.rmdir()
+    return sorted(games)
+
+
+def iter_games(*paths):
+    """
+    Yields every game of the archives under the given files or directories, e.g. a month of batches.
+
+    Yields:
+        tuple: (archive path, game id, {file name: bytes}).
+    """
+    for path in paths:
+        path = Path(path)
+        archives = sorted(path.rglob(f"*{ARCHIVE_SUFFIX}")) if path.is_dir() else [path]
+        for archive_path in archives:
+            with TranscriptArchive(archive_path) as archive:
+                for game_id, files in archive:
+                    yield archive_path, game_id, files
@@ -0,0 +1,482 @@
+"""
+SQLite catalog of game transcripts.
+
+The runner dumps one transcript per player and game into a folder, named
+<player>_<game id part 1>_<game id part 2>_<kind>.jsonl (or .txt). ingest()
+moves (or hard-links) each file into GAME_ID_<game id>/<player>_<kind>, parses
+it once, and indexes every message with its game, player, channel, sender,
+phase and round, plus its byte offset and length in the file. Queries then
+read just the matching messages from disk instead of rescanning the tree.
+
+File names are split from the right, so player names may contain underscores.
+Phases come from the moderator's "Night Start:" and "Day start:" messages:
+"setup" until the first night, then "night" and "day", and the round counts
+the nights. If a game_result_<id>.log from versus_runner.py is ingested with
+the transcripts, the game's winner and the players' roles and agents are
+stored too, so messages can be filtered by them:
+
+    python -m transcript.catalog ingest transcript --game-log game_result_<id>.log
+    python -m transcript.catalog messages --channel "wolf's-den" --winner villagers --text
+"""
+import argparse
+import errno
+import json
+import os
+import re
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+
+from batch.results_db import extract_game, normalize_role, normalize_winner, read_versus_log
+
+CATALOG_FILE = "catalog.db"
+TRANSCRIPT_SUFFIXES = (".jsonl", ".txt")
+MODERATOR_NAME = "moderator"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    dir TEXT,
+    activity_id TEXT,
+    winner TEXT,
+    result_file TEXT
+);
+CREATE TABLE IF NOT EXISTS players (
+    game_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    role TEXT,
+    agent TEXT,
+    won INTEGER,
+    PRIMARY KEY (game_id, name)
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    game_id TEXT,
+    player TEXT,
+    kind TEXT,
+    size INTEGER,
+    mtime REAL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    game_id TEXT,
+    player TEXT,
+    seq INTEGER,
+    channel TEXT,
+    sender TEXT,
+    phase TEXT,
+    round INTEGER,
+    offset INTEGER,
+    length INTEGER
+);
+CREATE INDEX IF NOT EXISTS messages_channel ON messages(channel, game_id);
+CREATE INDEX IF NOT EXISTS messages_game_player ON messages(game_id, player, seq);
+CREATE INDEX IF NOT EXISTS messages_phase ON messages(phase, round);
+CREATE INDEX IF NOT EXISTS messages_sender ON messages(sender);
+CREATE INDEX IF NOT EXISTS games_winner ON games(winner);
+CREATE INDEX IF NOT EXISTS players_role ON players(role, game_id);
+"""
+
+SENDER_KEYS = ("sender", "from", "speaker", "name")
+CHANNEL_KEYS = ("channel", "channel_name", "group", "room")
+TEXT_KEYS = ("text", "content", "message", "body")
+# "sender: text" lines in .txt transcripts
+_TXT_LINE_RE = re.compile(r"^\[?(?P<sender>[^\[\]:]{1,64}?)\]?\s*:\s?(?P<text>.*)$")
+
+
+def parse_transcript_name(file_name):
+    """
+    Splits a transcript file name from the runner.
+
+    Args:
+        file_name (str): e.g. "peregrin_took_1730000000_4f2a_transcript.jsonl".
+
+    Returns:
+        tuple: (player, game id, kind) e.g. ("peregrin_took", "1730000000_4f2a", "transcript.jsonl"),
+            or None if the name doesn't follow the pattern.
+    """
+    if not file_name.endswith(TRANSCRIPT_SUFFIXES):
+        return None
+    parts = file_name.rsplit("_", 3)
+    if len(parts) != 4 or not all(parts):
+        return None
+    player, game_id_start, game_id_end, kind = parts
+    return player, f"{game_id_start}_{game_id_end}", kind
+
+
+def _find(record, keys, depth=3):
+    # first scalar stored under one of keys, searched breadth first through nested dicts
+    level = [record]
+    for _ in range(depth):
+        next_level = []
+        for item in level:
+            for key in keys:
+                value = item.get(key)
+                if value is not None and not isinstance(value, (dict, list)):
+                    return str(value)
+            next_level.extend(value for value in item.values() if isinstance(value, dict))
+        level = next_level
+    return None
+
+
+def message_fields(record):
+    """(sender, channel, text) of one JSON transcript message, from the message or its header/content dicts."""
+    return _find(record, SENDER_KEYS), _find(record, CHANNEL_KEYS), _find(record, TEXT_KEYS) or ""
+
+
+def _phase_change(sender, text):
+    # only the moderator's announcements move the phase, a player can quote them
+    if sender is not None and sender.lower() != MODERATOR_NAME:
+        return None
+    heading = text.lstrip().lower()
+    if heading.startswith("night start"):
+        return "night"
+    if heading.startswith("day start"):
+        return "day"
+    return None
+
+
+def parse_transcript(path):
+    """
+    Parses a transcript into message entries.
+
+    .jsonl transcripts have one JSON message per line, with sender, channel and text
+    found in the message or its header/content dicts. .txt transcripts are indexed line
+    by line, with the sender taken from "sender: text" lines.
+
+    Args:
+        path (str | Path): Transcript file.
+
+    Yields:
+        dict: seq, channel, sender, phase, round, offset and length for every message.
+    """
+    is_jsonl = str(path).endswith(".jsonl")
+    phase, round_number = "setup", 0
+    offset = 0
+    seq = 0
+    with open(path, "rb") as f:
+        for line in f:
+            start, offset = offset, offset + len(line)
+            stripped = line.strip()
+            if not stripped:
+                continue
+            channel = sender = None
+            if is_jsonl:
+                try:
+                    record = json.loads(stripped)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    sender, channel, text = message_fields(record)
+                else:
+                    text = stripped.decode("utf-8", "replace")
+            else:
+                text = stripped.decode("utf-8", "replace")
+                match = _TXT_LINE_RE.match(text)
+                if match:
+                    sender, text = match.group("sender").strip(), match.group("text")
+
+            change = _phase_change(sender, text)
+            if change == "night":
+                round_number += 1
+            if change is not None:
+                phase = change
+            yield {
+                "seq": seq,
+                "channel": channel,
+                "sender": sender,
+                "phase": phase,
+                "round": round_number,
+                "offset": start,
+                "length": len(line.rstrip(b"\r\n")),
+            }
+            seq += 1
+
+
+def _place(source, target, link):
+    # atomic: the target either doesn't exist yet or is the complete file
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        if link:
+            os.link(source, tmp)
+            os.replace(tmp, target)
+        else:
+            os.replace(source, target)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    # the game log can live on another filesystem than the transcripts
+    shutil.copy2(source, tmp)
+    os.replace(tmp, target)
+    if not link:
+        os.unlink(source)
+
+
+class TranscriptCatalog:
+    """
+    Transcript index for one transcript folder, stored in <folder>/catalog.db.
+
+    Args:
+        folder (str | Path): The folder the runner dumps transcripts into.
+        db_path (str | Path): SQLite file, defaults to catalog.db in the folder.
+    """
+
+    def __init__(self, folder, db_path=None):
+        self.folder = Path(str(folder).strip())
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(db_path or self.folder / CATALOG_FILE)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # ---- ingestion ---- #
+
+    def ingest(self, game_log_file=None, link=False):
+        """
+        Files the loose transcripts of the folder into game directories and indexes them.
+
+        Transcripts already in game directories are indexed as well, and files that didn't
+        change since the last ingest are skipped. Names that don't follow the runner's
+        pattern are moved to error_logs/.
+
+        Args:
+            game_log_file (str | Path): versus_runner.py's game_result_<id>.log for the game in
+                the folder, moved (or linked) into that game's directory and indexed.
+            link (bool): Hard-link the files into place and keep the originals.
+
+        Returns:
+            list: Game ids of the games that were filed or re-indexed.
+        """
+        games = set()
+        filed = set()
+        for entry in sorted(os.scandir(self.folder), key=lambda e: e.name):
+            if not entry.is_file() or not entry.name.endswith(TRANSCRIPT_SUFFIXES):
+                continue
+            parsed = parse_transcript_name(entry.name)
+            if parsed is None:
+                error_logs_dir = self.folder / "error_logs"
+                error_logs_dir.mkdir(exist_ok=True)
+                _place(entry.path, error_logs_dir / entry.name, link)
+                continue
+            player, game_id, kind = parsed
+            game_dir = self.folder / f"GAME_ID_{game_id}"
+            game_dir.mkdir(exist_ok=True)
+            target = game_dir / f"{player}_{kind}"
+            _place(entry.path, target, link)
+            filed.add(game_id)
+            self._add_game(game_id, game_dir)
+            if self._index_file(target, game_id, player, kind):
+                games.add(game_id)
+
+        # transcripts filed by earlier runs, or by reorg_files before the catalog existed
+        for game_dir in sorted(self.folder.glob("GAME_ID_*")):
+            game_id = game_dir.name[len("GAME_ID_"):]
+            for path in sorted(game_dir.iterdir()):
+                if not path.name.endswith(TRANSCRIPT_SUFFIXES) or "_" not in path.name:
+                    continue
+                player, kind = path.name.rsplit("_", 1)
+                self._add_game(game_id, game_dir)
+                if self._index_file(path, game_id, player, kind):
+                    games.add(game_id)
+
+        if game_log_file is not None:
+            # the log belongs to the game whose transcripts were just dumped into the folder
+            if len(filed) != 1:
+                raise ValueError(f"{game_log_file} can't be matched to one game, the folder held transcripts of {sorted(filed) or 'none'}")
+            game_id = filed.pop()
+            target = self.folder / f"GAME_ID_{game_id}" / Path(game_log_file).name
+            _place(game_log_file, target, link)
+            self.add_result(game_id, target)
+            games.add(game_id)
+
+        self.conn.commit()
+        return sorted(games)
+
+    def _add_game(self, game_id, game_dir):
+        self.conn.execute("INSERT OR IGNORE INTO games (game_id, dir) VALUES (?, ?)", (game_id, str(game_dir)))
+
+    def _index_file(self, path, game_id, player, kind):
+        # returns False if the file was indexed before and hasn't changed
+        stat = os.stat(path)
+        key = str(Path(path).resolve())
+        row = self.conn.execute("SELECT id, size, mtime FROM files WHERE path = ?", (key,)).fetchone()
+        if row is not None and row["size"] == stat.st_size and row["mtime"] == stat.st_mtime:
+            return False
+        if row is not None:
+            self.conn.execute("DELETE FROM files WHERE id = ?", (row["id"],))
+        file_id = self.conn.execute(
+            "INSERT INTO files (path, game_id, player, kind, size, mtime) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, game_id, player, kind, stat.st_size, stat.st_mtime),
+        ).lastrowid
+        self.conn.executemany(
+            "INSERT INTO messages (file_id, game_id, player, seq, channel, sender, phase, round, offset, length) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (file_id, game_id, player, m["seq"], m["channel"], m["sender"], m["phase"], m["round"], m["offset"], m["length"])
+                for m in parse_transcript(path)
+            ),
+        )
+        return True
+
+    def forget_files(self, paths, moved_to=None):
+        """
+        Drops the index of transcript files that are about to go, e.g. packed by pack_transcripts.
+
+        Args:
+            paths (list): The files, their messages are dropped with them.
+            moved_to (str | Path): Where their games went, stored as the games' dir.
+        """
+        keys = [str(Path(path).resolve()) for path in paths]
+        game_ids = set()
+        for key in keys:
+            row = self.conn.execute("SELECT game_id FROM files WHERE path = ?", (key,)).fetchone()
+            if row is not None:
+                game_ids.add(row["game_id"])
+        self.conn.executemany("DELETE FROM files WHERE path = ?", [(key,) for key in keys])
+        if moved_to is not None:
+            self.conn.executemany(
+                "UPDATE games SET dir = ? WHERE game_id = ?",
+                [(str(Path(moved_to).resolve()), game_id) for game_id in sorted(game_ids)],
+            )
+        self.conn.commit()
+
+    def add_result(self, game_id, game_log_file):
+        """
+        Stores the winner, roles and agents of a game from its game_result_<id>.log.
+
+        Args:
+            game_id (str): The game id from the transcript names.
+            game_log_file (str | Path): versus_runner.py's log for the game.
+        """
+        results, player_classes = read_versus_log(game_log_file)
+        game = extract_game(results, player_classes=player_classes)
+        self.conn.execute(
+            "UPDATE games SET activity_id = ?, winner = ?, result_file = ? WHERE game_id = ?",
+            (game["activity_id"], game["winner"], str(Path(game_log_file).resolve()), game_id),
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO players (game_id, name, role, agent, won) VALUES (?, ?, ?, ?, ?)",
+            [(game_id, p["name"], p["role"], p["agent"], p["won"]) for p in game["players"]],
+        )
+        self.conn.commit()
+
+    # ---- queries ---- #
+
+    def messages(self, game_id=None, player=None, channel=None, sender=None, phase=None, round=None,
+                 winner=None, role=None, text=False):
+        """
+        Yields the indexed messages matching every given filter, in game, player and transcript order.
+
+        Args:
+            game_id (str): Game id.
+            player (str): Player whose transcript holds the message.
+            channel (str): e.g. "play-arena" or "wolf's-den".
+            sender (str): Who sent the message.
+            phase (str): "setup", "night" or "day".
+            round (int): Night number, the day after night n has round n.
+            winner (str): "wolves" or "villagers", the team that won the game.
+            role (str): The role of the player whose transcript holds the message.
+            text (bool): Also read each message's raw line from its transcript.
+
+        Yields:
+            dict: game_id, player, seq, channel, sender, phase, round, path, offset, length
+                (and text when asked for).
+        """
+        where, params = [], []
+        for column, value in (("m.game_id", game_id), ("m.player", player), ("m.channel", channel),
+                              ("m.sender", sender), ("m.phase", phase), ("m.round", round)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        joins = ""
+        if winner is not None:
+            joins += " JOIN games g ON g.game_id = m.game_id"
+            where.append("g.winner = ?")
+            params.append(normalize_winner(winner))
+        if role is not None:
+            joins += " JOIN players p ON p.game_id = m.game_id AND p.name = m.player"
+            where.append("p.role = ?")
+            params.append(normalize_role(role))
+        query = (
+            "SELECT m.game_id, m.player, m.seq, m.channel, m.sender, m.phase, m.round, f.path, m.offset, m.length "
+            f"FROM messages m JOIN files f ON f.id = m.file_id{joins}"
+        )
+        if where:
+            query += f" WHERE {' AND '.join(where)}"
+        query += " ORDER BY m.game_id, m.player, m.file_id, m.seq"
+
+        handles = {}
+        try:
+            for row in self.conn.execute(query, params):
+                message = dict(row)
+                if text:
+                    f = handles.get(message["path"])
+                    if f is None:
+                        f = handles[message["path"]] = open(message["path"], "rb")
+                    f.seek(message["offset"])
+                    message["text"] = f.read(message["length"]).decode("utf-8", "replace")
+                yield message
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def query(self, sql, params=()):
+        """Runs a SQL query against the games, players, files and messages tables."""
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index and search werewolf transcripts")
+    parser.add_argument("--db", help=f"SQLite file (default: {CATALOG_FILE} in the transcript folder)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="File the loose transcripts into game directories and index them")
+    ingest.add_argument("folder")
+    ingest.add_argument("--game-log", help="versus_runner.py's game_result_<id>.log for the game in the folder")
+    ingest.add_argument("--link", action="store_true", help="Hard-link the files into place and keep the originals")
+
+    messages = commands.add_parser("messages", help="List matching messages")
+    messages.add_argument("folder")
+    for name in ("game-id", "player", "channel", "sender", "phase", "winner", "role"):
+        messages.add_argument(f"--{name}")
+    messages.add_argument("--round", type=int)
+    messages.add_argument("--text", action="store_true", help="Print the messages themselves")
+
+    sql = commands.add_parser("sql", help="Run a SQL query")
+    sql.add_argument("folder")
+    sql.add_argument("query")
+
+    args = parser.parse_args(argv)
+    with TranscriptCatalog(args.folder, args.db) as catalog:
+        if args.command == "ingest":
+            started = time.perf_counter()
+            games = catalog.ingest(args.game_log, link=args.link)
+            print(f"Indexed {len(games)} games in {time.perf_counter() - started:.2f}s")
+        elif args.command == "sql":
+            for row in catalog.query(args.query):
+                print(json.dumps(row, default=str))
+        else:
+            filters = {
+                "game_id": args.game_id, "player": args.player, "channel": args.channel, "sender": args.sender,
+                "phase": args.phase, "round": args.round, "winner": args.winner, "role": args.role,
+            }
+            for message in catalog.messages(text=args.text, **filters):
+                print(json.dumps(message))
+
+
+if __name__ == "__main__":
+    main()
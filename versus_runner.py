@@ -1,11 +1,26 @@
 ########################################################################
 # This is a runner file for running different agents against one another
+# python versus_runner.py                 one game with ROLE_DISTRIBUTION
+# python versus_runner.py --tournament 30 games with the roles rotated
+#                                         across every agent in AGENT_CONFIGS
+# python versus_runner.py --tournament 300 --stop-confidence 0.95
+#                                         the same in waves, stopping once the
+#                                         per-role comparisons are decided
 #########################################################################
 
 
 from sentient_campaign.activity_runner.runner import WerewolfCampaignActivityRunner, PlayerAgentConfig, SentientWerewolfRoles
-from transcript.reorg_files import reorg_files
+from transcript.archive import ARCHIVE_FILE, pack_transcripts
+from transcript.catalog import TranscriptCatalog
+from batch.build_cache import BuildCache
+from batch.executor import default_workers, run_games
+from batch.results_store import ResultsStore
+from batch.sequential import DEFAULT_MARGIN, DEFAULT_MIN_GAMES, SequentialTest
+from batch.tournament import Standings, latin_square_schedule
 import os
+import json
+import time
+import argparse
 from typing import Dict, List
 import random
 from dotenv import load_dotenv
@@ -36,25 +51,28 @@ SENTIENT_API_KEY = os.getenv("MY_UNIQUE_API_KEY")
 # Default agent configurations
 AGENT_CONFIGS = {
     "cot": {
-        "wheel_path": "./src/werewolf_agents/cot_sample/dist/chagent-0.1.0-py3-none-any.whl",
+        "agent_dir": "./src/werewolf_agents/cot_sample",
         "module_path": "agent/cot_agent.py",
         "config_path": "./src/werewolf_agents/cot_sample/config.yaml",
         "agent_class": "CoTAgent"
     },
     "autogen": {
-        "wheel_path": "./src/werewolf_agents/autogen_sample/dist/autogenwolf-0.0.1-py3-none-any.whl",
+        "agent_dir": "./src/werewolf_agents/autogen_sample",
         "module_path": "agent/single_agent.py",
         "config_path": "./src/werewolf_agents/autogen_sample/config.yaml",
         "agent_class": "WerewolfAgent"
     },
     "simple": {
-        "wheel_path": "./src/werewolf_agents/simple_sample/dist/simplewolf-0.0.1-py3-none-any.whl",
+        "agent_dir": "./src/werewolf_agents/simple_sample",
         "module_path": "agent/super_simple.py",
         "config_path": "./src/werewolf_agents/simple_sample/config.yaml",
         "agent_class": "SimpleReactiveAgent"
     }
 }
 
+# wheels and images are only rebuilt when an agent's package changes
+build_cache = BuildCache()
+
 def create_game_config() -> tuple:
     """Creates game configuration"""
     player_roles = {name: config["role"] for name, config in ROLE_DISTRIBUTION.items()}
@@ -65,7 +83,7 @@ def create_game_config() -> tuple:
         your_agents.append(
             PlayerAgentConfig(
                 player_name=player_name,
-                agent_wheel_path=agent_config["wheel_path"],
+                agent_wheel_path=build_cache.ensure_wheel(agent_config["agent_dir"]),
                 module_path=agent_config["module_path"],
                 agent_class_name=agent_config["agent_class"],
                 agent_config_file_path=agent_config["config_path"]
@@ -79,27 +97,177 @@ def create_game_config() -> tuple:
     return your_agents, player_roles
 
 
-# Create game configuration (using either default or custom)
-your_agents, player_roles = create_game_config()
+def run_single_game(port: int = 8008):
+    # Create game configuration (using either default or custom)
+    your_agents, player_roles = create_game_config()
+
+    # Run the game
+    runner = WerewolfCampaignActivityRunner(com_server_port=port)
+
+    used_agent_dirs = {AGENT_CONFIGS[config["agent"]]["agent_dir"] for config in ROLE_DISTRIBUTION.values()}
+    with build_cache.image(*sorted(used_agent_dirs)) as rebuild:
+        game_result = runner.run_with_your_agents(
+            your_agents,
+            players_sentient_llm_api_keys=[SENTIENT_API_KEY],
+            path_to_final_transcript_dump="transcript",
+            player_roles=player_roles,
+            force_rebuild_agent_images=rebuild
+        )
+
+    activity_id = game_result.get("activity_id")
+    print(f"Activity completed with ID: {activity_id}")
+    # write the game result and who played what into the log file, as JSON so batch/results_db.py can ingest it
+    with open("game_result_{0}.log".format(activity_id), "w") as f:
+        json.dump({
+            "game_result": game_result,
+            "player_classes": {name: {"role": config["role"].name.lower(), "agent": config["agent"]} for name, config in ROLE_DISTRIBUTION.items()},
+        }, f, indent=2, default=str)
+
+    # file the transcripts by game and index them, see transcript/catalog.py for queries
+    with TranscriptCatalog("transcript") as catalog:
+        catalog.ingest("game_result_{0}.log".format(activity_id))
+
+
+def run_tournament(num_games: int, workers: int = None, port: int = 8008, seed: int = None, results_dir: str = "tournament_results",
+                   stop_confidence: float = None, margin: float = DEFAULT_MARGIN, min_games: int = DEFAULT_MIN_GAMES, wave: int = None):
+    """
+    Runs games in parallel with every agent in AGENT_CONFIGS rotated through every seat of ROLE_DISTRIBUTION
+
+    With stop_confidence, num_games is the maximum: games run in waves and the tournament stops
+    once batch/sequential.py decides every per-role comparison between the agents.
+    """
+    seats = [(name, config["role"]) for name, config in ROLE_DISTRIBUTION.items()]
+    agent_names = sorted(AGENT_CONFIGS)
+    if num_games % len(agent_names):
+        print(f"Warning: {num_games} games is not a multiple of {len(agent_names)} agents, the last block is not balanced")
+    schedule = latin_square_schedule(seats, agent_names, num_games, seed)
+
+    wheels = {agent: build_cache.ensure_wheel(config["agent_dir"]) for agent, config in AGENT_CONFIGS.items()}
+    rebuild_dirs = [config["agent_dir"] for config in AGENT_CONFIGS.values() if build_cache.claim_image(config["agent_dir"])]
+    player_roles = {name: config["role"] for name, config in ROLE_DISTRIBUTION.items()}
+
+    tournament_id = int(time.time())
+    batch_dir = os.path.join(results_dir, f"batch_{tournament_id}")
+    # the tournament's own transcript folder, so packing it leaves the catalogued single games in transcript/ alone
+    transcript_dir = os.path.join(batch_dir, "transcript")
+    os.makedirs(transcript_dir, exist_ok=True)
+    games = []
+    player_classes = {}
+    for game_number, assignment in enumerate(schedule, start=1):
+        player_classes[game_number] = {
+            name: {"role": player_roles[name].name.lower(), "agent": agent} for name, agent in assignment.items()
+        }
+        games.append({
+            "game_number": game_number,
+            "agents": [
+                dict(
+                    player_name=name,
+                    agent_wheel_path=wheels[agent],
+                    module_path=AGENT_CONFIGS[agent]["module_path"],
+                    agent_class_name=AGENT_CONFIGS[agent]["agent_class"],
+                    agent_config_file_path=AGENT_CONFIGS[agent]["config_path"],
+                )
+                for name, agent in assignment.items()
+            ],
+            "api_keys": [SENTIENT_API_KEY],
+            "transcript_dir": transcript_dir,
+            "player_roles": player_roles,
+            "force_rebuild_agent_image": bool(rebuild_dirs),
+            # the agents' latency and token records and their histograms, see batch/metrics.py
+            "metrics_dir": os.path.join(batch_dir, "metrics", f"game_{game_number}"),
+        })
+
+    workers = workers or default_workers()
+    store = ResultsStore(batch_dir, tournament_id, num_games,
+                         mode="tournament", seed=seed, workers=workers, agents_compared=agent_names)
+    standings = Standings()
+    print(f"Tournament {tournament_id}: {num_games} games, {min(workers, num_games)} at a time")
+
+    test = None
+    if stop_confidence is None:
+        wave = num_games
+    else:
+        test = SequentialTest(stop_confidence, margin, min_games)
+        # whole Latin-square blocks keep every wave balanced, and by default a wave keeps every worker busy
+        block = len(agent_names)
+        wave = -(-max(wave or workers, block) // block) * block
+        store.metadata["stopping_rule"] = {"confidence": stop_confidence, "margin": margin, "min_games": min_games, "wave": wave}
+        print(f"Stopping once every comparison is decided with confidence {stop_confidence}, checked every {wave} games")
+
+    def on_rebuilt(game):
+        for agent_dir in rebuild_dirs:
+            build_cache.image_built(agent_dir, ok="error" not in game)
+
+    comparisons = []
+    played = 0
+    while played < num_games:
+        for game in run_games(games[played:played + wave], workers, start_port=port, on_rebuilt=on_rebuilt):
+            game_number = game["game_number"]
+            store.append(game, player_classes=player_classes[game_number])
+            if "error" in game:
+                print(f"Error in game {game_number}: {game['error']}")
+                continue
+            standings.add(game["results"], player_classes[game_number])
+            print(f"Game {game_number} finished ({store.successful_games + store.failed_games}/{num_games})")
+        played = min(played + wave, num_games)
+        # only the first wave can rebuild the images
+        on_rebuilt = None
+        for game in games:
+            game["force_rebuild_agent_image"] = False
+
+        if test is None:
+            continue
+        comparisons = test.evaluate(standings)
+        print(f"\nAfter {played} games:")
+        print(test.format(comparisons))
+        if test.done(comparisons):
+            break
 
-# Run the game
-runner = WerewolfCampaignActivityRunner(com_server_port=8008)
+    store.metadata["standings"] = standings.to_dict()
+    if test is not None:
+        store.metadata["games_played"] = played
+        store.metadata["games_saved"] = num_games - played
+        store.metadata["comparisons"] = comparisons
+        store.total_games = played
+    store.close()
+    # the tournament's transcripts go into one compressed archive next to its results, see transcript/archive.py
+    packed = pack_transcripts(transcript_dir, store.batch_dir / ARCHIVE_FILE)
+    print("\nStandings per agent and role:")
+    print(standings.format())
+    if test is not None:
+        if test.done(comparisons):
+            print(f"\nEvery comparison decided after {played} of {num_games} games, {num_games - played} games saved")
+        else:
+            print(f"\nReached the maximum of {num_games} games with comparisons still undecided")
+    print(f"\nResults saved to: {store.results_path}")
+    print(f"Transcripts of {len(packed)} games packed into: {store.batch_dir / ARCHIVE_FILE}")
+    return standings
 
-game_result = runner.run_with_your_agents(
-    your_agents,
-    players_sentient_llm_api_keys=[SENTIENT_API_KEY],
-    path_to_final_transcript_dump="transcript",
-    player_roles=player_roles,
-    force_rebuild_agent_images=True
-)
 
-activity_id = game_result.get("activity_id")
-print(f"Activity completed with ID: {activity_id}")
-# print game result into log file
-with open("game_result_{0}.log".format(activity_id), "w") as f:
-    f.write(str(game_result))
-    f.write(f"\nPlayer Classes: {ROLE_DISTRIBUTION}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run agents against one another')
+    parser.add_argument('--tournament', type=int, default=None,
+                      help='Run this many games with roles rotated across the agents (best as a multiple of the number of agents)')
+    parser.add_argument('--workers', type=int, default=None,
+                      help='Tournament games to run at once (default: bounded by CPU count and memory)')
+    parser.add_argument('--port', type=int, default=8008,
+                      help='Port of the communication server, the first port to try in a tournament (default: 8008)')
+    parser.add_argument('--seed', type=int, default=None,
+                      help='Seed for the tournament schedule')
+    parser.add_argument('--stop-confidence', type=float, default=None,
+                      help='Run the tournament in waves and stop once every per-role comparison is decided with this confidence, e.g. 0.95')
+    parser.add_argument('--margin', type=float, default=DEFAULT_MARGIN,
+                      help=f'Win rate difference below which two agents count as equal (default: {DEFAULT_MARGIN})')
+    parser.add_argument('--min-games', type=int, default=DEFAULT_MIN_GAMES,
+                      help=f'Games each agent plays in a role before its comparisons can be decided (default: {DEFAULT_MIN_GAMES})')
+    parser.add_argument('--wave', type=int, default=None,
+                      help='Games between checks of the stopping rule (default: the number of workers, rounded up to whole rotations)')
+    args = parser.parse_args()
 
-reorg_files("transcript", "game_result_{0}.log".format(activity_id))
+    if args.tournament:
+        run_tournament(args.tournament, args.workers, args.port, args.seed,
+                       stop_confidence=args.stop_confidence, margin=args.margin, min_games=args.min_games, wave=args.wave)
+    else:
+        run_single_game(args.port)
 
 